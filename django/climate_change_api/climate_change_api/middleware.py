@@ -39,7 +39,7 @@ class ClimateRequestLoggingMiddleware(object):
             pass
 
         # If avail, send data request vars
-        if request._view_name == 'IndicatorDataView' or request._view_name == 'ClimateDataView':
+        if request._view_name in ('IndicatorDataForCityView', 'ClimateDataForCityView'):
             path = urls.resolve(request.path)
             request._tags.update(**path.kwargs)
 
@@ -203,6 +203,11 @@ CACHES = {
         'BACKEND': CACHE_BACKEND,
         'LOCATION': CACHE_LOCATION
     },
+    # Calculated indicator values, keyed by the calculation instead of the request URL
+    'indicator_results': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
     'bypass': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
     }
@@ -210,6 +215,85 @@ CACHES = {
 
 API_VIEW_DEFAULT_CACHE_TIMEOUT = 60 * 60 * 24
 
+# Most bytes of API responses each process keeps in its own cache in front of the shared api_views
+# cache, evicting the least recently used beyond that. Disabled if 0
+API_VIEW_LOCAL_CACHE_SIZE = int(os.getenv('CC_API_VIEW_LOCAL_CACHE_SIZE', 32 * 1024 * 1024))
+
+# Seconds responses are kept in each process's cache. Kept short, since the copies in every
+# process can't be invalidated
+API_VIEW_LOCAL_CACHE_TIMEOUT = int(os.getenv('CC_API_VIEW_LOCAL_CACHE_TIMEOUT', 60))
+
+# Most seconds a process creating an uncached API response holds a lock that makes concurrent
+# requests for the same response wait for it, instead of all creating it at once. Disabled if 0
+API_VIEW_CACHE_LOCK_TIMEOUT = int(os.getenv('CC_API_VIEW_CACHE_LOCK_TIMEOUT', 60))
+
+# Most seconds a request waits for another process to create its response before creating it
+API_VIEW_CACHE_LOCK_WAIT = int(os.getenv('CC_API_VIEW_CACHE_LOCK_WAIT', 30))
+
+# Seconds after they expire that the climate data and indicator views keep a stale copy of their
+# responses, returned to requests that arrive while the response is being recreated
+API_VIEW_STALE_CACHE_TIMEOUT = int(os.getenv('CC_API_VIEW_STALE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# gzip compression level of cached API responses, which are sent to clients that accept gzip
+# without being decompressed. Disabled if 0
+API_VIEW_CACHE_COMPRESSION_LEVEL = int(os.getenv('CC_API_VIEW_CACHE_COMPRESSION_LEVEL', 6))
+
+# Directory to share the decoded ClimateDataYear arrays of recently used map cells in, between
+# every process on the host. Use a tmpfs like /dev/shm to keep them in memory. Disabled if empty
+CLIMATE_DATA_ARRAY_CACHE_DIR = os.getenv('CC_ARRAY_CACHE_DIR', '')
+
+# Most bytes of arrays to keep in the array cache before evicting the least recently used
+CLIMATE_DATA_ARRAY_CACHE_SIZE = int(os.getenv('CC_ARRAY_CACHE_SIZE', 1024 * 1024 * 1024))
+
+# Read a map cell's data from its ClimateDataCube rows, which hold every year of a model in one
+# row, instead of from a ClimateDataYear row per model and year. The importer only keeps the cubes
+# up to date while this is enabled, so run build_climate_data_cubes once before enabling it
+CLIMATE_DATA_CUBES = os.getenv('CC_CLIMATE_DATA_CUBES', False)
+if CLIMATE_DATA_CUBES == 'False' or CLIMATE_DATA_CUBES == 'false':
+    CLIMATE_DATA_CUBES = False
+
+# Stream JSON responses of the raw climate data endpoints one year at a time as they're serialized,
+# instead of rendering the whole response before sending it
+CLIMATE_DATA_STREAMING_RESPONSES = os.getenv('CC_CLIMATE_DATA_STREAMING_RESPONSES', False)
+if CLIMATE_DATA_STREAMING_RESPONSES == 'False' or CLIMATE_DATA_STREAMING_RESPONSES == 'false':
+    CLIMATE_DATA_STREAMING_RESPONSES = False
+
+
+# Indicators
+
+# Calculate indicators that define vectorized kernels with NumPy array reductions, instead of
+# iterating over each day's values in Python
+INDICATOR_VECTORIZED_ENGINE = os.getenv('CC_INDICATOR_VECTORIZED_ENGINE', True)
+if INDICATOR_VECTORIZED_ENGINE == 'False' or INDICATOR_VECTORIZED_ENGINE == 'false':
+    INDICATOR_VECTORIZED_ENGINE = False
+
+# Calculate indicators that define an SQL aggregation in the database, so only the value of each
+# bucket is loaded instead of every day's data
+INDICATOR_DATABASE_AGGREGATION = os.getenv('CC_INDICATOR_DATABASE_AGGREGATION', True)
+if INDICATOR_DATABASE_AGGREGATION == 'False' or INDICATOR_DATABASE_AGGREGATION == 'false':
+    INDICATOR_DATABASE_AGGREGATION = False
+
+# Number of threads in the pool the vectorized engine uses to reduce the data of each climate
+# model in parallel. Disabled if 0, in which case models are reduced in the request's thread
+INDICATOR_WORKERS = int(os.getenv('CC_INDICATOR_WORKERS', 0))
+
+# Seconds to keep the calculated values of an indicator request in the indicator result cache,
+# where requests for the same calculation in other units or aggregations can reuse them
+INDICATOR_RESULT_CACHE_TIMEOUT = int(os.getenv('CC_INDICATOR_RESULT_CACHE_TIMEOUT',
+                                               60 * 60 * 24))
+
+# Most indicators a single request to the batch indicator endpoint can calculate. Each one counts
+# as a request towards the throttling rates
+INDICATOR_BATCH_MAX_INDICATORS = int(os.getenv('CC_INDICATOR_BATCH_MAX_INDICATORS', 50))
+
+# Most locations a single request to the multi-location indicator endpoint can calculate
+INDICATOR_BATCH_MAX_LOCATIONS = int(os.getenv('CC_INDICATOR_BATCH_MAX_LOCATIONS', 200))
+
+# Number of locations in a multi-location indicator request that count as one request towards
+# the throttling rates. Locations share a single data query, so they cost less than a request each
+INDICATOR_BATCH_LOCATIONS_PER_REQUEST = int(
+    os.getenv('CC_INDICATOR_BATCH_LOCATIONS_PER_REQUEST', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
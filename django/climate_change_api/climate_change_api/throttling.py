@@ -21,10 +21,26 @@ class UserCustomRateThrottle(UserRateThrottle):
 
 
 class ClimateDataRateThrottle(UserCustomRateThrottle):
-    """Override to always use the throttling specific cache backend."""
+    """Override to always use the throttling specific cache backend.
+
+    Views that do the work of several requests at once can define a `get_throttle_cost(request)`
+    method returning the number of requests to count them as.
+    """
 
     cache = caches['api_throttling']
 
+    def allow_request(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        self.cost = get_throttle_cost(request) if get_throttle_cost is not None else 1
+        return super(ClimateDataRateThrottle, self).allow_request(request, view)
+
+    def throttle_success(self):
+        if len(self.history) + self.cost > self.num_requests:
+            return self.throttle_failure()
+        self.history[:0] = [self.now] * self.cost
+        self.cache.set(self.key, self.history, self.duration)
+        return True
+
 
 class ClimateDataBurstRateThrottle(ClimateDataRateThrottle):
     """Set a relatively low 'burst' rate limit, data queries are relatively expensive."""
@@ -60,12 +60,20 @@ urlpatterns = [
         climate_data_views.IndicatorListView.as_view(), name='climateindicator-list'),
     url(r'^api/indicator/(?P<indicator>.+)/$',
         climate_data_views.IndicatorDetailView.as_view(), name='climateindicator-detail'),
+    url(r'^api/climate-data/locations/' + SCENARIO + r'/indicator/(?P<indicator>.+)/$',
+        climate_data_views.IndicatorDataForLocationsView.as_view(),
+        name='climateindicatorlocations-get'),
     url(r'^api/climate-data/' + CITY_AND_SCENARIO + r'/indicator/(?P<indicator>.+)/$',
         climate_data_views.IndicatorDataForCityView.as_view(), name='climateindicator-get'),
+    url(r'^api/climate-data/' + CITY_AND_SCENARIO + r'/indicators/$',
+        climate_data_views.IndicatorBatchForCityView.as_view(), name='climateindicatorbatch-get'),
     url(r'^api/climate-data/' + CITY_AND_SCENARIO + '/$',
         climate_data_views.ClimateDataForCityView.as_view(), name='climatedata-list'),
     url(r'^api/climate-data/' + LAT_LNG_AND_SCENARIO + r'/indicator/(?P<indicator>.+)/$',
         climate_data_views.IndicatorDataForLatLonView.as_view(), name='climateindicatorlatlon-get'),
+    url(r'^api/climate-data/' + LAT_LNG_AND_SCENARIO + r'/indicators/$',
+        climate_data_views.IndicatorBatchForLatLonView.as_view(),
+        name='climateindicatorbatchlatlon-get'),
     url(r'^api/climate-data/' + LAT_LNG_AND_SCENARIO + r'/$',
         climate_data_views.ClimateDataForLatLonView.as_view(), name='climatedatalatlon-list'),
     url(r'^api/historic-range/$',
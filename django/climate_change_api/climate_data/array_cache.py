@@ -0,0 +1,305 @@
+import io
+import logging
+import math
+import os
+import tempfile
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+import numpy as np
+
+from climate_data.caching import get_data_version
+from climate_data.filters import ClimateDataFilterSet
+from climate_data.models import ClimateDataCube, ClimateDataYear, ClimateModel
+
+logger = logging.getLogger(__name__)
+
+# Days in the longest ClimateDataYear. Shorter years are padded with NaN
+MAX_DAYS = 366
+
+# Each ClimateDataYear is stored as one record, with its daily values as float32. The database's
+# packed values decode to float32, so this holds the same values as the database
+RECORD_DTYPE = np.dtype([('model_id', '<i4'), ('year', '<i2'), ('days', '<i2')] +
+                        [(var, '<f4', (MAX_DAYS,))
+                         for var in sorted(ClimateDataYear.VARIABLE_CHOICES)])
+
+
+def get_array_cache():
+    """Return the ClimateDataArrayCache configured by the settings, or None if it's disabled."""
+    if not settings.CLIMATE_DATA_ARRAY_CACHE_DIR:
+        return None
+    return ClimateDataArrayCache(settings.CLIMATE_DATA_ARRAY_CACHE_DIR,
+                                 settings.CLIMATE_DATA_ARRAY_CACHE_SIZE)
+
+
+def use_records():
+    """Return true if climate data is read as records, from the array cache or the cubes."""
+    return get_array_cache() is not None or settings.CLIMATE_DATA_CUBES
+
+
+def get_records(dataset, scenario, map_cell, years='', models='', offset_end=False):
+    """Return a map cell's records for the given filters.
+
+    Records are read from the array cache if it's enabled, and otherwise loaded each time.
+    Arguments are those of ClimateDataArrayCache.get_records.
+    """
+    array_cache = get_array_cache()
+    if array_cache is not None:
+        return array_cache.get_records(dataset, scenario, map_cell,
+                                       years=years, models=models, offset_end=offset_end)
+    return filter_records(load_records(dataset, scenario, map_cell),
+                          years=years, models=models, offset_end=offset_end)
+
+
+def filter_records(records, years='', models='', offset_end=False):
+    """Return the records matching the years and models filters.
+
+    @param years Comma separated list of year ranges, as taken by the ClimateDataFilterSet
+    @param models Comma separated list of climate model names
+    @param offset_end Whether to include the year after each year range
+    """
+    mask = np.ones(len(records), dtype=bool)
+    if years:
+        filterset = ClimateDataFilterSet(offset_end=offset_end)
+        mask[:] = False
+        for start, end in filterset.year_ranges(years):
+            mask |= (records['year'] >= start) & (records['year'] <= end)
+    if models:
+        model_ids = ClimateModel.objects.filter(name__in=models.split(','))
+        mask &= np.isin(records['model_id'], list(model_ids.values_list('id', flat=True)))
+    return records[mask]
+
+
+def load_records(dataset, scenario, map_cell):
+    """Load the records of every model and year of a map cell from the database.
+
+    Reads the map cell's cubes if they're enabled, and its ClimateDataYear rows otherwise.
+    Records are ordered by model and year.
+    """
+    if settings.CLIMATE_DATA_CUBES:
+        cubes = (ClimateDataCube.objects.filter(map_cell=map_cell,
+                                                dataset=dataset,
+                                                scenario=scenario)
+                                        .order_by('model_id')
+                                        .values_list('records', flat=True))
+        records = [unpack_cube(data) for data in cubes]
+        return np.concatenate(records) if records else np.zeros(0, dtype=RECORD_DTYPE)
+
+    return query_records(ClimateDataYear.objects.filter(map_cell=map_cell,
+                                                        dataset=dataset,
+                                                        scenario=scenario))
+
+
+def query_records(queryset):
+    """Load the records of the rows of a ClimateDataYear queryset, ordered by model and year."""
+    variables = sorted(ClimateDataYear.VARIABLE_CHOICES)
+    queryset = (queryset.order_by('model_id', 'year')
+                        .values_list('model_id', 'year', *variables))
+    # Fill the records as rows stream in, to avoid holding every row's lists at once
+    records = np.zeros(queryset.count(), dtype=RECORD_DTYPE)
+    count = 0
+    for row in islice(queryset.iterator(), len(records)):
+        record = records[count]
+        record['model_id'], record['year'] = row[:2]
+        record['days'] = max(len(values) for values in row[2:])
+        for var, values in zip(variables, row[2:]):
+            record[var][:len(values)] = values
+            record[var][len(values):] = np.nan
+        count += 1
+    return records[:count]
+
+
+def pack_cube(records):
+    """Compress records into the bytes stored by a ClimateDataCube."""
+    buffer = io.BytesIO()
+    np.save(buffer, records)
+    return zlib.compress(buffer.getvalue())
+
+
+def unpack_cube(data):
+    """Decompress the records stored by a ClimateDataCube."""
+    return np.load(io.BytesIO(zlib.decompress(data)))
+
+
+def update_cube(dataset, scenario, map_cell, model, years=None):
+    """Update the ClimateDataCube of a model's data for a map cell from its ClimateDataYear rows.
+
+    With `years`, only the rows of those years are read, and merged into the existing cube in place
+    of its records for those years, so importing a year doesn't read every other year again. The
+    cube is rebuilt from every year's rows if `years` isn't given, or if it doesn't exist yet.
+
+    The cube is locked while it's updated, so concurrent imports of different years of the same
+    model each see the other's records once it has committed, instead of overwriting them.
+    """
+    rows = ClimateDataYear.objects.filter(map_cell=map_cell, dataset=dataset, scenario=scenario,
+                                          model=model)
+    with transaction.atomic():
+        cube, created = ClimateDataCube.objects.get_or_create(
+            map_cell=map_cell, dataset=dataset, scenario=scenario, model=model,
+            defaults={'records': pack_cube(np.zeros(0, dtype=RECORD_DTYPE))})
+        cube = ClimateDataCube.objects.select_for_update().get(id=cube.id)
+        if years is None or created:
+            records = query_records(rows)
+        else:
+            records = unpack_cube(cube.records)
+            records = np.concatenate([records[~np.isin(records['year'], years)],
+                                      query_records(rows.filter(year__in=years))])
+            records = records[records['year'].argsort(kind='mergesort')]
+        cube.records = pack_cube(records)
+        cube.save()
+    return cube
+
+
+def daily_values_list(values):
+    """Convert an array of daily values into a list, with None for missing days.
+
+    Lists of values are returned as is.
+    """
+    if isinstance(values, np.ndarray):
+        return [None if math.isnan(value) else value for value in values.tolist()]
+    return values
+
+
+def iterate_rows(records, variables):
+    """Convert cached records into ClimateDataYear value dicts, like those an Indicator queries.
+
+    Daily values are arrays of the record's days, with NaN for missing days.
+    """
+    for record in records:
+        row = {
+            'model_id': int(record['model_id']),
+            'year': int(record['year']),
+        }
+        for var in variables:
+            row[var] = record[var][:record['days']]
+        yield row
+
+
+class ClimateDataArrayCache(object):
+    """Cache of the decoded ClimateDataYear arrays of each map cell, shared between processes.
+
+    The data of every model and year for a dataset, scenario and map cell is stored as a single
+    .npy file of RECORD_DTYPE records, which are memory mapped when read. Every process using the
+    same directory shares the mapped pages through the OS page cache, so a hot map cell's data is
+    held in memory once instead of once per process. Putting the directory on a tmpfs, like
+    /dev/shm, keeps it entirely in shared memory.
+
+    Files are named by the version of the map cell's data, so once the data is written again every
+    process reads a new file, whichever host the import ran on. Superseded files are no longer
+    read, and are removed like any other file that isn't used.
+
+    Files are written atomically, and a file's modification time is updated each time it's read.
+    Once the files' total size exceeds `max_size` bytes, the least recently used are removed.
+
+    @param directory Path of the directory to store arrays in
+    @param max_size Most bytes to store before evicting the least recently used arrays
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def prefix(dataset, scenario, map_cell):
+        return '{}_{}_{}_'.format(dataset.name, scenario.name, map_cell.id)
+
+    def path(self, dataset, scenario, map_cell, version=None):
+        """Return the path of the file of a version of a map cell's data.
+
+        Defaults to the current version of the data.
+        """
+        if version is None:
+            version = get_data_version(dataset, scenario, map_cell)
+        return os.path.join(self.directory,
+                            '{}{}.npy'.format(self.prefix(dataset, scenario, map_cell), version))
+
+    def get(self, dataset, scenario, map_cell, version=None):
+        """Return the memory mapped records of a map cell, or None if they aren't cached."""
+        path = self.path(dataset, scenario, map_cell, version)
+        try:
+            records = np.load(path, mmap_mode='r')
+            # Mark the file as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return records
+
+    def set(self, dataset, scenario, map_cell, records, version=None):
+        """Store the records of a map cell, and evict the least recently used if needed."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file that replaces the old one all at once, so other processes
+        # never read a partially written file
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            try:
+                np.save(f, records)
+            except Exception:
+                os.remove(f.name)
+                raise
+        os.replace(f.name, self.path(dataset, scenario, map_cell, version))
+        self.evict()
+
+    def invalidate(self, dataset, scenario, map_cell):
+        """Remove every version of the records of a map cell stored on this host.
+
+        Other hosts stop reading their files once the data's version changes, so this only frees
+        the space they take up here sooner.
+        """
+        prefix = self.prefix(dataset, scenario, map_cell)
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.name.endswith('.npy'):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        """Remove the least recently used files until the cache is within its maximum size."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            # Processes that have the file mapped keep reading it until they're done
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            logger.debug('Evicted %s from the array cache', path)
+
+    @staticmethod
+    def load(dataset, scenario, map_cell):
+        """Load the records of every model and year of a map cell from the database."""
+        return load_records(dataset, scenario, map_cell)
+
+    def get_records(self, dataset, scenario, map_cell, years='', models='', offset_end=False):
+        """Return a map cell's records for the given filters, loading them if they aren't cached.
+
+        @param years Comma separated list of year ranges, as taken by the ClimateDataFilterSet
+        @param models Comma separated list of climate model names
+        @param offset_end Whether to include the year after each year range
+        @returns Array of RECORD_DTYPE records, ordered by model and year
+        """
+        # Get the version before loading the data, so it's never stored under a newer version
+        # than the data it was loaded from
+        version = get_data_version(dataset, scenario, map_cell)
+        records = self.get(dataset, scenario, map_cell, version)
+        if records is None:
+            records = self.load(dataset, scenario, map_cell)
+            self.set(dataset, scenario, map_cell, records, version)
+        return filter_records(records, years=years, models=models, offset_end=offset_end)
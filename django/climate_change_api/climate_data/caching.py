@@ -1,4 +1,17 @@
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
 import logging
+import re
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 
 from rest_framework.renderers import BrowsableAPIRenderer
 
@@ -7,21 +20,266 @@ from rest_framework_extensions.cache.mixins import BaseCacheResponseMixin
 
 from rest_framework_extensions.key_constructor.constructors import DefaultKeyConstructor
 from rest_framework_extensions.key_constructor.bits import (ArgsKeyBit,
+                                                            KeyBitBase,
                                                             KwargsKeyBit,
                                                             QueryParamsKeyBit,)
+from statsd.defaults.django import statsd
 
 logger = logging.getLogger(__name__)
 
 
+def cache_disabled(request):
+    """Return true if the request disables caching with the noCache=True parameter."""
+    nocache_param = request.query_params.get('noCache', '')
+    return nocache_param == 'True' or nocache_param == 'true'
+
+
+# Responses shorter than this aren't worth compressing
+MIN_COMPRESSED_LENGTH = 200
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def accepts_gzip(request):
+    """Return true if the request's Accept-Encoding header accepts gzip encoded responses."""
+    return bool(ACCEPTS_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def compress_response(response):
+    """Return a gzip encoded copy of a rendered response.
+
+    Returns the response itself if compression is disabled, the response is already encoded, or
+    it's too short to shrink when compressed.
+    """
+    level = settings.API_VIEW_CACHE_COMPRESSION_LEVEL
+    if (not level or response.has_header('Content-Encoding') or
+            len(response.content) < MIN_COMPRESSED_LENGTH):
+        return response
+    content = gzip.compress(response.content, level)
+    if len(content) >= len(response.content):
+        return response
+    return copy_response(response, content, 'gzip')
+
+
+def decompress_response(response):
+    """Return a copy of a gzip encoded response with its content decoded.
+
+    Returns the response itself if it isn't gzip encoded.
+    """
+    if response.get('Content-Encoding') != 'gzip':
+        return response
+    return copy_response(response, gzip.decompress(response.content), None)
+
+
+def copy_response(response, content, content_encoding):
+    """Return a copy of a response with new content, in an encoding or unencoded if None."""
+    copy = HttpResponse(content, status=response.status_code)
+    for header, value in response.items():
+        if header.lower() not in ('content-encoding', 'content-length'):
+            copy[header] = value
+    if content_encoding is not None:
+        copy['Content-Encoding'] = content_encoding
+    return copy
+
+
+# Cache holding the data versions, shared by every process like the cached responses
+DATA_VERSION_CACHE = 'api_views'
+
+
+def data_version_key(dataset_id, scenario_id, map_cell_id):
+    return 'data_version:{}:{}:{}'.format(dataset_id, scenario_id, map_cell_id)
+
+
+# Key of the version of the data lookups, which changes each time any data is written, since new
+# map cells can change the map cell a location resolves to
+LOOKUP_VERSION_KEY = 'data_lookup_version'
+
+
+def get_version(cache, key):
+    """Return the version stored under a key, storing a new random version if it isn't set."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_data_version(dataset, scenario, map_cell):
+    """Return the version of the climate data of a dataset, scenario and map cell.
+
+    Versions change each time the data is written, so anything cached under a version is never
+    read again once the data changes. Versions that aren't set yet, or have been evicted, get a
+    new random version, so responses cached under an older one are never read either.
+    """
+    cache = caches[DATA_VERSION_CACHE]
+    return get_version(cache, data_version_key(dataset.id, scenario.id, map_cell.id))
+
+
+def get_request_data_version(request_key, lookup):
+    """Return the version of the climate data a request is for, querying it only once per request.
+
+    `request_key` is a list of everything in the request that identifies its dataset, scenario
+    and map cell, like the scenario and dataset names and the city ID or point, and `lookup` is
+    a function returning the (dataset, scenario, map_cell) of the request. The IDs it returns are
+    cached under the request key, so cached responses are found without any database queries
+    once a request has been looked up. The cached IDs are looked up again after any data is
+    written.
+    """
+    cache = caches[DATA_VERSION_CACHE]
+    key = 'data_lookup:{}'.format(hashlib.md5(json.dumps(request_key).encode()).hexdigest())
+    cached = cache.get_many([LOOKUP_VERSION_KEY, key])
+    lookup_version = cached.get(LOOKUP_VERSION_KEY)
+    if lookup_version is None:
+        lookup_version = get_version(cache, LOOKUP_VERSION_KEY)
+    if key in cached and cached[key][0] == lookup_version:
+        ids = cached[key][1]
+    else:
+        dataset, scenario, map_cell = lookup()
+        ids = (dataset.id, scenario.id, map_cell.id)
+        cache.set(key, (lookup_version, ids), None)
+    return get_version(cache, data_version_key(*ids))
+
+
+def bump_data_versions(dataset, scenarios, map_cells):
+    """Give the climate data of each scenario of the map cells of a dataset a new version.
+
+    Call after writing data, so responses and values cached for the old data aren't used again.
+    """
+    versions = {data_version_key(dataset.id, scenario.id, map_cell.id): uuid4().hex
+                for scenario in scenarios
+                for map_cell in map_cells}
+    versions[LOOKUP_VERSION_KEY] = uuid4().hex
+    caches[DATA_VERSION_CACHE].set_many(versions, None)
+
+
+def request_data_version(view_instance, request, kwargs):
+    """Return the version of the climate data a view responds to a request with.
+
+    Views that respond with a map cell's data define `get_data_version(request, kwargs)`, which
+    returns the version of the data of the requested dataset, scenario and map cell. Returns None
+    for other views. The version is kept on the request, since both the request's ETag and its
+    cache key need it.
+    """
+    if not hasattr(request, '_data_version'):
+        get_version = getattr(view_instance, 'get_data_version', None)
+        request._data_version = get_version(request, kwargs) if get_version is not None else None
+    return request._data_version
+
+
+def data_etag(view_instance, request, kwargs):
+    """Return a strong ETag for a view's response to a request, or None if it has no data version.
+
+    The ETag is a hash of the data version and of everything else the response depends on: the
+    view, its kwargs, its query params other than noCache, and the format it's rendered in. It's
+    computed without loading any climate data, so requests can be validated before they're
+    calculated.
+    """
+    version = request_data_version(view_instance, request, kwargs)
+    if version is None:
+        return None
+    params = sorted((key, values) for key, values in request.query_params.lists()
+                    if key != 'noCache')
+    etag_data = [version, type(view_instance).__name__, sorted(kwargs.items()), params,
+                 request.accepted_renderer.format]
+    return '"{}"'.format(hashlib.md5(json.dumps(etag_data).encode()).hexdigest())
+
+
+class DataVersionKeyBit(KeyBitBase):
+    """Key bit of the version of the climate data a view's response is made from."""
+
+    def get_data(self, params, view_instance, view_method, request, args, kwargs):
+        return request_data_version(view_instance, request, kwargs)
+
+
 class FullUrlKeyConstructor(DefaultKeyConstructor):
     args = ArgsKeyBit()
     kwargs = KwargsKeyBit()
     query_params = QueryParamsKeyBit()
+    data_version = DataVersionKeyBit()
 
 
 full_url_cache_key_func = FullUrlKeyConstructor()
 
 
+class LocalResponseCache(object):
+    """In-process LRU cache of rendered responses, kept in front of the shared cache.
+
+    Stores each response's status, headers and content instead of the response object, so every
+    request gets its own response to modify. Responses expire after API_VIEW_LOCAL_CACHE_TIMEOUT
+    seconds, since a process's copy isn't updated when the shared cache is, and once the cached
+    responses take up more than API_VIEW_LOCAL_CACHE_SIZE bytes the least recently used are
+    evicted. Disabled if either setting is 0.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    @staticmethod
+    def enabled():
+        return settings.API_VIEW_LOCAL_CACHE_SIZE > 0 and settings.API_VIEW_LOCAL_CACHE_TIMEOUT > 0
+
+    def get(self, key):
+        """Return a copy of the response cached for a key, or None if it isn't cached."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, _, status, headers, content = entry
+            if expires <= time.monotonic():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+
+        response = HttpResponse(content, status=status)
+        for header, value in headers:
+            response[header] = value
+        return response
+
+    def set(self, key, response):
+        """Cache a rendered response, evicting the least recently used responses if needed."""
+        headers = list(response.items())
+        content = response.content
+        size = len(content) + sum(len(header) + len(value) for header, value in headers)
+        max_size = settings.API_VIEW_LOCAL_CACHE_SIZE
+        if size > max_size:
+            return
+
+        expires = time.monotonic() + settings.API_VIEW_LOCAL_CACHE_TIMEOUT
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (expires, size, response.status_code, headers, content)
+            self.size += size
+            while self.size > max_size:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        """Remove a key's response. Must be called while holding the lock."""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+local_response_cache = LocalResponseCache()
+
+
+class CacheLock(object):
+    """Lock held in a cache, which can be released by closing it like a response's resources."""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+
+    def close(self):
+        self.cache.delete(self.key)
+
+
 class OverridableCacheResponse(CacheResponse):
     """
     Modify the behavior of drf-extensions caching to allow per-query cache disabling.
@@ -30,31 +288,202 @@ class OverridableCacheResponse(CacheResponse):
 
     Requires the settings cache configuration to contain both a `default` and a `bypass`
     cache alias defined (use DummyCache to bypass).
+
+    Responses are read from the process's LocalResponseCache before the shared cache, and stored
+    in both. Hits and misses of each tier are counted in statsd.
+
+    When a response isn't cached, the process creating it holds a lock in the shared cache for up
+    to `lock_timeout` seconds (API_VIEW_CACHE_LOCK_TIMEOUT by default, disabled if 0). Other
+    requests for the same response wait up to API_VIEW_CACHE_LOCK_WAIT seconds for it to be cached
+    instead of creating it again. With a `stale_timeout`, a copy of each response is kept that
+    long after it expires, and is returned to those requests right away while the response is
+    recreated.
+
+    Responses are cached gzip compressed, unless API_VIEW_CACHE_COMPRESSION_LEVEL is 0. Cached
+    responses are sent to clients that accept gzip as they were stored, and decompressed for
+    other clients.
+
+    Each response's `cache_hit` attribute is set to whether it was read from a cache.
     """
 
+    # Seconds between checks for a response another process is creating
+    lock_poll_interval = 0.1
+
     def __init__(self, timeout=None,
                  key_func=None,
                  cache=None,
                  cache_errors=None,
-                 bypass_cache='bypass'):
+                 bypass_cache='bypass',
+                 lock_timeout=None,
+                 stale_timeout=0):
         super(OverridableCacheResponse, self).__init__(timeout, key_func, cache, cache_errors)
         self.default_cache = self.cache
         self.bypass_cache = get_cache(bypass_cache)
+        self.lock_timeout = lock_timeout
+        self.stale_timeout = stale_timeout
 
-    def process_cache_response(self, view_instance, view_method, request, *args, **kwargs):
-        nocache_param = request.query_params.get('noCache', '')
-        if nocache_param and (nocache_param == 'True' or nocache_param == 'true'):
-            self.cache = self.bypass_cache
+    def process_cache_response(self, view_instance, view_method, request, args, kwargs):
+        # The decorator is shared by every request to the view, so the request's cache is passed
+        # around rather than set on it
+        if cache_disabled(request):
+            cache = self.bypass_cache
         elif isinstance(request.accepted_renderer, BrowsableAPIRenderer):
             # never cache browsable API responses, which are session dependent
-            self.cache = self.bypass_cache
+            cache = self.bypass_cache
         else:
-            self.cache = self.default_cache
-        return super(OverridableCacheResponse, self).process_cache_response(view_instance,
-                                                                            view_method,
-                                                                            request,
-                                                                            *args,
-                                                                            **kwargs)
+            cache = self.default_cache
+
+        key = self.calculate_key(
+            view_instance=view_instance,
+            view_method=view_method,
+            request=request,
+            args=args,
+            kwargs=kwargs
+        )
+        response = self.get_cached_response(cache, view_instance, key)
+        locked = False
+        if not response and cache is not self.bypass_cache and self.get_lock_timeout():
+            locked = cache.add(self.lock_key(key), True, self.get_lock_timeout())
+            if not locked:
+                # Another process is creating this response, so use its response instead of
+                # creating it again
+                response = self.get_stale_response(cache, view_instance, key)
+                if not response:
+                    response = self.wait_for_response(cache, key)
+        cache_hit = bool(response)
+        if not response:
+            response = self.create_response(cache, view_instance, view_method, request, args,
+                                            kwargs, key, locked)
+
+        if cache is not self.bypass_cache:
+            if not accepts_gzip(request):
+                response = decompress_response(response)
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response.cache_hit = cache_hit
+
+        if not hasattr(response, '_closable_objects'):
+            response._closable_objects = []
+
+        return response
+
+    def create_response(self, cache, view_instance, view_method, request, args, kwargs, key,
+                        locked):
+        """Create a response with the view, and cache it.
+
+        If `locked`, releases the lock once the response is cached, or fails to be.
+        """
+        release_lock = locked
+        try:
+            response = view_method(view_instance, request, *args, **kwargs)
+            response = view_instance.finalize_response(request, response, *args, **kwargs)
+            if response.streaming:
+                # Streamed responses are cached once they've been sent
+                if cache is not self.bypass_cache:
+                    response.streaming_content = self.cache_streaming_content(
+                        cache, key, response, response.streaming_content)
+                if locked:
+                    # Keep the lock until the response is closed, once it's been sent and cached
+                    response._closable_objects.append(CacheLock(cache, self.lock_key(key)))
+                    release_lock = False
+            else:
+                response.render()  # should be rendered, before picklining while storing to cache
+
+                if not response.status_code >= 400 or self.cache_errors:
+                    cached_response = self.set_cached_response(cache, key, response)
+                    if accepts_gzip(request):
+                        # Send the body that was compressed to be cached
+                        response = cached_response
+        finally:
+            if release_lock:
+                cache.delete(self.lock_key(key))
+        return response
+
+    def cache_streaming_content(self, cache, key, response, streaming_content):
+        """Yield the content of a streaming response, and cache it once it's all been sent.
+
+        The response is cached as a regular HttpResponse with the same content and headers.
+        """
+        chunks = []
+        for chunk in streaming_content:
+            chunks.append(chunk)
+            yield chunk
+
+        if not response.status_code >= 400 or self.cache_errors:
+            cached_response = HttpResponse(b''.join(chunks), status=response.status_code)
+            for header, value in response.items():
+                cached_response[header] = value
+            self.set_cached_response(cache, key, cached_response)
+
+    def get_lock_timeout(self):
+        if self.lock_timeout is not None:
+            return self.lock_timeout
+        return settings.API_VIEW_CACHE_LOCK_TIMEOUT
+
+    @staticmethod
+    def lock_key(key):
+        return '{}:lock'.format(key)
+
+    @staticmethod
+    def stale_key(key):
+        return '{}:stale'.format(key)
+
+    def get_stale_response(self, cache, view_instance, key):
+        """Return the stale copy of a response, or None if stale copies aren't kept."""
+        if not self.stale_timeout:
+            return None
+        response = cache.get(self.stale_key(key))
+        self.record_cache_result(view_instance, 'stale', response is not None)
+        return response
+
+    def wait_for_response(self, cache, key):
+        """Wait for the process holding the lock on a key to cache its response, and return it.
+
+        Returns None if the lock is released without the response being cached, like for errors,
+        or if it isn't cached within API_VIEW_CACHE_LOCK_WAIT seconds.
+        """
+        deadline = time.monotonic() + settings.API_VIEW_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            cached = cache.get_many([key, self.lock_key(key)])
+            if cached.get(key):
+                return cached[key]
+            if self.lock_key(key) not in cached:
+                return None
+        return None
+
+    def get_cached_response(self, cache, view_instance, key):
+        """Return the cached response for a key from the local cache or the shared cache."""
+        if cache is self.bypass_cache or not local_response_cache.enabled():
+            return cache.get(key)
+
+        response = local_response_cache.get(key)
+        self.record_cache_result(view_instance, 'local', response is not None)
+        if response is None:
+            response = cache.get(key)
+            self.record_cache_result(view_instance, 'shared', response is not None)
+            if response is not None:
+                local_response_cache.set(key, response)
+        return response
+
+    def set_cached_response(self, cache, key, response):
+        """Cache a rendered response, compressed, and return the response that was cached."""
+        if cache is self.bypass_cache:
+            return response
+        response = compress_response(response)
+        cache.set(key, response, self.timeout)
+        if self.stale_timeout:
+            stale_timeout = None if self.timeout is None else self.timeout + self.stale_timeout
+            cache.set(self.stale_key(key), response, stale_timeout)
+        if local_response_cache.enabled():
+            local_response_cache.set(key, response)
+        return response
+
+    @staticmethod
+    def record_cache_result(view_instance, tier, hit):
+        """Count a cache hit or miss in statsd, tagged with the view in the Librato format."""
+        metric = 'api_views.cache.{}.{}#view={}'.format(tier, 'hit' if hit else 'miss',
+                                                        type(view_instance).__name__)
+        statsd.incr(metric)
 
 
 overridable_cache_response = OverridableCacheResponse
@@ -40,7 +40,10 @@ class ClimateDataFilterSet(FilterSet):
     def __init__(self, *args, **kwargs):
         # year_col specifies which Django ORM reference we should use to filter by year.
         # For in-database cross-year aggregation this is overriden to specify a calculated year
-        self.year_col = kwargs.pop('year_col', 'data_source__year')
+        self.year_col = kwargs.pop('year_col', 'year')
+        # model_col specifies which Django ORM reference we should use to filter by model ID.
+        # Models without their own copy of the data source's fields filter through the relation
+        self.model_col = kwargs.pop('model_col', 'model_id')
         # offset_end designates if we should allow an extra year after to the last year specified
         # in a filter group. This is used by array-data cross-year aggregation to include data from
         # a subsequent year that can be used to fill in for the edge-case year
@@ -56,7 +59,7 @@ class ClimateDataFilterSet(FilterSet):
             # Load the models first and then filter on that to avoid scanning
             #  by model names in the final query.
             models = [m.id for m in ClimateModel.objects.filter(name__in=value.split(','))]
-            queryset = queryset.filter(data_source__model__id__in=models)
+            queryset = queryset.filter(**{'%s__in' % self.model_col: models})
         return queryset
 
     def filter_years(self, queryset, name, value):
@@ -72,33 +75,31 @@ class ClimateDataFilterSet(FilterSet):
         """
         if value:
             year_filters = []
-            for year_range_str in value.split(','):
-                year_range = year_range_str.split(':')
-
-                if self.offset_end:
-                    # In some cases we need to grab a year after our requested data
-                    if len(year_range) == 2:
-                        year_range[1] = int(year_range[1]) + 1
-                    elif len(year_range) == 1:
-                        end = int(year_range[0])
-                        year_range = [end, end + 1]
-
-                if len(year_range) == 2:
-                    # Pair the two years with their comparators, gte and lte respectively
-                    bounds = zip(['gte', 'lte'], year_range)
+            for start, end in self.year_ranges(value):
+                if start == end:
+                    year_filters.append(Q(**{self.year_col: start}))
+                else:
                     # Create two Q objects with the proper column, comparator and boundary year
-                    start, end = [Q(**{"%s__%s" % (self.year_col, comparator): year})
-                                  for comparator, year in bounds]
-                    # And the checks together
-                    year_filters.append(start & end)
-                if len(year_range) == 1:
-                    year = int(year_range[0])
-                    year_filters.append(Q(**{self.year_col: year}))
+                    # and the checks together
+                    year_filters.append(Q(**{"%s__gte" % self.year_col: start}) &
+                                        Q(**{"%s__lte" % self.year_col: end}))
             logger.debug(year_filters)
             # Now OR together all the year filters we've created
             queryset = queryset.filter(reduce(lambda x, y: x | y, year_filters))
         return queryset
 
+    def year_ranges(self, value):
+        """Parse a years filter value into a list of inclusive (start_year, end_year) tuples."""
+        ranges = []
+        for year_range_str in value.split(','):
+            year_range = [int(year) for year in year_range_str.split(':')]
+            start, end = year_range[0], year_range[-1]
+            if self.offset_end:
+                # In some cases we need to grab a year after our requested data
+                end += 1
+            ranges.append((start, end))
+        return ranges
+
     class Meta:
         model = ClimateDataYear
         fields = ['models', 'years']
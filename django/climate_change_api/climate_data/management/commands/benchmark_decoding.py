@@ -0,0 +1,76 @@
+import logging
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+import numpy as np
+from psycopg2 import BINARY
+from psycopg2.extensions import FLOATARRAY
+
+from climate_data.models import ClimateDataYear
+
+logger = logging.getLogger('climate_data')
+
+
+class Command(BaseCommand):
+    """Benchmark decoding ClimateDataYear values into NumPy arrays.
+
+    Fetches the text psycopg2 receives for a sample of rows, both for the packed columns and for
+    the float8[] arrays the values were stored as before they were packed, then times only the
+    decoding of that text with psycopg2's own typecasters. Packed values are unescaped into a
+    buffer and read with np.frombuffer, while arrays are parsed into a list of Python floats
+    before becoming an array.
+
+    Example usage:
+    ./manage.py benchmark_decoding --rows 10000
+    """
+
+    help = 'Compares the time to decode packed ClimateDataYear values against float8[] arrays'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help='Number of rows to decode')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of times to decode the rows, keeping the fastest')
+
+    def handle(self, *args, **options):
+        fields = [ClimateDataYear._meta.get_field(var)
+                  for var in sorted(ClimateDataYear.VARIABLE_CHOICES)]
+        # Select each packed column and the array it decodes into
+        columns = ', '.join('{0}::text, {1}::text'.format(f.column, f.unpack_sql(f.column))
+                            for f in fields)
+        query = 'SELECT {} FROM {} LIMIT %s'.format(columns, ClimateDataYear._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(query, [options['rows']])
+            rows = cursor.fetchall()
+        if not rows:
+            logger.error("No ClimateDataYear rows to decode")
+            return
+
+        for index, field in enumerate(fields):
+            packed = [row[index * 2] for row in rows]
+            arrays = [row[index * 2 + 1] for row in rows]
+
+            packed_time = self.time(lambda: [field.unpack(BINARY(value, None))
+                                             for value in packed],
+                                    options['repeat'])
+            array_time = self.time(lambda: [np.array(FLOATARRAY(value, None), dtype=float)
+                                            for value in arrays],
+                                   options['repeat'])
+
+            self.stdout.write('{}: decoded {} rows in {:.1f} ms from packed values, '
+                              '{:.1f} ms from arrays ({:.1f}x faster), {:.0f} bytes per row'.format(
+                                  field.name, len(rows), packed_time * 1000, array_time * 1000,
+                                  array_time / packed_time,
+                                  np.mean([len(BINARY(value, None)) for value in packed])))
+
+    @staticmethod
+    def time(func, repeat):
+        """Return the fastest time in seconds of several calls to a function."""
+        times = []
+        for _ in range(repeat):
+            start = perf_counter()
+            func()
+            times.append(perf_counter() - start)
+        return min(times)
@@ -0,0 +1,48 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from climate_data.array_cache import update_cube
+from climate_data.models import (ClimateDataCell, ClimateDataset, ClimateDataYear, ClimateModel,
+                                 Scenario)
+
+logger = logging.getLogger('climate_data')
+
+
+class Command(BaseCommand):
+    """Build the ClimateDataCube rows of existing ClimateDataYear data.
+
+    The importer keeps the cubes of the data it imports up to date, so this only needs to run once
+    for data imported before cubes existed, before enabling CC_CLIMATE_DATA_CUBES.
+
+    Example usage:
+    ./manage.py build_climate_data_cubes --dataset NEX-GDDP --scenario RCP85
+    """
+
+    help = 'Builds the ClimateDataCube rows of every model for each map cell with data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', type=str, action='append', dest='datasets',
+                            help='Dataset to build cubes of. Defaults to all datasets')
+        parser.add_argument('--scenario', type=str, action='append', dest='scenarios',
+                            help='Scenario to build cubes of. Defaults to all scenarios')
+
+    def handle(self, *args, **options):
+        datasets = ClimateDataset.objects.all()
+        if options['datasets']:
+            datasets = datasets.filter(name__in=options['datasets'])
+        scenarios = Scenario.objects.all()
+        if options['scenarios']:
+            scenarios = scenarios.filter(name__in=options['scenarios'])
+
+        for dataset in datasets:
+            for scenario in scenarios:
+                logger.info("Building cubes for %s %s", dataset.name, scenario.name)
+                data = ClimateDataYear.objects.filter(dataset=dataset, scenario=scenario)
+                map_cells = ClimateDataCell.objects.filter(id__in=data.values('map_cell'))
+                for map_cell in map_cells.iterator():
+                    models = ClimateModel.objects.filter(
+                        id__in=data.filter(map_cell=map_cell).values('model'))
+                    for model in models:
+                        update_cube(dataset, scenario, map_cell, model)
+                    logger.debug("Built cubes for cell (%f,%f)", map_cell.lat, map_cell.lon)
@@ -6,12 +6,16 @@ from django.db import IntegrityError
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from climate_data.array_cache import daily_values_list
+from climate_data.caching import bump_data_versions
 from climate_data.models import (ClimateDataBaseline,
                                  ClimateDataCell,
                                  HistoricAverageClimateDataYear,
                                  HistoricDateRange,
                                  ClimateDataset,
-                                 ClimateDataYear)
+                                 ClimateDataYear,
+                                 IndicatorDataYear,
+                                 Scenario)
 
 logger = logging.getLogger('climate_data')
 
@@ -31,8 +35,8 @@ def chunk_sequence(it, size):
 
 def generate_year_ranges(queryset):
     """Build index of historic 30 year ranges starting at a decade+1 mark, i.e. 1971-2000."""
-    historic_years = (queryset.values_list('data_source__year', flat=True)
-                              .order_by('data_source__year')
+    historic_years = (queryset.values_list('year', flat=True)
+                              .order_by('year')
                               .distinct())
 
     # Capture the correct start year
@@ -70,12 +74,13 @@ def generate_baselines(dataset, mapcells, time_periods, queryset):
         for period in time_periods:
             # queryset data was prior filtered by dataset
             period_model_values = [queryset.filter(map_cell=cell,
-                                                   data_source__model=model,
-                                                   data_source__year__gte=period.start_year,
-                                                   data_source__year__lte=period.end_year)
+                                                   model=model,
+                                                   year__gte=period.start_year,
+                                                   year__lte=period.end_year)
                                    .values(*VARIABLES)
                                    for model in dataset.models.all()]
-            variable_values = {var: [[v for mv in models for v in mv[var] if v is not None]
+            variable_values = {var: [[v for mv in models for v in daily_values_list(mv[var])
+                                      if v is not None]
                                      for models in period_model_values]
                                for var in VARIABLES}
 
@@ -118,8 +123,8 @@ def generate_year_averages(dataset, mapcells, time_periods, queryset):
             # Note: queryset data was prior filtered by dataset
             yearly_data = queryset.filter(
                 map_cell=cell,
-                data_source__year__gte=period.start_year,
-                data_source__year__lte=period.end_year
+                year__gte=period.start_year,
+                year__lte=period.end_year
             ).values(*VARIABLES)
 
             totals = {var: [0] * 366 for var in VARIABLES}
@@ -130,7 +135,7 @@ def generate_year_averages(dataset, mapcells, time_periods, queryset):
             # keep just a running total and count, and calculate the mean from that.
             for year in yearly_data:
                 for var in VARIABLES:
-                    for index, val in enumerate(year[var]):
+                    for index, val in enumerate(daily_values_list(year[var])):
                         if val is not None:
                             totals[var][index] += float(val)
                             counts[var][index] += 1
@@ -149,21 +154,34 @@ def generate_year_averages(dataset, mapcells, time_periods, queryset):
 @transaction.atomic
 def generate_historic_for_dataset(dataset, historic_year_data, time_periods):
     # Only use dataset's data
-    dataset_historic_year_data = historic_year_data.filter(data_source__dataset=dataset)
+    dataset_historic_year_data = historic_year_data.filter(dataset=dataset)
     map_cells = ClimateDataCell.objects.filter(
         id__in=dataset_historic_year_data.values('map_cell'))
 
+    # Map cells given new historic data, which changes their indicators for every scenario
+    updated_cells = set()
+
     logger.info("Importing yearly averages for %s ", dataset.name)
     averages = generate_year_averages(dataset, map_cells, time_periods,
                                       dataset_historic_year_data)
     for chunk in chunk_sequence(averages, BATCH_SIZE):
         HistoricAverageClimateDataYear.objects.bulk_create(chunk)
+        updated_cells.update(average.map_cell for average in chunk)
 
     logger.info("Importing percentile baselines for %s ", dataset.name)
     baselines = generate_baselines(dataset, map_cells, time_periods,
                                    dataset_historic_year_data)
     for chunk in chunk_sequence(baselines, BATCH_SIZE):
         ClimateDataBaseline.objects.bulk_create(chunk)
+        updated_cells.update(baseline.map_cell for baseline in chunk)
+
+    # New baselines change the historic indicators of every scenario, so drop the values
+    # materialized from the old ones
+    scenarios = list(Scenario.objects.all())
+    IndicatorDataYear.objects.delete_for_data(dataset, scenarios, updated_cells)
+
+    # Once the new data is committed, stop using responses cached for the old data
+    transaction.on_commit(lambda: bump_data_versions(dataset, scenarios, updated_cells))
 
 
 class Command(BaseCommand):
@@ -172,7 +190,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         # Create universal historic year range
         historic_year_data = ClimateDataYear.objects.filter(
-            data_source__scenario__name='historical')
+            scenario__name='historical')
         logger.info("Create historic year range")
         generate_year_ranges(historic_year_data)
 
@@ -3,9 +3,12 @@ import logging
 from itertools import islice
 
 from django.core.management.base import BaseCommand
+from django.conf import settings
 from django.contrib.gis.geos import Point
 from django.core.exceptions import ObjectDoesNotExist
 
+from climate_data.array_cache import get_array_cache, update_cube
+from climate_data.caching import bump_data_versions
 from climate_data.models import (City,
                                  Scenario,
                                  ClimateModel,
@@ -13,7 +16,8 @@ from climate_data.models import (City,
                                  ClimateDataCell,
                                  ClimateDataCityCell,
                                  ClimateDataYear,
-                                 ClimateDataset)
+                                 ClimateDataset,
+                                 IndicatorDataYear)
 
 import requests
 
@@ -175,6 +179,14 @@ def import_data(domain, token, remote_city_id, local_map_cell, scenario, model,
     logger.info('Imported in %f s', time() - start_time)
 
 
+def data_written(dataset, scenario, map_cell):
+    """Stop using the arrays and responses cached for a map cell's old data."""
+    array_cache = get_array_cache()
+    if array_cache is not None:
+        array_cache.invalidate(dataset, scenario, map_cell)
+    bump_data_versions(dataset, [scenario], [map_cell])
+
+
 class Command(BaseCommand):
     help = 'Downloads data from a remote instance and imports it locally'
 
@@ -228,8 +240,8 @@ class Command(BaseCommand):
                     continue
 
                 if ClimateDataYear.objects.filter(
-                        data_source__model=model,
-                        data_source__scenario=scenario,
+                        model=model,
+                        scenario=scenario,
                         map_cell=map_cell).exists():
                     logger.info('Skipping %s, data already imported', model.name)
                 else:
@@ -243,14 +255,21 @@ class Command(BaseCommand):
                             dataset=dataset,
                             scenario=scenario,
                             model=model)
+                        if settings.CLIMATE_DATA_CUBES:
+                            update_cube(dataset, scenario, map_cell, model)
+                        IndicatorDataYear.objects.delete_for_data(dataset, [scenario], [map_cell])
+                        data_written(dataset, scenario, map_cell)
                         imported_grid_cells[model.name].append(coordinates)
                     except Exception as ex:
                         logger.error(ex, exc_info=True)
                         logger.warn('Failed importing %s, destroying partial import', model.name)
                         ClimateDataYear.objects.filter(
-                            data_source__model=model,
-                            data_source__scenario=scenario,
+                            model=model,
+                            scenario=scenario,
                             map_cell=map_cell).delete()
+                        ClimateDataCell.objects.update_datasets([map_cell])
+                        IndicatorDataYear.objects.delete_for_data(dataset, [scenario], [map_cell])
+                        data_written(dataset, scenario, map_cell)
                         failure_logger.warn('Import failed for model %s scenario %s city %s %s, %s',
                                             model.name,
                                             scenario.name,
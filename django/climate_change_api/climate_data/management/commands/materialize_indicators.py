@@ -0,0 +1,66 @@
+import logging
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from climate_data.models import ClimateDataCell, ClimateDataset, ClimateDataYear, Scenario
+from indicators import indicator_factory, list_available_indicators
+
+logger = logging.getLogger('climate_data')
+
+
+class Command(BaseCommand):
+    """Precompute yearly indicator values for every climate model using default parameters.
+
+    Run after importing data so yearly indicator requests can be served from IndicatorDataYear.
+    Indicators with required parameters, like the threshold indicators, are skipped.
+
+    Example usage:
+    ./manage.py materialize_indicators --dataset NEX-GDDP --scenario RCP85 --indicator frost_days
+    """
+
+    help = 'Precomputes yearly indicator values with default parameters for each climate model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', type=str, action='append', dest='datasets',
+                            help='Dataset to materialize. Defaults to all datasets')
+        parser.add_argument('--scenario', type=str, action='append', dest='scenarios',
+                            help='Scenario to materialize. Defaults to all scenarios')
+        parser.add_argument('--indicator', type=str, action='append', dest='indicators',
+                            help='Indicator to materialize. Defaults to all indicators')
+
+    def handle(self, *args, **options):
+        datasets = ClimateDataset.objects.all()
+        if options['datasets']:
+            datasets = datasets.filter(name__in=options['datasets'])
+        scenarios = Scenario.objects.all()
+        if options['scenarios']:
+            scenarios = scenarios.filter(name__in=options['scenarios'])
+        indicator_names = (options['indicators'] or
+                           [indicator['name'] for indicator in list_available_indicators()])
+        indicator_classes = [indicator_factory(name) for name in indicator_names]
+
+        for dataset in datasets:
+            map_cells = ClimateDataCell.objects.filter(
+                id__in=ClimateDataYear.objects.filter(dataset=dataset)
+                                              .values('map_cell'))
+            for scenario in scenarios:
+                logger.info("Materializing indicators for %s %s", dataset.name, scenario.name)
+                for map_cell in map_cells:
+                    self.materialize_map_cell(indicator_classes, map_cell, scenario, dataset)
+
+    def materialize_map_cell(self, indicator_classes, map_cell, scenario, dataset):
+        for IndicatorClass in indicator_classes:
+            try:
+                indicator = IndicatorClass(map_cell, scenario,
+                                           parameters={'dataset': dataset.name})
+            except ValidationError:
+                # Indicators with required parameters have no default request to materialize
+                logger.debug("Skipping %s, which requires parameters", IndicatorClass.name())
+                continue
+
+            with transaction.atomic():
+                count = indicator.materialize()
+            logger.debug("Materialized %d values of %s for cell (%f,%f)",
+                         count, IndicatorClass.name(), map_cell.lat, map_cell.lon)
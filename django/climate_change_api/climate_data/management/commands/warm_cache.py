@@ -0,0 +1,148 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import logging
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.urls import resolve, reverse
+
+from rest_framework.test import APIRequestFactory
+
+logger = logging.getLogger('climate_data')
+
+# Metric counted by ClimateRequestLoggingMiddleware for each request
+STATSD_COUNT_METRIC = 'views.count'
+
+
+def warm(path, params):
+    """Request a path through its view and return whether its response was already cached.
+
+    Returns 'hit' for responses that were cached, 'miss' for ones that had to be created and
+    'error' for error responses, which aren't cached.
+
+    The view is used without permissions or throttling, since the requests aren't a user's.
+    """
+    match = resolve(path)
+    view = match.func.view_class.as_view(permission_classes=(), throttle_classes=())
+    try:
+        response = view(APIRequestFactory().get(path, params), *match.args, **match.kwargs)
+        try:
+            if response.streaming:
+                # Streamed responses are cached once they've been sent
+                for _ in response.streaming_content:
+                    pass
+        finally:
+            response.close()
+    finally:
+        # Close the worker's connection, as Django does at the end of each request
+        connection.close()
+
+    if response.status_code >= 400:
+        logger.warning("Failed to warm %s %s: status %d", path, params, response.status_code)
+        return 'error'
+    return 'hit' if response.cache_hit else 'miss'
+
+
+class Command(BaseCommand):
+    """Warm the response caches with the most requested climate data and indicators.
+
+    Replays requests through the API's views, so each response is cached under the same key a
+    client's request looks it up by. Requests are read from a file with one request per line,
+    either as JSON like:
+
+        {"city": 1, "scenario": "RCP85", "indicator": "frost_days",
+         "params": {"time_aggregation": "monthly"}, "count": 120}
+
+    where the indicator, params and count are optional, or as the statsd packets
+    ClimateRequestLoggingMiddleware sends, whose views.count metrics are tagged with the city,
+    scenario and indicator requested. Counts of identical requests are added up, and the most
+    requested are replayed first.
+
+    Requests are replayed in separate worker processes rather than threads, since the views
+    aren't written to handle concurrent requests in the same process.
+
+    Example usage:
+    ./manage.py warm_cache popular_requests.jsonl --limit 500 --concurrency 4
+    """
+
+    help = 'Caches the responses of the most requested climate data and indicators'
+
+    # Cache keys include the active language, so keep the one requests are made with
+    leave_locale_alone = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('requests', type=str,
+                            help='File of requests, as JSON lines or statsd packets')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Number of the most requested requests to replay. '
+                                 'Defaults to all requests')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of worker processes replaying requests at once')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('Concurrency must be at least 1')
+
+        counts = Counter()
+        with open(options['requests']) as requests_file:
+            for line in requests_file:
+                request = self.parse_request(line)
+                if request is not None:
+                    path, params, count = request
+                    counts[(path, tuple(sorted(params.items())))] += count
+        requests = [(path, dict(params))
+                    for (path, params), _ in counts.most_common(options['limit'])]
+
+        # Workers are forked from this process, so close its connections rather than share them
+        connections.close_all()
+        results = Counter()
+        start = perf_counter()
+        with ProcessPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = {executor.submit(warm, path, params): (path, params)
+                       for path, params in requests}
+            for index, future in enumerate(as_completed(futures), 1):
+                path, params = futures[future]
+                try:
+                    result = future.result()
+                except Exception:
+                    logger.exception("Failed to warm %s %s", path, params)
+                    result = 'error'
+                results[result] += 1
+                logger.info("Warmed %d of %d requests: %s %s (%s)",
+                            index, len(requests), path, params, result)
+
+        warmed = results['hit'] + results['miss']
+        hit_rate = results['hit'] / warmed * 100 if warmed else 0
+        self.stdout.write('Replayed {} requests in {:.1f} s: {} already cached, {} newly '
+                          'cached ({:.0f}% hit rate) and {} failed'.format(
+                              len(requests), perf_counter() - start, results['hit'],
+                              results['miss'], hit_rate, results['error']))
+
+    @staticmethod
+    def parse_request(line):
+        """Return the path, params and count of a line's request, or None if it has none."""
+        line = line.strip()
+        if line.startswith('{'):
+            request = json.loads(line)
+            count = int(request.get('count', 1))
+        else:
+            # A statsd packet like 'views.count#view=IndicatorDataForCityView,city=1,...:1|c'
+            metric, _, value = line.rpartition(':')
+            name, _, tags = metric.partition('#')
+            if name != STATSD_COUNT_METRIC:
+                return None
+            request = dict(tag.split('=', 1) for tag in tags.split(',') if '=' in tag)
+            count = int(value.partition('|')[0])
+
+        if 'city' not in request or 'scenario' not in request:
+            return None
+        kwargs = {'city': request['city'], 'scenario': request['scenario']}
+        if request.get('indicator'):
+            kwargs['indicator'] = request['indicator']
+            path = reverse('climateindicator-get', kwargs=kwargs)
+        else:
+            path = reverse('climatedata-list', kwargs=kwargs)
+        params = {key: str(value) for key, value in request.get('params', {}).items()}
+        return path, params, count
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import climate_data.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0074_auto_20190405_1259'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorDataYear',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('indicator', models.CharField(help_text='Name of the indicator, e.g. frost_days', max_length=64)),
+                ('params_hash', models.CharField(help_text='Hash of the parameters used to calculate the value', max_length=32)),
+                ('value', models.FloatField(null=True)),
+                ('data_source', climate_data.models.TinyForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_data.ClimateDataSource')),
+                ('map_cell', climate_data.models.TinyForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_data.ClimateDataCell')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='indicatordatayear',
+            unique_together=set([('indicator', 'params_hash', 'map_cell', 'data_source')]),
+        ),
+    ]
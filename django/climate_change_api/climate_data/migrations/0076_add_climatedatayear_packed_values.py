@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import climate_data.models
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+# Decode PackedArrayField blobs into double precision arrays, with NULL for missing days, so
+# daily values can still be aggregated in the database. Blobs start with the number of days
+# as a little-endian uint32, followed by the values, followed by a bitmap of the missing days
+UNPACK_FUNCTIONS_SQL = """
+CREATE OR REPLACE FUNCTION unpack_int16_values(data bytea, scale double precision,
+                                               base double precision)
+RETURNS double precision[] AS $$
+    SELECT array_agg(CASE WHEN (get_byte(data, 4 + 2 * days + day / 8) & (128 >> (day % 8))) > 0
+                          THEN NULL
+                          ELSE ((get_byte(data, 4 + 2 * day) + 256 * get_byte(data, 5 + 2 * day) +
+                                 32768) % 65536 - 32768) * scale + base
+                     END ORDER BY day)
+    FROM (SELECT get_byte(data, 0) + 256 * get_byte(data, 1) AS days) AS header,
+         generate_series(0, header.days - 1) AS day
+$$ LANGUAGE SQL IMMUTABLE STRICT;
+
+CREATE OR REPLACE FUNCTION unpack_float32_values(data bytea)
+RETURNS double precision[] AS $$
+    SELECT array_agg(CASE WHEN (get_byte(data, 4 + 4 * days + day / 8) & (128 >> (day % 8))) > 0
+                          THEN NULL
+                          WHEN exponent = 0
+                          THEN sign * mantissa * power(2::double precision, -149)
+                          ELSE sign * (mantissa + 8388608) *
+                               power(2::double precision, exponent - 150)
+                     END ORDER BY day)
+    FROM (SELECT get_byte(data, 0) + 256 * get_byte(data, 1) AS days) AS header,
+         generate_series(0, header.days - 1) AS day,
+         LATERAL (SELECT 1 - 2 * (get_byte(data, 7 + 4 * day) >> 7) AS sign,
+                         (get_byte(data, 7 + 4 * day) & 127) * 2 +
+                         (get_byte(data, 6 + 4 * day) >> 7) AS exponent,
+                         (get_byte(data, 6 + 4 * day) & 127) * 65536 +
+                         get_byte(data, 5 + 4 * day) * 256 +
+                         get_byte(data, 4 + 4 * day) AS mantissa) AS bits
+$$ LANGUAGE SQL IMMUTABLE STRICT;
+"""
+
+DROP_UNPACK_FUNCTIONS_SQL = """
+DROP FUNCTION IF EXISTS unpack_int16_values(bytea, double precision, double precision);
+DROP FUNCTION IF EXISTS unpack_float32_values(bytea);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0075_indicatordatayear'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='pr',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), help_text='Precipitation (mean of the daily precipitation rate), kg m-2 s-1', null=True, size=None),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='tasmax',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), help_text='Daily Maximum Near-Surface Air Temperature, Kelvin', null=True, size=None),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='tasmin',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), help_text='Daily Minimum Near-Surface Air Temperature, Kelvin', null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='pr_packed',
+            field=climate_data.models.PackedArrayField(dtype='<f4', help_text='Precipitation (mean of the daily precipitation rate), kg m-2 s-1', null=True),
+        ),
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='tasmax_packed',
+            field=climate_data.models.PackedArrayField(dtype='<i2', help_text='Daily Maximum Near-Surface Air Temperature, Kelvin', null=True, offset=256.0, scale=0.0078125),
+        ),
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='tasmin_packed',
+            field=climate_data.models.PackedArrayField(dtype='<i2', help_text='Daily Minimum Near-Surface Air Temperature, Kelvin', null=True, offset=256.0, scale=0.0078125),
+        ),
+        migrations.RunSQL(UNPACK_FUNCTIONS_SQL, reverse_sql=DROP_UNPACK_FUNCTIONS_SQL),
+    ]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+from psycopg2.extras import execute_values
+
+BATCH_SIZE = 1000
+VARIABLES = ('tasmin', 'tasmax', 'pr')
+
+
+def copy_values(apps, schema_editor, source_fields, target_fields,
+                convert=lambda values: values):
+    """Copy each row's values between fields, a batch of rows at a time in order of ID.
+
+    Each batch is written with a single UPDATE from a list of the batch's VALUES.
+    """
+    ClimateDataYear = apps.get_model('climate_data', 'ClimateDataYear')
+    connection = schema_editor.connection
+    fields = [ClimateDataYear._meta.get_field(name) for name in target_fields]
+    query = ('UPDATE {table} SET {assignments} FROM (VALUES %s) AS batch (id, {columns}) '
+             'WHERE {table}.id = batch.id').format(
+        table=ClimateDataYear._meta.db_table,
+        assignments=', '.join('{0} = batch.{0}'.format(field.column) for field in fields),
+        columns=', '.join(field.column for field in fields))
+    # Cast each value to its column's type, since it can't always be inferred from the values
+    template = '(%s, {})'.format(', '.join('%s::{}'.format(field.db_type(connection))
+                                           for field in fields))
+
+    last_id = 0
+    while True:
+        # Skip rows that have already been copied, in case a previous run was interrupted
+        rows = list(ClimateDataYear.objects.filter(id__gt=last_id, **{target_fields[0]: None})
+                                           .order_by('id')
+                                           .values_list('id', *source_fields)[:BATCH_SIZE])
+        if not rows:
+            break
+        # The packed fields encode the lists of the array fields when they're prepared
+        batch = [(row[0],) + tuple(field.get_db_prep_value(convert(values), connection)
+                                   for field, values in zip(fields, row[1:]))
+                 for row in rows]
+        with connection.cursor() as cursor:
+            execute_values(cursor.cursor, query, batch, template=template, page_size=BATCH_SIZE)
+        last_id = rows[-1][0]
+
+
+def pack_climate_data(apps, schema_editor):
+    copy_values(apps, schema_editor, VARIABLES, ['{}_packed'.format(var) for var in VARIABLES])
+
+
+def unpack_climate_data(apps, schema_editor):
+    def to_list(values):
+        return [None if value != value else value for value in values.tolist()]
+    copy_values(apps, schema_editor, ['{}_packed'.format(var) for var in VARIABLES], VARIABLES,
+                to_list)
+
+
+class Migration(migrations.Migration):
+
+    # The table is too large to pack in a single transaction. Rows are committed as they're packed,
+    # so running the migration again after an interruption continues where it left off
+    atomic = False
+
+    dependencies = [
+        ('climate_data', '0076_add_climatedatayear_packed_values'),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_climate_data, reverse_code=unpack_climate_data),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import climate_data.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0077_set_climatedatayear_packed_values'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='climatedatayear',
+            name='pr',
+        ),
+        migrations.RemoveField(
+            model_name='climatedatayear',
+            name='tasmax',
+        ),
+        migrations.RemoveField(
+            model_name='climatedatayear',
+            name='tasmin',
+        ),
+        migrations.RenameField(
+            model_name='climatedatayear',
+            old_name='pr_packed',
+            new_name='pr',
+        ),
+        migrations.RenameField(
+            model_name='climatedatayear',
+            old_name='tasmax_packed',
+            new_name='tasmax',
+        ),
+        migrations.RenameField(
+            model_name='climatedatayear',
+            old_name='tasmin_packed',
+            new_name='tasmin',
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='pr',
+            field=climate_data.models.PackedArrayField(dtype='<f4', help_text='Precipitation (mean of the daily precipitation rate), kg m-2 s-1'),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='tasmax',
+            field=climate_data.models.PackedArrayField(dtype='<i2', help_text='Daily Maximum Near-Surface Air Temperature, Kelvin', offset=256.0, scale=0.0078125),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='tasmin',
+            field=climate_data.models.PackedArrayField(dtype='<i2', help_text='Daily Minimum Near-Surface Air Temperature, Kelvin', offset=256.0, scale=0.0078125),
+        ),
+    ]
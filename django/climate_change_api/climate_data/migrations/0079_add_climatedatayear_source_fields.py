@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import climate_data.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0078_remove_climatedatayear_arrays'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='dataset',
+            field=climate_data.models.TinyForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.ClimateDataset'),
+        ),
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='model',
+            field=climate_data.models.TinyForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.ClimateModel'),
+        ),
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='scenario',
+            field=climate_data.models.TinyForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.Scenario'),
+        ),
+        migrations.AddField(
+            model_name='climatedatayear',
+            name='year',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Number of IDs of ClimateDataYear rows to update with each statement
+BATCH_SIZE = 100000
+
+# Copy the fields of each row's data source for a range of IDs, skipping rows that were already
+# copied, in case a previous run was interrupted
+SET_SOURCE_FIELDS_SQL = """
+UPDATE climate_data_climatedatayear AS data
+SET dataset_id = source.dataset_id,
+    scenario_id = source.scenario_id,
+    model_id = source.model_id,
+    year = source.year
+FROM climate_data_climatedatasource AS source
+WHERE source.id = data.data_source_id
+  AND data.id >= %s AND data.id < %s
+  AND data.year IS NULL;
+"""
+
+
+def set_source_fields(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(id), max(id) FROM climate_data_climatedatayear '
+                       'WHERE year IS NULL')
+        first_id, last_id = cursor.fetchone()
+        if first_id is None:
+            return
+        for start in range(first_id, last_id + 1, BATCH_SIZE):
+            cursor.execute(SET_SOURCE_FIELDS_SQL, [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    # The table is too large to update in a single transaction, which would rewrite every row at
+    # once. Each batch is committed as it's updated, so running the migration again after an
+    # interruption continues where it left off
+    atomic = False
+
+    dependencies = [
+        ('climate_data', '0079_add_climatedatayear_source_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_source_fields, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import climate_data.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    # Both operations lock ClimateDataYear for a full scan of the table. Setting the fields NOT
+    # NULL holds an ACCESS EXCLUSIVE lock, blocking reads as well as writes, and building the index
+    # holds a SHARE lock, blocking writes. Run it during a maintenance window
+
+    dependencies = [
+        ('climate_data', '0080_set_climatedatayear_source_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='dataset',
+            field=climate_data.models.TinyForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.ClimateDataset'),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='model',
+            field=climate_data.models.TinyForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.ClimateModel'),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='scenario',
+            field=climate_data.models.TinyForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.Scenario'),
+        ),
+        migrations.AlterField(
+            model_name='climatedatayear',
+            name='year',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AlterIndexTogether(
+            name='climatedatayear',
+            index_together=set([('map_cell', 'dataset', 'scenario', 'model', 'year')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import climate_data.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0081_climatedatayear_source_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateDataCube',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('records', models.BinaryField(help_text='zlib compressed .npy array of the yearly records')),
+                ('dataset', climate_data.models.TinyForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.ClimateDataset')),
+                ('map_cell', climate_data.models.TinyForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_data.ClimateDataCell')),
+                ('model', climate_data.models.TinyForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.ClimateModel')),
+                ('scenario', climate_data.models.TinyForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='climate_data.Scenario')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='climatedatacube',
+            unique_together=set([('map_cell', 'dataset', 'scenario', 'model')]),
+        ),
+    ]
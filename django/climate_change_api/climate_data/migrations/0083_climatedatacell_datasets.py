@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-16 12:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+# Set each cell's datasets from its ClimateDataYear rows in a single statement, since the table is
+# too large to query a cell at a time
+SET_DATASETS_SQL = """
+UPDATE climate_data_climatedatacell AS cell
+SET datasets = cell_datasets.datasets
+FROM (
+    SELECT data.map_cell_id, array_agg(dataset.name ORDER BY dataset.name) AS datasets
+    FROM (SELECT DISTINCT map_cell_id, dataset_id FROM climate_data_climatedatayear) AS data
+    JOIN climate_data_climatedataset AS dataset ON dataset.id = data.dataset_id
+    GROUP BY data.map_cell_id
+) AS cell_datasets
+WHERE cell.id = cell_datasets.map_cell_id;
+"""
+
+# Add the dataset of each ClimateDataYear row written to its cell's datasets, keeping them sorted
+ADD_DATASET_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION add_climatedatacell_dataset() RETURNS trigger AS $$
+BEGIN
+    UPDATE climate_data_climatedatacell AS cell
+    SET datasets = ARRAY(SELECT unnest(cell.datasets || dataset.name) ORDER BY 1)
+    FROM climate_data_climatedataset AS dataset
+    WHERE cell.id = NEW.map_cell_id
+      AND dataset.id = NEW.dataset_id
+      AND NOT cell.datasets @> ARRAY[dataset.name];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER climatedatayear_add_cell_dataset
+AFTER INSERT OR UPDATE OF map_cell_id, dataset_id ON climate_data_climatedatayear
+FOR EACH ROW EXECUTE PROCEDURE add_climatedatacell_dataset();
+"""
+
+DROP_ADD_DATASET_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS climatedatayear_add_cell_dataset ON climate_data_climatedatayear;
+DROP FUNCTION IF EXISTS add_climatedatacell_dataset();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0082_climatedatacube'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='climatedatacell',
+            name='datasets',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=48), blank=True, default=list, help_text='Names of the datasets with data for this cell', size=None),
+        ),
+        migrations.RunSQL(SET_DATASETS_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(ADD_DATASET_TRIGGER_SQL, reverse_sql=DROP_ADD_DATASET_TRIGGER_SQL),
+    ]
@@ -2,12 +2,14 @@ import logging
 
 from django.contrib.gis.db import models
 from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.geos import Point
 from django.contrib.postgres.fields.array import ArrayField
-from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import connection
 from django.db.models import CASCADE, SET_NULL
 
+import numpy as np
+
 from climate_data.geo_boundary import census
 
 logger = logging.getLogger(__name__)
@@ -23,13 +25,107 @@ class TinyOneToOne(models.OneToOneField):
         return models.SmallIntegerField().db_type(connection=connection)
 
 
-# TODO: Remove after upgrading to Django 2.0 (GH #867)
-class DistinctArrayAgg(ArrayAgg):
-    template = '%(function)s(DISTINCT %(expressions)s)'
+class PackedArrayField(models.BinaryField):
+    """Array of daily values stored as a packed binary blob instead of a double precision array.
+
+    Each blob holds the number of days as a little-endian uint32, followed by one value per day
+    of the field's `dtype`, followed by a bitmap with a bit set for each day without a value.
+    Integer values are scaled, so a stored integer `n` represents the value `n * scale + offset`.
+
+    Values are decoded with np.frombuffer into float32 arrays, with NaN for missing days, and can
+    be set from any sequence of numbers, with None or NaN for missing days.
+    In the database the unpack_int16_values() and unpack_float32_values() functions decode blobs
+    into arrays of double precision values, with NULL for missing days.
+    """
+
+    HEADER_DTYPE = np.dtype('<u4')
+    DTYPES = (np.dtype('<i2'), np.dtype('<f4'))
+
+    def __init__(self, *args, dtype='<f4', scale=1.0, offset=0.0, **kwargs):
+        if np.dtype(dtype) not in self.DTYPES:
+            raise ValueError('PackedArrayField dtype must be one of {}'.format(
+                ', '.join(dt.str for dt in self.DTYPES)))
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.offset = offset
+        super(PackedArrayField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(PackedArrayField, self).deconstruct()
+        kwargs['dtype'] = self.dtype.str
+        if self.scale != 1.0:
+            kwargs['scale'] = self.scale
+        if self.offset != 0.0:
+            kwargs['offset'] = self.offset
+        return name, path, args, kwargs
 
     @property
-    def output_field(self):
-        return ArrayField(self.source_expressions[0].output_field)
+    def is_scaled(self):
+        return self.dtype.kind == 'i'
+
+    def pack(self, values):
+        """Encode a sequence of daily values, with None or NaN for missing days, as a blob."""
+        # Converting to a float array converts any None into NaN
+        values = np.asarray(values, dtype=float)
+        missing = np.isnan(values)
+        values = np.where(missing, self.offset, values)
+        if self.is_scaled:
+            values = np.round((values - self.offset) / self.scale)
+            limits = np.iinfo(self.dtype)
+            if values.size and (values.min() < limits.min or values.max() > limits.max):
+                raise ValueError('Values must be between {} and {} to be packed'.format(
+                    limits.min * self.scale + self.offset, limits.max * self.scale + self.offset))
+        return b''.join([np.array(len(values), dtype=self.HEADER_DTYPE).tobytes(),
+                         values.astype(self.dtype).tobytes(),
+                         np.packbits(missing).tobytes()])
+
+    def unpack(self, data):
+        """Decode a blob into a float32 array of its daily values, with NaN for missing days."""
+        days = int(np.frombuffer(data, dtype=self.HEADER_DTYPE, count=1)[0])
+        values = np.frombuffer(data, dtype=self.dtype, count=days,
+                               offset=self.HEADER_DTYPE.itemsize)
+        bitmap = np.frombuffer(data, dtype=np.uint8, count=(days + 7) // 8,
+                               offset=self.HEADER_DTYPE.itemsize + values.nbytes)
+        missing = np.unpackbits(bitmap)[:days].view(bool)
+        if self.is_scaled:
+            values = values * np.float32(self.scale) + np.float32(self.offset)
+        elif missing.any():
+            # Unscaled values are a read-only view of the data, so they're only copied when there
+            # are missing days to fill in
+            values = values.copy()
+        if missing.any():
+            values[missing] = np.nan
+        return values
+
+    def unpack_sql(self, column):
+        """Return an SQL expression decoding a column of this field into a float8[] array."""
+        if self.is_scaled:
+            return 'unpack_int16_values({}, {!r}, {!r})'.format(
+                column, float(self.scale), float(self.offset))
+        return 'unpack_float32_values({})'.format(column)
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is None:
+            return value
+        return self.unpack(value)
+
+    def get_prep_value(self, value):
+        value = super(PackedArrayField, self).get_prep_value(value)
+        if value is None or isinstance(value, (bytes, memoryview)):
+            return value
+        return self.pack(value)
+
+    def to_python(self, value):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return value
+        return super(PackedArrayField, self).to_python(value)
+
+    def value_to_string(self, obj):
+        """Serialize the daily values as a list, with None for missing days."""
+        values = self.value_from_object(obj)
+        if values is None:
+            return values
+        return [None if value != value else value for value in np.asarray(values).tolist()]
 
 
 def get_datasets():
@@ -190,53 +286,101 @@ class ClimateDataCellManager(models.Manager):
         if distance > 0:
             map_cells = map_cells | self._map_cells_near_lat_lon(lat, lon, distance)
 
-        return map_cells.annotate(
-            datasets=DistinctArrayAgg('climatedatayear__data_source__dataset__name'),
-        ).order_by('distance')
+        return map_cells.order_by('distance')
+
+    def map_cell_ids_for_points(self, points, dataset, distance=0):
+        """Return the ID of the map cell with data for a dataset at each of a list of points.
+
+        Bulk equivalent of taking the first cell with data for the dataset from
+        map_cells_for_lat_lon, using a single query for all of the points: each point is matched
+        with the closest cell within the dataset's cell size of it, or within the given distance.
+
+        :arg list points: A list of (lat, lon) tuples
+        :arg ClimateDataset dataset: The dataset the map cells must have data for
+        :arg float distance: Distance in meters to search around each point (default: 0)
+        :returns: list of map cell IDs, in the order of the points, with None for points
+                  without data
+        """
+        if not points:
+            return []
+        query = """
+            SELECT (
+                SELECT cell.id
+                FROM {cell_table} AS cell
+                WHERE (ST_Within(cell.geom, ST_MakeEnvelope(point.lon - %(x_width)s,
+                                                            point.lat - %(y_width)s,
+                                                            point.lon + %(x_width)s,
+                                                            point.lat + %(y_width)s,
+                                                            4326)) OR
+                       ST_DWithin(cell.geog, point.geog, %(distance)s))
+                  AND cell.datasets @> ARRAY[%(dataset)s]::varchar[]
+                ORDER BY ST_Distance(cell.geog, point.geog)
+                LIMIT 1
+            )
+            FROM (
+                SELECT lat, lon, index,
+                       ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography AS geog
+                FROM unnest(%(lats)s::float8[], %(lons)s::float8[])
+                     WITH ORDINALITY AS points(lat, lon, index)
+            ) AS point
+            ORDER BY point.index;
+            """.format(cell_table=self.model._meta.db_table)
+        params = {
+            'x_width': float(dataset.cell_size_x) / 2,
+            'y_width': float(dataset.cell_size_y) / 2,
+            'distance': distance,
+            'dataset': dataset.name,
+            'lats': [float(lat) for lat, lon in points],
+            'lons': [float(lon) for lat, lon in points],
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return [map_cell_id for (map_cell_id,) in cursor.fetchall()]
 
     def _map_cells_at_lat_lon(self, lat, lon):
-        map_cell_ids = []
-        # The query to ClimateDataset could be problematic, but there are only 2 so it's not really
-        for dataset in ClimateDataset.objects.all():
-            map_cell_id = self._map_cell_id_at_lat_lon(lat, lon, dataset)
-            if map_cell_id is not None:
-                map_cell_ids.append(map_cell_id)
+        """Return the closest cell with data for each dataset within its cell size of a point.
+
+        The cells of every dataset are found with a single query, a nearest neighbour search of
+        each dataset's cells using the spatial index.
+        """
+        query = """
+            SELECT nearest.id
+            FROM {dataset_table} AS dataset
+            CROSS JOIN LATERAL (
+                SELECT cell.id
+                FROM {cell_table} AS cell
+                WHERE ST_Within(cell.geom, ST_MakeEnvelope(%(lon)s - dataset.cell_size_x / 2,
+                                                           %(lat)s - dataset.cell_size_y / 2,
+                                                           %(lon)s + dataset.cell_size_x / 2,
+                                                           %(lat)s + dataset.cell_size_y / 2,
+                                                           4326))
+                  AND cell.datasets @> ARRAY[dataset.name]
+                ORDER BY cell.geog <-> ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography
+                LIMIT 1
+            ) AS nearest;
+            """.format(dataset_table=ClimateDataset._meta.db_table,
+                       cell_table=self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(query, {'lat': lat, 'lon': lon})
+            map_cell_ids = [map_cell_id for (map_cell_id,) in cursor.fetchall()]
 
         search_point = Point(lon, lat, srid=4326)
         return ClimateDataCell.objects.filter(id__in=map_cell_ids).annotate(
             distance=Distance('geog', search_point)
         )
 
-    def _map_cell_id_at_lat_lon(self, lat, lon, dataset):
-        x_width = float(dataset.cell_size_x) / 2
-        y_width = float(dataset.cell_size_y) / 2
-        search_box = Polygon((
-            (lon - x_width, lat - y_width),
-            (lon - x_width, lat + y_width),
-            (lon + x_width, lat + y_width),
-            (lon + x_width, lat - y_width),
-            (lon - x_width, lat - y_width),
-        ))
-        search_point = Point(lon, lat, srid=4326)
-        map_cell_ids = (ClimateDataCell.objects.filter(geom__within=search_box)
-                                               .annotate(distance=Distance('geog', search_point))
-                                               .values_list('id', flat=True)
-                                               .order_by('distance'))
-        cells_checked = 0
-        for map_cell_id in map_cell_ids:
-            cells_checked += 1
-            exists_for_dataset = (ClimateDataYear.objects.filter(map_cell_id=map_cell_id,
-                                                                 data_source__dataset=dataset)
-                                                         .exists())
-            if exists_for_dataset:
-                if cells_checked > 4:
-                    logger.warning('Checked {} cells at point ({}, {}) for dataset {}'
-                                   .format(cells_checked, lon, lat, dataset.name))
-                return map_cell_id
-        if cells_checked > 4:
-            logger.warning('Checked {} cells at point ({}, {}) for dataset {}'
-                           .format(cells_checked, lon, lat, dataset.name))
-        return None
+    def update_datasets(self, map_cells):
+        """Set the datasets of map cells to the datasets they have ClimateDataYear rows for.
+
+        A trigger adds the dataset of each ClimateDataYear row inserted to its map cell, so this
+        is only needed after deleting a map cell's data.
+        """
+        for map_cell in map_cells:
+            datasets = (ClimateDataYear.objects.filter(map_cell=map_cell)
+                                               .order_by('dataset__name')
+                                               .values_list('dataset__name', flat=True)
+                                               .distinct())
+            self.filter(id=map_cell.id).update(datasets=list(datasets))
 
     def _map_cells_near_lat_lon(self, lat, lon, distance):
         search_point = Point(lon, lat, srid=4326)
@@ -259,6 +403,10 @@ class ClimateDataCell(models.Model):
 
     is_coastal = models.BooleanField(default=False)
 
+    # Kept up to date by a trigger that adds the dataset of each ClimateDataYear row inserted
+    datasets = ArrayField(models.CharField(max_length=48), default=list, blank=True,
+                          help_text='Names of the datasets with data for this cell')
+
     objects = ClimateDataCellManager()
 
     def save(self, *args, **kwargs):
@@ -456,25 +604,105 @@ class ClimateDataYear(models.Model):
 
     VARIABLE_CHOICES = set(('tasmax', 'tasmin', 'pr',))
 
+    # Temperatures are packed as int16 steps of 1/128 K from 256 K, which covers 0 K to 512 K with
+    # an error of at most 0.004 K. Precipitation rates are too small to scale, so they're packed as
+    # float32 like the imported data
+    TEMPERATURE_SCALE = 1 / 128
+    TEMPERATURE_OFFSET = 256.0
+
     id = models.BigAutoField(primary_key=True)
     map_cell = TinyForeignKey(ClimateDataCell)
     data_source = TinyForeignKey(ClimateDataSource)
 
-    tasmin = ArrayField(models.FloatField(),
-                        help_text='Daily Minimum Near-Surface Air Temperature, Kelvin')
-    tasmax = ArrayField(models.FloatField(),
-                        help_text='Daily Maximum Near-Surface Air Temperature, Kelvin')
-    pr = ArrayField(models.FloatField(),
-                    help_text='Precipitation (mean of the daily precipitation rate), kg m-2 s-1')
+    # Copies of the data source's fields, so a map cell's data can be filtered and ordered by them
+    # with the (map_cell, dataset, scenario, model, year) index alone, without joining the data
+    # source. Set from the data source when saved
+    dataset = TinyForeignKey(ClimateDataset, related_name='+', db_index=False)
+    scenario = TinyForeignKey(Scenario, related_name='+', db_index=False)
+    model = TinyForeignKey(ClimateModel, related_name='+', db_index=False)
+    year = models.PositiveSmallIntegerField()
+
+    tasmin = PackedArrayField(dtype='<i2', scale=TEMPERATURE_SCALE, offset=TEMPERATURE_OFFSET,
+                              help_text='Daily Minimum Near-Surface Air Temperature, Kelvin')
+    tasmax = PackedArrayField(dtype='<i2', scale=TEMPERATURE_SCALE, offset=TEMPERATURE_OFFSET,
+                              help_text='Daily Maximum Near-Surface Air Temperature, Kelvin')
+    pr = PackedArrayField(dtype='<f4',
+                          help_text='Precipitation (mean of the daily precipitation rate), '
+                                    'kg m-2 s-1')
 
     class Meta:
         unique_together = ('map_cell', 'data_source')
-        index_together = ('map_cell', 'data_source')
+        index_together = ('map_cell', 'dataset', 'scenario', 'model', 'year')
+
+    def save(self, *args, **kwargs):
+        self.dataset_id = self.data_source.dataset_id
+        self.scenario_id = self.data_source.scenario_id
+        self.model_id = self.data_source.model_id
+        self.year = self.data_source.year
+        super(ClimateDataYear, self).save(*args, **kwargs)
 
     def natural_key(self):
         return (self.map_cell, self.data_source)
 
 
+class IndicatorDataYearManager(models.Manager):
+    def delete_for_data(self, dataset, scenarios, map_cells):
+        """Delete the values materialized from the climate data of map cells of a dataset.
+
+        Call after writing data, so values calculated from the old data aren't used again. Every
+        model's values are deleted, even when only one model's data was written, since values found
+        for a map cell are used as if they were complete. Requests are calculated from raw data
+        until the indicators are materialized again.
+        """
+        return self.filter(map_cell__in=map_cells,
+                           data_source__dataset=dataset,
+                           data_source__scenario__in=scenarios).delete()
+
+
+class IndicatorDataYear(models.Model):
+    """Model storing precomputed yearly indicator values for a single climate model.
+
+    Filled by the materialize_indicators management command, so yearly indicator requests with
+    matching parameters only need to aggregate values across models instead of recalculating them
+    from raw ClimateDataYear data. Values are stored in the indicator's storage units.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    indicator = models.CharField(max_length=64, help_text='Name of the indicator, e.g. frost_days')
+    params_hash = models.CharField(max_length=32,
+                                   help_text='Hash of the parameters used to calculate the value')
+    map_cell = TinyForeignKey(ClimateDataCell)
+    data_source = TinyForeignKey(ClimateDataSource)
+
+    value = models.FloatField(null=True)
+
+    objects = IndicatorDataYearManager()
+
+    class Meta:
+        unique_together = ('indicator', 'params_hash', 'map_cell', 'data_source')
+
+
+class ClimateDataCube(models.Model):
+    """Model storing every year of a climate model's data for a map cell in a single row.
+
+    Holds the same values as the map cell's ClimateDataYear rows for the model, as a compressed
+    array of climate_data.array_cache.RECORD_DTYPE records ordered by year, so reading many years
+    of a map cell takes one sequential read per model instead of one random read per model and
+    year. Kept up to date by the importer, and built for existing data by the
+    build_climate_data_cubes management command.
+    """
+
+    map_cell = TinyForeignKey(ClimateDataCell)
+    dataset = TinyForeignKey(ClimateDataset, related_name='+')
+    scenario = TinyForeignKey(Scenario, related_name='+')
+    model = TinyForeignKey(ClimateModel, related_name='+')
+
+    records = models.BinaryField(help_text='zlib compressed .npy array of the yearly records')
+
+    class Meta:
+        unique_together = ('map_cell', 'dataset', 'scenario', 'model')
+
+
 class HistoricAverageClimateDataYear(models.Model):
     """Model storing computed averages for historic climate data for various historic ranges.
 
@@ -11,12 +11,15 @@ from django.db.utils import IntegrityError
 import numpy
 import netCDF4
 
+from climate_data.array_cache import get_array_cache, update_cube
+from climate_data.caching import bump_data_versions
 from climate_data.models import (
     City,
     ClimateDataCell,
     ClimateDataCityCell,
     ClimateDataYear,
     ClimateDataSource,
+    IndicatorDataYear,
 )
 from climate_data.nex2db.downloaders import get_netcdf_downloader
 from climate_data.nex2db.location_sources import (
@@ -156,7 +159,7 @@ class Nex2DB(object):
             cell_data = {}
             for (latidx, lonidx) in cell_indexes:
                 values = list(var_data[:, latidx, lonidx])
-                # Our DB assumes that leap years have 366 values in their ArrayFields.
+                # Our DB assumes that leap years have 366 daily values for each variable.
                 #   If we're woking with a calendar that doesn't consider leap years on a leap year,
                 #   insert None for Feb 29
                 if calendar.isleap(year) and len(values) == 365:
@@ -314,6 +317,33 @@ class Nex2DB(object):
         for coords, results in data_by_coords.items():
             self.save_climate_data_year(coords, results, cell_models)
 
+        # Merge this year into the cubes of this model's data for the imported cells. Cubes aren't
+        # kept up to date while they're disabled, and are built once they're needed with the
+        # build_climate_data_cubes command
+        if settings.CLIMATE_DATA_CUBES:
+            self.logger.debug('Updating cubes')
+            for coords in data_by_coords:
+                update_cube(self.datasource.dataset, self.datasource.scenario,
+                            cell_models[coords], self.datasource.model,
+                            years=[self.datasource.year])
+
+        # Remove this host's cached arrays of the imported cells. Every host stops reading them
+        # once the cells' data versions are bumped below, so this only frees their space sooner
+        array_cache = get_array_cache()
+        if array_cache is not None:
+            for coords in data_by_coords:
+                array_cache.invalidate(self.datasource.dataset, self.datasource.scenario,
+                                       cell_models[coords])
+
+        # Drop the indicator values materialized from the imported cells' old data
+        IndicatorDataYear.objects.delete_for_data(
+            self.datasource.dataset, [self.datasource.scenario],
+            [cell_models[coords] for coords in data_by_coords])
+
+        # Stop using responses cached for the imported cells' old data
+        bump_data_versions(self.datasource.dataset, [self.datasource.scenario],
+                           [cell_models[coords] for coords in data_by_coords])
+
         # Go through all the cities and update their ClimateDataCityCell representations
         # Ensuring only one entry exists for a given city and dataset
         self.logger.debug('Updating cities')
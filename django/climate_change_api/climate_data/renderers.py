@@ -1,5 +1,10 @@
+from collections import OrderedDict
+import io
+from itertools import chain
+
 import geobuf
-from rest_framework.renderers import BaseRenderer
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 
 
 class GeobufRenderer(BaseRenderer):
@@ -16,3 +21,116 @@ class GeobufRenderer(BaseRenderer):
     def render(self, data,
                media_type=None, renderer_context=None, format=None):
         return geobuf.encode(data)
+
+
+class NumpyRenderer(BaseRenderer):
+    """Renderer for downloading the data of climate data and indicator responses as a NumPy array.
+
+    The response's `data` object is rendered as a .npy file of a structured array with one record
+    per key, in order. Each record's `key` field holds the year or time period, and it has a
+    float32 field for each variable or aggregation, with an array of daily values for raw data.
+    Missing values are NaN. The other parts of the response aren't included.
+
+    Load with `numpy.load(io.BytesIO(response.content))`.
+
+    Error responses, which have no data, are rendered as JSON.
+    """
+
+    media_type = 'application/x-npy'
+    format = 'npy'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data,
+               media_type=None, renderer_context=None, format=None):
+        response = (renderer_context or {}).get('response')
+        if not isinstance(data, dict) or not isinstance(data.get('data'), dict):
+            if response is not None:
+                response['Content-Type'] = JSONRenderer.media_type
+            return JSONRenderer().render(data)
+
+        values = data['data']
+        records = np.zeros(len(values), dtype=self.get_dtype(values))
+        records['key'] = list(values.keys())
+        for name in records.dtype.names[1:]:
+            column = records[name]
+            column[...] = np.nan
+            for index, row in enumerate(values.values()):
+                value = row.get(name)
+                if isinstance(value, list):
+                    # Converting a list to a float array converts any None into NaN
+                    column[index, :len(value)] = np.array(value, dtype=float)
+                elif value is not None:
+                    column[index] = value
+
+        output = io.BytesIO()
+        np.save(output, records)
+        return output.getvalue()
+
+    @staticmethod
+    def get_dtype(values):
+        """Return the dtype of the records for a dictionary of data keyed by year or period."""
+        keys = list(values.keys())
+        if all(isinstance(key, int) for key in keys):
+            key_dtype = '<i4'
+        else:
+            key_dtype = '<U{}'.format(max((len(str(key)) for key in keys), default=1))
+
+        fields = [('key', key_dtype)]
+        names = OrderedDict.fromkeys(chain.from_iterable(values.values()))
+        for name in names:
+            lengths = [len(row[name]) for row in values.values()
+                       if isinstance(row.get(name), list)]
+            if lengths:
+                fields.append((str(name), '<f4', (max(lengths),)))
+            else:
+                fields.append((str(name), '<f4'))
+        return np.dtype(fields)
+
+
+class JSONObjectStream(object):
+    """Iterable of (key, value) tuples to render as a JSON object one item at a time.
+
+    Used in response data in place of a dict too large to generate all at once.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def __iter__(self):
+        """Iterate over the (key, value) tuples."""
+        return iter(self.items)
+
+
+def has_stream(data):
+    """Return true if the data is or contains a JSONObjectStream."""
+    return (isinstance(data, JSONObjectStream) or
+            (isinstance(data, dict) and any(has_stream(value) for value in data.values())))
+
+
+def stream_json(data, renderer):
+    """Render data as a sequence of chunks of JSON, one item of each JSONObjectStream at a time.
+
+    The chunks make up the same JSON the renderer would produce for the data if every
+    JSONObjectStream it contains were a dict.
+
+    @param data Response data
+    @param renderer JSONRenderer to render the values of objects with
+    """
+    if not has_stream(data):
+        # The JSONRenderer renders None as an empty response, but within an object it's null
+        yield b'null' if data is None else renderer.render(data)
+        return
+
+    items = data if isinstance(data, JSONObjectStream) else data.items()
+    separator = b'{'
+    for key, value in items:
+        # JSON object keys are always strings
+        key = renderer.render(str(key)) + b':'
+        if has_stream(value):
+            yield separator + key
+            yield from stream_json(value, renderer)
+        else:
+            yield separator + key + b''.join(stream_json(value, renderer))
+        separator = b','
+    yield b'{}' if separator == b'{' else b'}'
@@ -1,14 +1,18 @@
 from collections import OrderedDict
+from functools import partial
 from itertools import groupby
 import logging
+from operator import itemgetter
+import re
 
-from django.db.models import F
 from django.db.models.query import QuerySet
-from django.db import connection
+
+import numpy as np
 
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
+from climate_data.array_cache import MAX_DAYS, get_records, use_records
 from climate_data.models import (City,
                                  CityBoundary,
                                  ClimateDataCell,
@@ -21,7 +25,7 @@ from climate_data.models import (City,
                                  Scenario,
                                  HistoricDateRange)
 
-from indicators.serializers import float_avg
+from indicators.vectorized import ignore_empty_slice_warnings
 
 logger = logging.getLogger(__name__)
 
@@ -139,10 +143,25 @@ class ClimateMapCellScenarioDataSerializer(serializers.BaseSerializer):
     :param context Dict
         Provide key 'variables' with an iterable subset of ClimateDataYear.VARIABLE_CHOICES to
         filter the output.
-        Provide key 'aggregation' with one of ('min', 'max', 'avg') to aggregate the data values
-        across models. Default is 'avg'.
+        Provide key 'aggregation' with one of ('min', 'max', 'avg', 'median', 'stddev') or a
+        percentile like '95th' to aggregate the data values across models. Default is 'avg'.
+        Provide key 'precision' with a number of decimal places to round the values to. Default
+        is None, which doesn't round them.
+        Provide keys 'dataset', 'scenario' and 'map_cell', and optionally the 'years' and 'models'
+        filters the queryset was filtered with, to read the data from the array cache or the cubes
+        instead of the queryset when either is enabled.
     """
 
+    AGGREGATION_FUNCTIONS = {
+        'avg': np.nanmean,
+        'min': np.nanmin,
+        'max': np.nanmax,
+        'median': np.nanmedian,
+        'stddev': np.nanstd,
+        'stdev': np.nanstd,
+    }
+    PERCENTILE_REGEX = re.compile('^([0-9]?[0-9])th$', re.IGNORECASE)
+
     def __init__(self, instance=None, **kwargs):
         super(ClimateMapCellScenarioDataSerializer, self).__init__(instance, **kwargs)
         if self._context.get('variables', None) is None:
@@ -150,41 +169,83 @@ class ClimateMapCellScenarioDataSerializer(serializers.BaseSerializer):
         if self._context.get('aggregation', None) is None:
             self._context['aggregation'] = 'avg'
 
+    @classmethod
+    def is_valid_aggregation(cls, aggregation):
+        return (aggregation in cls.AGGREGATION_FUNCTIONS or
+                cls.PERCENTILE_REGEX.match(aggregation) is not None)
+
+    @classmethod
+    def get_aggregation_function(cls, aggregation):
+        """Return a function that reduces an array of values along an axis, ignoring NaN."""
+        percentile = cls.PERCENTILE_REGEX.match(aggregation)
+        if percentile:
+            return partial(np.nanpercentile, q=int(percentile.group(1)))
+        # default to averaging
+        return cls.AGGREGATION_FUNCTIONS.get(aggregation, np.nanmean)
+
     def to_representation(self, queryset):
-        aggregation_map = {
-            'avg': float_avg,
-            'min': min,
-            'max': max
-        }
         """Serialize queryset to the expected python object format."""
+        return dict(self.generate_representation(queryset))
+
+    def generate_representation(self, queryset):
+        """Return a sequence of (year, data) tuples of each year's output, in order of year.
+
+        Only one year's data is loaded at a time, so the output can be streamed as it's generated.
+        """
         assert isinstance(queryset, QuerySet), (
             'ClimateMapCellScenarioDataSerializer must be given a queryset')
 
-        aggregation = self._context['aggregation']
-
-        # default to averaging
-        aggregation_func = aggregation_map.get(aggregation, float_avg)
-
-        queryset = queryset.annotate(year=F('data_source__year'), model=F('data_source__model'))
-        queryset = queryset.order_by('year')
-
-        query = str(queryset.query)
-        cursor = connection.cursor()
-        cursor.execute(query)
-
-        output = {}
-        columns = [col[0] for col in cursor.description]
-        results = (dict(zip(columns, row)) for row in cursor.fetchall())
-        for year, year_collection in groupby(results, lambda r: r['year']):
-            year_collection = list(year_collection)
-            output[year] = {var: [None] * 366 for var in self._context['variables']}
-            for variable in self._context['variables']:
-                year_results = [r[variable] for r in year_collection]
-                for day, var_day in enumerate(zip(*year_results)):
-                    values = [val for val in var_day if val is not None]
-                    output[year][variable][day] = aggregation_func(values)
-
-        return output
+        aggregation_func = self.get_aggregation_function(self._context['aggregation'])
+        precision = self._context.get('precision')
+
+        for year, arrays in self.generate_year_arrays(queryset):
+            output = {}
+            for variable, values in arrays.items():
+                # Reduce every model's values for each day at once. Days without any values are
+                # NaN, which become None
+                with ignore_empty_slice_warnings():
+                    daily = aggregation_func(values, axis=0)
+                if precision is not None:
+                    daily = np.round(daily, precision)
+                daily_list = daily.astype(object)
+                daily_list[np.isnan(daily)] = None
+                output[variable] = daily_list.tolist()
+            yield year, output
+
+    def generate_year_arrays(self, queryset):
+        """Return a sequence of (year, arrays) tuples, in order of year.
+
+        Arrays is a dictionary of an array of shape (models, days) for each variable, with days
+        without data set to NaN. Models are truncated to the year's shortest model, so when models
+        with 365 and 366 day calendars are mixed the last day is NaN for every model.
+        """
+        variables = self._context['variables']
+        if use_records() and self._context.get('map_cell') is not None:
+            records = get_records(self._context['dataset'],
+                                  self._context['scenario'],
+                                  self._context['map_cell'],
+                                  years=self._context.get('years', ''),
+                                  models=self._context.get('models', ''))
+            records = records[records['year'].argsort(kind='mergesort')]
+            years, starts = np.unique(records['year'], return_index=True)
+            for year, year_records in zip(years.tolist(), np.split(records, starts[1:])):
+                arrays = {var: year_records[var].astype(float) for var in variables}
+                for values in arrays.values():
+                    values[:, year_records['days'].min():] = np.nan
+                yield year, arrays
+            return
+
+        rows = (queryset.order_by('year')
+                        .values_list('year', *variables)
+                        .iterator())
+        for year, year_rows in groupby(rows, itemgetter(0)):
+            year_rows = list(year_rows)
+            arrays = {var: np.full((len(year_rows), MAX_DAYS), np.nan) for var in variables}
+            days = min(len(values) for row in year_rows for values in row[1:])
+            for model, row in enumerate(year_rows):
+                for var, values in zip(variables, row[1:]):
+                    arrays[var][model, :days] = values[:days]
+            yield year, arrays
 
     def to_internal_value(self, data):
         raise NotImplementedError('ClimateMapCellScenarioDataSerializer is read only!')
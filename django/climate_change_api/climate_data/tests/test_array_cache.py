@@ -0,0 +1,125 @@
+import os
+import tempfile
+
+from django.test import TestCase
+
+from climate_data.array_cache import (ClimateDataArrayCache, daily_values_list, iterate_rows,
+                                      load_records, unpack_cube, update_cube)
+from climate_data.caching import bump_data_versions
+from climate_data.models import ClimateDataYear
+from climate_data.tests.mixins import ClimateDataSetupMixin
+
+
+class ClimateDataArrayCacheTestCase(ClimateDataSetupMixin, TestCase):
+
+    def setUp(self):
+        super(ClimateDataArrayCacheTestCase, self).setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ClimateDataArrayCache(directory.name, 1024 * 1024)
+
+    def test_get_records(self):
+        records = self.cache.get_records(self.dataset, self.rcp45, self.mapcell)
+        self.assertEqual([(record['model_id'], record['year']) for record in records],
+                         [(self.model1.id, 2000), (self.model1.id, 2001), (self.model1.id, 2002),
+                          (self.model1.id, 2003), (self.model2.id, 2000), (self.model2.id, 2001)])
+        self.assertEqual(list(records['tasmax'][:, 0]), [10, 10, 10, 10, 20, 20])
+        self.assertEqual(list(records['days']), [1] * 6)
+
+        # The second request is read from the cache
+        with self.assertNumQueries(0):
+            cached = self.cache.get_records(self.dataset, self.rcp45, self.mapcell)
+        self.assertEqual(cached.tolist(), records.tolist())
+
+    def test_get_records_filters(self):
+        records = self.cache.get_records(self.dataset, self.rcp45, self.mapcell,
+                                         years='2000,2002:2003', models='CCSM4')
+        self.assertEqual(list(records['year']), [2000, 2002, 2003])
+
+        records = self.cache.get_records(self.dataset, self.rcp45, self.mapcell,
+                                         years='2001', offset_end=True)
+        self.assertEqual(list(records['year']), [2001, 2002, 2001])
+
+    def test_missing_values(self):
+        records = self.cache.load(self.dataset, self.rcp45, self.mapcell)
+        records['pr'][0, 0] = float('nan')
+        row = next(iterate_rows(records, ['pr']))
+        self.assertEqual(row['model_id'], self.model1.id)
+        self.assertEqual(row['year'], 2000)
+        self.assertEqual(daily_values_list(row['pr']), [None])
+        self.assertEqual(daily_values_list([10.0, None]), [10.0, None])
+
+    def test_invalidate(self):
+        self.cache.get_records(self.dataset, self.rcp45, self.mapcell)
+        self.cache.invalidate(self.dataset, self.rcp45, self.mapcell)
+        self.assertIsNone(self.cache.get(self.dataset, self.rcp45, self.mapcell))
+
+    def test_new_data_version(self):
+        self.cache.get_records(self.dataset, self.rcp45, self.mapcell)
+        old_path = self.cache.path(self.dataset, self.rcp45, self.mapcell)
+
+        # New data is loaded from the database on every host once its version changes
+        bump_data_versions(self.dataset, [self.rcp45], [self.mapcell])
+        self.assertIsNone(self.cache.get(self.dataset, self.rcp45, self.mapcell))
+        self.cache.get_records(self.dataset, self.rcp45, self.mapcell)
+        self.assertNotEqual(self.cache.path(self.dataset, self.rcp45, self.mapcell), old_path)
+
+        # The superseded file is evicted first, since it's no longer read
+        os.utime(old_path, (0, 0))
+        self.cache.max_size = os.path.getsize(old_path)
+        self.cache.evict()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertIsNotNone(self.cache.get(self.dataset, self.rcp45, self.mapcell))
+
+    def test_evict_least_recently_used(self):
+        self.cache.get_records(self.dataset, self.rcp45, self.mapcell)
+        self.cache.get_records(self.dataset, self.rcp85, self.mapcell)
+        # Make the RCP85 file the least recently used
+        os.utime(self.cache.path(self.dataset, self.rcp85, self.mapcell), (0, 0))
+        self.cache.max_size = os.path.getsize(self.cache.path(self.dataset, self.rcp45,
+                                                              self.mapcell))
+
+        self.cache.evict()
+        self.assertIsNotNone(self.cache.get(self.dataset, self.rcp45, self.mapcell))
+        self.assertIsNone(self.cache.get(self.dataset, self.rcp85, self.mapcell))
+
+
+class ClimateDataCubeTestCase(ClimateDataSetupMixin, TestCase):
+
+    def test_update_cube(self):
+        cube = update_cube(self.dataset, self.rcp45, self.mapcell, self.model1)
+        records = unpack_cube(cube.records)
+        self.assertEqual(list(records['year']), [2000, 2001, 2002, 2003])
+        self.assertEqual(list(records['tasmax'][:, 0]), [10] * 4)
+
+        # Rebuilding the cube picks up changed data
+        ClimateDataYear.objects.filter(model=self.model1, year=2003).delete()
+        cube = update_cube(self.dataset, self.rcp45, self.mapcell, self.model1)
+        self.assertEqual(list(unpack_cube(cube.records)['year']), [2000, 2001, 2002])
+
+    def test_update_cube_years(self):
+        update_cube(self.dataset, self.rcp45, self.mapcell, self.model1)
+
+        # Only the given years are read again, and the cube's other records are kept
+        ClimateDataYear.objects.filter(model=self.model1, year=2001).update(tasmax=[20])
+        ClimateDataYear.objects.filter(model=self.model1, year=2003).delete()
+        cube = update_cube(self.dataset, self.rcp45, self.mapcell, self.model1,
+                           years=[2001, 2003])
+        records = unpack_cube(cube.records)
+        self.assertEqual(list(records['year']), [2000, 2001, 2002])
+        self.assertEqual(list(records['tasmax'][:, 0]), [10, 20, 10])
+
+    def test_load_records(self):
+        expected = load_records(self.dataset, self.rcp45, self.mapcell)
+        for model in (self.model1, self.model2):
+            update_cube(self.dataset, self.rcp45, self.mapcell, model)
+
+        with self.settings(CLIMATE_DATA_CUBES=True):
+            # Every year of every model is read with a single query
+            with self.assertNumQueries(1):
+                records = load_records(self.dataset, self.rcp45, self.mapcell)
+        self.assertEqual(records.tolist(), expected.tolist())
+
+        # Cubes of other scenarios aren't read
+        with self.settings(CLIMATE_DATA_CUBES=True):
+            self.assertEqual(len(load_records(self.dataset, self.rcp85, self.mapcell)), 0)
@@ -0,0 +1,325 @@
+import gzip
+import json
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase, override_settings
+
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from climate_data.caching import (LocalResponseCache,
+                                  bump_data_versions,
+                                  data_etag,
+                                  full_url_cache_key_func,
+                                  get_data_version,
+                                  get_request_data_version,
+                                  local_response_cache,
+                                  overridable_cache_response)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'bypass': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+})
+class OverridableCacheResponseTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        local_response_cache.clear()
+        self.factory = APIRequestFactory()
+        self.calls = []
+        calls = self.calls
+
+        # Create the view in each test so its cache uses the test's settings
+        class StreamingView(APIView):
+            permission_classes = (AllowAny,)
+
+            @overridable_cache_response(cache='default')
+            def get(self, request, *args, **kwargs):
+                calls.append(request)
+                return StreamingHttpResponse(iter([b'{"a":', b'1}']),
+                                             content_type='application/json')
+
+        self.view = StreamingView.as_view()
+
+    def test_caches_streaming_response(self):
+        response = self.view(self.factory.get('/data/'))
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.cache_hit)
+        self.assertEqual(b''.join(response.streaming_content), b'{"a":1}')
+
+        response = self.view(self.factory.get('/data/'))
+        self.assertFalse(response.streaming)
+        self.assertTrue(response.cache_hit)
+        self.assertEqual(response.content, b'{"a":1}')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_streaming_response_not_cached_until_sent(self):
+        # Closing the response without sending it releases its lock without caching it
+        self.view(self.factory.get('/data/')).close()
+        self.view(self.factory.get('/data/'))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_no_cache_param(self):
+        response = self.view(self.factory.get('/data/', {'noCache': 'true'}))
+        b''.join(response.streaming_content)
+        self.view(self.factory.get('/data/', {'noCache': 'true'}))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_local_cache(self):
+        response = self.view(self.factory.get('/data/'))
+        b''.join(response.streaming_content)
+        # The response is still cached by the process once the shared cache loses it
+        caches['default'].clear()
+        with mock.patch('climate_data.caching.statsd') as statsd:
+            response = self.view(self.factory.get('/data/'))
+        self.assertEqual(response.content, b'{"a":1}')
+        self.assertEqual(len(self.calls), 1)
+        statsd.incr.assert_called_once_with('api_views.cache.local.hit#view=StreamingView')
+
+    @override_settings(API_VIEW_LOCAL_CACHE_SIZE=0)
+    def test_local_cache_disabled(self):
+        response = self.view(self.factory.get('/data/'))
+        b''.join(response.streaming_content)
+        caches['default'].clear()
+        self.view(self.factory.get('/data/'))
+        self.assertEqual(len(self.calls), 2)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'bypass': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+})
+class CompressedCacheTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        local_response_cache.clear()
+        self.factory = APIRequestFactory()
+        self.data = {'data': [0.5] * 1000}
+        data = self.data
+
+        class DataView(APIView):
+            permission_classes = (AllowAny,)
+
+            @overridable_cache_response(cache='default')
+            def get(self, request, *args, **kwargs):
+                return Response(data)
+
+        self.view = DataView.as_view()
+
+    def test_sends_compressed_response(self):
+        response = self.view(self.factory.get('/data/', HTTP_ACCEPT_ENCODING='gzip, deflate'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(json.loads(gzip.decompress(response.content).decode()), self.data)
+
+        response = self.view(self.factory.get('/data/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertTrue(response.cache_hit)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content).decode()), self.data)
+
+    def test_decompresses_response(self):
+        response = self.view(self.factory.get('/data/'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(response.content.decode()), self.data)
+
+        response = self.view(self.factory.get('/data/'))
+        self.assertTrue(response.cache_hit)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(json.loads(response.content.decode()), self.data)
+
+    @override_settings(API_VIEW_CACHE_COMPRESSION_LEVEL=0)
+    def test_compression_disabled(self):
+        self.view(self.factory.get('/data/'))
+        response = self.view(self.factory.get('/data/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertTrue(response.cache_hit)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'bypass': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}, API_VIEW_LOCAL_CACHE_SIZE=0, API_VIEW_CACHE_LOCK_WAIT=5)
+class CacheLockTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.factory = APIRequestFactory()
+        self.calls = []
+        calls = self.calls
+
+        class DataView(APIView):
+            permission_classes = (AllowAny,)
+
+            @overridable_cache_response(cache='default', key_func=lambda **kwargs: 'data',
+                                        stale_timeout=60)
+            def get(self, request, *args, **kwargs):
+                calls.append(request)
+                return Response('fresh')
+
+        self.view = DataView.as_view()
+
+    def test_releases_lock(self):
+        self.view(self.factory.get('/data/'))
+        self.assertIsNone(self.cache.get('data:lock'))
+        self.assertEqual(self.cache.get('data:stale').content, b'"fresh"')
+
+    def test_stale_response_while_locked(self):
+        self.cache.set('data:lock', True)
+        self.cache.set('data:stale', HttpResponse(b'stale'))
+        response = self.view(self.factory.get('/data/'))
+        self.assertEqual(response.content, b'stale')
+        self.assertEqual(len(self.calls), 0)
+
+    def test_waits_for_locked_response(self):
+        self.cache.set('data:lock', True)
+        timer = threading.Timer(0.2, lambda: caches['default'].set('data', HttpResponse(b'other')))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.cache.delete('data:stale')
+
+        response = self.view(self.factory.get('/data/'))
+        self.assertEqual(response.content, b'other')
+        self.assertEqual(len(self.calls), 0)
+
+    def test_creates_response_once_lock_released(self):
+        self.cache.set('data:lock', True)
+        timer = threading.Timer(0.2, lambda: caches['default'].delete('data:lock'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        response = self.view(self.factory.get('/data/'))
+        self.assertEqual(response.content, b'"fresh"')
+        self.assertEqual(len(self.calls), 1)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'api_views': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'bypass': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}, API_VIEW_LOCAL_CACHE_SIZE=0)
+class DataVersionTestCase(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['api_views'].clear()
+        self.dataset = mock.Mock(id=1)
+        self.scenario = mock.Mock(id=2)
+        self.map_cell = mock.Mock(id=3)
+        self.factory = APIRequestFactory()
+        self.calls = []
+        calls = self.calls
+        data_version = get_data_version
+        dataset, scenario, map_cell = self.dataset, self.scenario, self.map_cell
+
+        class DataView(APIView):
+            permission_classes = (AllowAny,)
+
+            @overridable_cache_response(cache='default', key_func=full_url_cache_key_func)
+            def get(self, request, *args, **kwargs):
+                calls.append(request)
+                return Response('data')
+
+            def get_data_version(self, request, kwargs):
+                return data_version(dataset, scenario, map_cell)
+
+        self.view = DataView.as_view()
+
+    def test_bump_data_versions(self):
+        version = get_data_version(self.dataset, self.scenario, self.map_cell)
+        self.assertEqual(get_data_version(self.dataset, self.scenario, self.map_cell), version)
+
+        other_cell = mock.Mock(id=4)
+        other_version = get_data_version(self.dataset, self.scenario, other_cell)
+        bump_data_versions(self.dataset, [self.scenario], [self.map_cell])
+        self.assertNotEqual(get_data_version(self.dataset, self.scenario, self.map_cell), version)
+        self.assertEqual(get_data_version(self.dataset, self.scenario, other_cell), other_version)
+
+    def test_request_data_version(self):
+        lookups = []
+
+        def lookup():
+            lookups.append(1)
+            return self.dataset, self.scenario, self.map_cell
+
+        version = get_request_data_version(['city', 'RCP85', 1], lookup)
+        self.assertEqual(version, get_data_version(self.dataset, self.scenario, self.map_cell))
+        # The request's dataset, scenario and map cell are only looked up once
+        self.assertEqual(get_request_data_version(['city', 'RCP85', 1], lookup), version)
+        self.assertEqual(len(lookups), 1)
+
+        # They're looked up again once any data is written, in case there's a new map cell
+        bump_data_versions(self.dataset, [self.scenario], [mock.Mock(id=4)])
+        self.assertEqual(get_request_data_version(['city', 'RCP85', 1], lookup), version)
+        self.assertEqual(len(lookups), 2)
+
+    def test_cache_key_includes_data_version(self):
+        self.view(self.factory.get('/data/'))
+        self.view(self.factory.get('/data/'))
+        self.assertEqual(len(self.calls), 1)
+
+        bump_data_versions(self.dataset, [self.scenario], [self.map_cell])
+        self.view(self.factory.get('/data/'))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_data_etag(self):
+        view = self.view.view_class()
+
+        def etag(params):
+            request = view.initialize_request(self.factory.get('/data/', params))
+            request.accepted_renderer = JSONRenderer()
+            return data_etag(view, request, {'city': 1})
+
+        first = etag([('a', 1), ('b', 2)])
+        # Param order and noCache don't change the ETag, but other params do
+        self.assertEqual(etag([('b', 2), ('a', 1), ('noCache', 'true')]), first)
+        self.assertNotEqual(etag([('a', 1), ('b', 3)]), first)
+
+        bump_data_versions(self.dataset, [self.scenario], [self.map_cell])
+        self.assertNotEqual(etag([('a', 1), ('b', 2)]), first)
+
+
+class LocalResponseCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = LocalResponseCache()
+
+    def test_returns_copy(self):
+        self.cache.set('key', HttpResponse(b'data', content_type='application/json'))
+        response = self.cache.get('key')
+        self.assertEqual(response.content, b'data')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        response['X-Test'] = 'changed'
+        self.assertFalse(self.cache.get('key').has_header('X-Test'))
+
+    @override_settings(API_VIEW_LOCAL_CACHE_TIMEOUT=0.01)
+    def test_expires(self):
+        self.cache.set('key', HttpResponse(b'data'))
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 1):
+            self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_evicts_least_recently_used(self):
+        response = HttpResponse(b'x' * 100)
+        self.cache.set('a', response)
+        entry_size = self.cache.size
+        self.cache.set('b', response)
+        self.cache.get('a')
+        with self.settings(API_VIEW_LOCAL_CACHE_SIZE=entry_size * 2):
+            self.cache.set('c', response)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertEqual(self.cache.size, entry_size * 2)
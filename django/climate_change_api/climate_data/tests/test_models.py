@@ -1,7 +1,10 @@
 from decimal import Decimal
 
+from django.db import connection
 from django.test import TestCase
 
+import numpy as np
+
 from climate_data.tests.factories import ClimateDatasetFactory, ClimateModelFactory, ScenarioFactory
 from climate_data.tests.mixins import ClimateDataSetupMixin
 from climate_data.models import (
@@ -46,6 +49,45 @@ class CityTestCase(ClimateDataSetupMixin, TestCase):
             self.city1.get_map_cell(dataset)
 
 
+class ClimateDataYearTestCase(ClimateDataSetupMixin, TestCase):
+
+    def setUp(self):
+        super(ClimateDataYearTestCase, self).setUp()
+        self.data = ClimateDataYear.objects.create(map_cell=self.mapcell2,
+                                                   data_source=self.ds_s1_m1_2000,
+                                                   tasmax=[280.5, None, 300.25, 0],
+                                                   tasmin=[],
+                                                   pr=[1.5e-5, 0, float('nan')])
+
+    def test_data_source_fields(self):
+        self.assertEqual(self.data.dataset_id, self.ds_s1_m1_2000.dataset_id)
+        self.assertEqual(self.data.scenario, self.rcp45)
+        self.assertEqual(self.data.model, self.model1)
+        self.assertEqual(self.data.year, 2000)
+
+    def test_packed_values(self):
+        data = ClimateDataYear.objects.get(id=self.data.id)
+        self.assertEqual(data.tasmax.dtype, np.float32)
+        np.testing.assert_equal(data.tasmax, [280.5, np.nan, 300.25, 0])
+        np.testing.assert_equal(data.tasmin, [])
+        np.testing.assert_equal(data.pr, np.array([1.5e-5, 0, np.nan], dtype=np.float32))
+
+    def test_packed_values_out_of_range(self):
+        self.data.tasmax = [512]
+        with self.assertRaises(ValueError):
+            self.data.save()
+
+    def test_unpack_in_database(self):
+        tasmax_sql = ClimateDataYear._meta.get_field('tasmax').unpack_sql('tasmax')
+        pr_sql = ClimateDataYear._meta.get_field('pr').unpack_sql('pr')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT {}, {} FROM {} WHERE id = %s'.format(
+                tasmax_sql, pr_sql, ClimateDataYear._meta.db_table), [self.data.id])
+            tasmax, pr = cursor.fetchone()
+        self.assertEqual(tasmax, [280.5, None, 300.25, 0])
+        self.assertEqual(pr, [float(np.float32(1.5e-5)), 0, None])
+
+
 class ClimateDatasetTestCase(TestCase):
 
     def setUp(self):
@@ -127,6 +169,27 @@ class ClimateDataCellManagerTestCase(TestCase):
         map_cells = ClimateDataCell.objects.map_cells_for_lat_lon(0.1, 0.1)
         self.assertEqual(2, len(map_cells[0].datasets))
 
+    def test_map_cells_for_lat_lon_skips_cells_without_data(self):
+        ClimateDataCell.objects.create(lat=Decimal(0.1), lon=Decimal(0.1))
+        target_map_cell = ClimateDataCell.objects.create(lat=Decimal(0.0), lon=Decimal(0.0))
+        self._make_data_for_map_cell(target_map_cell)
+        map_cells = ClimateDataCell.objects.map_cells_for_lat_lon(0.1, 0.1)
+        self.assertEqual(len(map_cells), 1)
+        self.assertEqual(map_cells[0].id, target_map_cell.id)
+        self.assertEqual(map_cells[0].datasets, [self.nex_gddp.name])
+
+    def test_datasets_updated_with_data(self):
+        map_cell = ClimateDataCell.objects.create(lat=Decimal(0.0), lon=Decimal(0.0))
+        self._make_data_for_map_cell(map_cell)
+        self._make_data_for_map_cell(map_cell, self.loca_data_source)
+        map_cell.refresh_from_db()
+        self.assertEqual(map_cell.datasets, sorted([self.nex_gddp.name, self.loca.name]))
+
+        ClimateDataYear.objects.filter(map_cell=map_cell, dataset=self.loca).delete()
+        ClimateDataCell.objects.update_datasets([map_cell])
+        map_cell.refresh_from_db()
+        self.assertEqual(map_cell.datasets, [self.nex_gddp.name])
+
     def test_map_cells_for_lat_lon_upper_bound(self):
         target_map_cell = ClimateDataCell.objects.create(lat=Decimal(0.25), lon=Decimal(0.25))
         self._make_data_for_map_cell(target_map_cell)
@@ -152,3 +215,29 @@ class ClimateDataCellManagerTestCase(TestCase):
         self._make_data_for_map_cell(target_map_cell)
         map_cells = ClimateDataCell.objects.map_cells_for_lat_lon(0, 0, 150000)
         self.assertEqual(len(map_cells), 1)
+
+    def test_map_cell_ids_for_points(self):
+        target_map_cell = ClimateDataCell.objects.create(lat=Decimal(0.25), lon=Decimal(0.25))
+        self._make_data_for_map_cell(target_map_cell)
+        other_map_cell = ClimateDataCell.objects.create(lat=Decimal(-0.25), lon=Decimal(1.25))
+        self._make_data_for_map_cell(other_map_cell)
+        map_cell_ids = ClimateDataCell.objects.map_cell_ids_for_points(
+            [(-0.2, 1.23), (0.2, 0.23), (10, 10)], self.nex_gddp)
+        self.assertEqual(map_cell_ids, [other_map_cell.id, target_map_cell.id, None])
+
+    def test_map_cell_ids_for_points_matches_dataset(self):
+        target_map_cell = ClimateDataCell.objects.create(lat=Decimal(0.0), lon=Decimal(0.0))
+        self._make_data_for_map_cell(target_map_cell, self.loca_data_source)
+        self.assertEqual(ClimateDataCell.objects.map_cell_ids_for_points([(0.1, 0.1)],
+                                                                         self.nex_gddp),
+                         [None])
+        self.assertEqual(ClimateDataCell.objects.map_cell_ids_for_points([(0.1, 0.1)],
+                                                                         self.loca),
+                         [target_map_cell.id])
+
+    def test_map_cell_ids_for_points_matches_with_distance(self):
+        target_map_cell = ClimateDataCell.objects.create(lat=Decimal(-0.25), lon=Decimal(1.25))
+        self._make_data_for_map_cell(target_map_cell)
+        map_cell_ids = ClimateDataCell.objects.map_cell_ids_for_points([(0, 0)], self.nex_gddp,
+                                                                       150000)
+        self.assertEqual(map_cell_ids, [target_map_cell.id])
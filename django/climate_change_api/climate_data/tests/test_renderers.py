@@ -0,0 +1,72 @@
+from collections import OrderedDict
+import io
+
+from django.test import TestCase
+
+import numpy as np
+from rest_framework.renderers import JSONRenderer
+
+from climate_data.renderers import JSONObjectStream, NumpyRenderer, stream_json
+
+
+class NumpyRendererTestCase(TestCase):
+
+    def setUp(self):
+        self.renderer = NumpyRenderer()
+
+    def load(self, data):
+        return np.load(io.BytesIO(self.renderer.render(data)))
+
+    def test_daily_data(self):
+        data = {'scenario': 'RCP85',
+                'data': OrderedDict([(2000, {'tasmax': [1.5, None, 2.5], 'pr': [0.5, 1.0]}),
+                                     (2001, {'tasmax': [3.0, 4.0, 5.0], 'pr': [1.5, 2.0, 2.5]})])}
+        records = self.load(data)
+        self.assertEqual(records.dtype.names, ('key', 'tasmax', 'pr'))
+        self.assertEqual(records['key'].tolist(), [2000, 2001])
+        self.assertEqual(records['tasmax'].dtype, np.float32)
+        np.testing.assert_equal(records['tasmax'], [[1.5, np.nan, 2.5], [3.0, 4.0, 5.0]])
+        np.testing.assert_equal(records['pr'], [[0.5, 1.0, np.nan], [1.5, 2.0, 2.5]])
+
+    def test_indicator_data(self):
+        data = {'data': OrderedDict([('2050-01', {'avg': 1.5, 'max': 2}),
+                                     ('2050-02', {'avg': 2.5, 'max': None})])}
+        records = self.load(data)
+        self.assertEqual(records['key'].tolist(), ['2050-01', '2050-02'])
+        np.testing.assert_equal(records['avg'], [1.5, 2.5])
+        np.testing.assert_equal(records['max'], [2, np.nan])
+
+    def test_errors_rendered_as_json(self):
+        self.assertEqual(self.renderer.render({'detail': 'Not found.'}),
+                         b'{"detail":"Not found."}')
+
+
+class StreamJSONTestCase(TestCase):
+
+    def setUp(self):
+        self.renderer = JSONRenderer()
+
+    def assert_streams_as(self, data, expected):
+        chunks = list(stream_json(data, self.renderer))
+        self.assertEqual(b''.join(chunks), self.renderer.render(expected))
+        return chunks
+
+    def test_matches_rendered_json(self):
+        years = [(2000, {'tasmax': [1.5, None]}), (2001, {'tasmax': [2.5, 3.0]})]
+        data = OrderedDict([('scenario', 'RCP85'),
+                            ('data', JSONObjectStream(iter(years))),
+                            ('variables', ['tasmax'])])
+        expected = OrderedDict([('scenario', 'RCP85'),
+                                ('data', OrderedDict(years)),
+                                ('variables', ['tasmax'])])
+        chunks = self.assert_streams_as(data, expected)
+        # Each year is its own chunk
+        self.assertIn(b',"2001":{"tasmax":[2.5,3.0]}', chunks)
+
+    def test_empty_stream(self):
+        data = OrderedDict([('data', JSONObjectStream(iter([]))), ('value', None)])
+        self.assert_streams_as(data, OrderedDict([('data', {}), ('value', None)]))
+
+    def test_nested_streams(self):
+        data = JSONObjectStream(iter([('a', JSONObjectStream(iter([('b', 1)])))]))
+        self.assert_streams_as(data, {'a': {'b': 1}})
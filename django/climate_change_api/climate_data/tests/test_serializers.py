@@ -1,3 +1,5 @@
+import tempfile
+
 from django.test import TestCase
 
 from climate_data.models import ClimateDataYear
@@ -77,6 +79,36 @@ class ClimateMapCellScenarioDataSerializerTestCase(ClimateDataSetupMixin, TestCa
         serializer = ClimateMapCellScenarioDataSerializer(self.queryset, context=context)
         self.assert_serializer_data_valid(serializer.data, self.VARIABLE_CHOICES, 20.0)
 
+    def test_median_aggregation(self):
+        context = {'aggregation': 'median'}
+        serializer = ClimateMapCellScenarioDataSerializer(self.queryset, context=context)
+        self.assert_serializer_data_valid(serializer.data, self.VARIABLE_CHOICES, 15.0)
+
+    def test_stddev_aggregation(self):
+        context = {'aggregation': 'stddev'}
+        serializer = ClimateMapCellScenarioDataSerializer(self.queryset, context=context)
+        self.assert_serializer_data_valid(serializer.data, self.VARIABLE_CHOICES, 5.0)
+
+    def test_percentile_aggregation(self):
+        context = {'aggregation': '90th'}
+        serializer = ClimateMapCellScenarioDataSerializer(self.queryset, context=context)
+        self.assert_serializer_data_valid(serializer.data, self.VARIABLE_CHOICES, 19.0)
+
+    def test_missing_days(self):
+        """Check days without data for any model are None."""
+        serializer = ClimateMapCellScenarioDataSerializer(self.queryset)
+        self.assertEqual(serializer.data[2000]['tasmax'][1:], [None] * 365)
+
+    def test_mixed_year_lengths(self):
+        """Check days only some models have data for are None, like a leap day."""
+        data = ClimateDataYear.objects.get(map_cell=self.mapcell, data_source__scenario=self.rcp45,
+                                           data_source__model=self.model1,
+                                           data_source__year=2000)
+        data.tasmax = [10, 12]
+        data.save()
+        serializer = ClimateMapCellScenarioDataSerializer(self.queryset)
+        self.assertEqual(serializer.data[2000]['tasmax'][:2], [15.0, None])
+
     def test_limit_models(self):
         """Check serializer computes the average using only the filtered models."""
         queryset = self.queryset.filter(data_source__model=self.model1)
@@ -86,3 +118,15 @@ class ClimateMapCellScenarioDataSerializerTestCase(ClimateDataSetupMixin, TestCa
         queryset = self.queryset.filter(data_source__model=self.model2)
         serializer = ClimateMapCellScenarioDataSerializer(queryset)
         self.assert_serializer_data_valid(serializer.data, self.VARIABLE_CHOICES, 20.0)
+
+    def test_array_cache(self):
+        """Check data read from the array cache matches the data read from the queryset."""
+        queryset = self.queryset.filter(data_source__model=self.model1,
+                                        data_source__year__gte=2001)
+        expected = ClimateMapCellScenarioDataSerializer(queryset).data
+        context = {'dataset': self.dataset, 'scenario': self.rcp45, 'map_cell': self.mapcell,
+                   'models': self.model1.name, 'years': '2001:2003'}
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(CLIMATE_DATA_ARRAY_CACHE_DIR=directory):
+                serializer = ClimateMapCellScenarioDataSerializer(queryset, context=context)
+                self.assertEqual(serializer.data, expected)
@@ -1,12 +1,19 @@
+import io
+from unittest import mock
+
 from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.test import override_settings
 from django.urls import reverse
 from django.utils.http import urlencode
 
+import numpy as np
 from rest_framework import status
 
+from climate_data.caching import bump_data_versions
 from climate_data.models import CityBoundary, ClimateDataYear
 from climate_data.tests.mixins import ClimateDataSetupMixin, CityDataSetupMixin
 from climate_data.tests.factories import ClimateDatasetFactory, ScenarioFactory
+from climate_data.views import IndicatorBatchForCityView, IndicatorDataForLocationsView
 
 from user_management.tests.api_test_case import CCAPITestCase
 
@@ -28,6 +35,26 @@ class ClimateDataViewTestCase(ClimateDataSetupMixin, CCAPITestCase):
                          dataset.models.all()])
         self.assertEqual(len(response.data['data']), 4)
 
+    def test_not_modified(self):
+        dataset = ClimateDatasetFactory(name='NEX-GDDP')
+        url = reverse('climatedata-list',
+                      kwargs={'scenario': self.rcp45.name, 'city': self.city1.id})
+
+        response = self.client.get(url, {'dataset': dataset.name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(url, {'dataset': dataset.name}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('max-age', response['Cache-Control'])
+
+        # Responses are modified once their data is
+        bump_data_versions(dataset, [self.rcp45], [self.city1.get_map_cell(dataset)])
+        response = self.client.get(url, {'dataset': dataset.name}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
     def test_scenario_filter(self):
         dataset = ClimateDatasetFactory(name='NEX-GDDP')
         url = reverse('climatedata-list',
@@ -56,6 +83,48 @@ class ClimateDataViewTestCase(ClimateDataSetupMixin, CCAPITestCase):
                          dataset.models.all()])
         self.assertEqual(len(response.data['data']), 0)
 
+    def test_streaming_response(self):
+        url = reverse('climatedata-list',
+                      kwargs={'scenario': self.rcp45.name, 'city': self.city1.id})
+        params = {'years': '2000:2001', 'noCache': 'true'}
+        expected = self.client.get(url, params).content
+
+        with override_settings(CLIMATE_DATA_STREAMING_RESPONSES=True):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), expected)
+
+    def test_precision(self):
+        url = reverse('climatedata-list',
+                      kwargs={'scenario': self.rcp45.name, 'city': self.city1.id})
+        expected = self.client.get(url, {'variables': 'tasmax'}).data['data']
+
+        response = self.client.get(url, {'variables': 'tasmax', 'precision': '0'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for year, values in response.data['data'].items():
+            self.assertEqual(values['tasmax'],
+                             [None if value is None else round(value)
+                              for value in expected[year]['tasmax']])
+
+    def test_400_if_precision_invalid(self):
+        url = reverse('climatedata-list',
+                      kwargs={'scenario': self.rcp45.name, 'city': self.city1.id})
+        response = self.client.get(url, {'precision': 'high'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'precision': '-1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_numpy_format(self):
+        url = reverse('climatedata-list',
+                      kwargs={'scenario': self.rcp45.name, 'city': self.city1.id})
+        response = self.client.get(url, {'variables': 'tasmax', 'format': 'npy'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-npy')
+        records = np.load(io.BytesIO(response.content))
+        self.assertEqual(records['key'].tolist(), [2000, 2001, 2002, 2003])
+        self.assertEqual(records['tasmax'][:, 0].tolist(), [15, 15, 10, 10])
+
     def test_404_if_city_invalid(self):
         url = reverse('climatedata-list',
                       kwargs={'scenario': self.rcp45.name, 'city': 999999})
@@ -172,6 +241,175 @@ class IndicatorDataViewTestCase(ClimateDataSetupMixin, CCAPITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_precision(self):
+        url = reverse('climateindicator-get',
+                      kwargs={'scenario': self.rcp45.name,
+                              'city': self.city1.id,
+                              'indicator': 'average_high_temperature'})
+        expected = self.client.get(url, {'units': 'C'}).data['data']
+
+        response = self.client.get(url, {'units': 'C', 'precision': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], {
+            year: {agg: round(value, 1) for agg, value in values.items()}
+            for year, values in expected.items()
+        })
+
+
+class IndicatorBatchViewTestCase(ClimateDataSetupMixin, CCAPITestCase):
+
+    def batch_url(self, **params):
+        url = reverse('climateindicatorbatch-get',
+                      kwargs={'scenario': self.rcp45.name, 'city': self.city1.id})
+        return u'%s?%s' % (url, urlencode(params)) if params else url
+
+    def test_matches_single_indicator_responses(self):
+        indicators = [
+            {'name': 'frost_days'},
+            {'name': 'average_high_temperature', 'params': {'units': 'K', 'agg': ['min', 'max']}},
+            {'name': 'total_precipitation', 'params': {'time_aggregation': 'monthly'}},
+        ]
+        response = self.client.post(self.batch_url(years='2000:2001'),
+                                    {'indicators': indicators}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['city']['id'], self.city1.id)
+        self.assertEqual(response.data['scenario'], self.rcp45.name)
+        self.assertEqual([result['indicator']['name'] for result in response.data['indicators']],
+                         [indicator['name'] for indicator in indicators])
+
+        for indicator, result in zip(indicators, response.data['indicators']):
+            url = reverse('climateindicator-get',
+                          kwargs={'scenario': self.rcp45.name,
+                                  'city': self.city1.id,
+                                  'indicator': indicator['name']})
+            params = {'years': '2000:2001'}
+            params.update({key: ','.join(value) if isinstance(value, list) else value
+                           for key, value in indicator.get('params', {}).items()})
+            single = self.client.get(url, params)
+            self.assertEqual(result['data'], single.data['data'])
+            self.assertEqual(result['units'], single.data['units'])
+            self.assertEqual(result['time_aggregation'], single.data['time_aggregation'])
+
+    def test_same_indicator_with_different_params(self):
+        url = reverse('climateindicator-get',
+                      kwargs={'scenario': self.rcp45.name,
+                              'city': self.city1.id,
+                              'indicator': 'max_temperature_threshold'})
+        thresholds = [
+            {'threshold': 15, 'threshold_units': 'K', 'threshold_comparator': 'gt'},
+            {'threshold': 35, 'threshold_units': 'K', 'threshold_comparator': 'gt'},
+        ]
+        response = self.client.post(self.batch_url(), {'indicators': [
+            {'name': 'max_temperature_threshold', 'params': params} for params in thresholds
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = [result['data'] for result in response.data['indicators']]
+        self.assertNotEqual(results[0], results[1])
+        for params, data in zip(thresholds, results):
+            self.assertEqual(data, self.client.get(url, params).data['data'])
+
+    def test_invalid_params_return_error_per_indicator(self):
+        indicators = [
+            {'name': 'frost_days'},
+            {'name': 'max_temperature_threshold'},
+        ]
+        response = self.client.post(self.batch_url(), {'indicators': indicators}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        frost_days, threshold = response.data['indicators']
+        self.assertIn('data', frost_days)
+        self.assertEqual(threshold['indicator'], 'max_temperature_threshold')
+        self.assertIn('error', threshold)
+        self.assertIn('help', threshold)
+
+    def test_400_if_indicator_invalid(self):
+        response = self.client.post(self.batch_url(),
+                                    {'indicators': [{'name': 'notanindicator'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_400_if_indicator_name_invalid(self):
+        for indicator in ({'params': {}}, {'name': 5}):
+            response = self.client.post(self.batch_url(), {'indicators': [indicator]},
+                                        format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(INDICATOR_BATCH_MAX_INDICATORS=1)
+    def test_400_if_too_many_indicators(self):
+        response = self.client.post(self.batch_url(), {'indicators': [
+            {'name': 'frost_days'}, {'name': 'total_precipitation'}
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_throttle_cost(self):
+        view = IndicatorBatchForCityView()
+        request = mock.Mock(data={'indicators': [{'name': 'frost_days'}] * 3})
+        self.assertEqual(view.get_throttle_cost(request), 3)
+        self.assertEqual(view.get_throttle_cost(mock.Mock(data={'indicators': []})), 1)
+        self.assertEqual(view.get_throttle_cost(mock.Mock(data={})), 1)
+
+    def test_400_if_indicators_missing(self):
+        response = self.client.post(self.batch_url(), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_not_allowed(self):
+        response = self.client.get(self.batch_url())
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class IndicatorDataForLocationsViewTestCase(ClimateDataSetupMixin, CCAPITestCase):
+
+    def setUp(self):
+        super(IndicatorDataForLocationsViewTestCase, self).setUp()
+        self.url = reverse('climateindicatorlocations-get',
+                           kwargs={'scenario': self.rcp45.name, 'indicator': 'frost_days'})
+
+    def test_matches_single_location_responses(self):
+        response = self.client.post(self.url, {'cities': [self.city1.id, self.city2.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['scenario'], self.rcp45.name)
+        self.assertEqual(response.data['indicator']['name'], 'frost_days')
+
+        for city in (self.city1, self.city2):
+            url = reverse('climateindicator-get',
+                          kwargs={'scenario': self.rcp45.name,
+                                  'city': city.id,
+                                  'indicator': 'frost_days'})
+            single = self.client.get(url)
+            self.assertEqual(response.data['cities'][str(city.id)]['data'], single.data['data'])
+
+    def test_location_without_data(self):
+        response = self.client.post(self.url, {'cities': [self.city1.id, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('data', response.data['cities'][str(self.city1.id)])
+        self.assertIn('error', response.data['cities']['999999'])
+
+    def test_404_if_no_locations_have_data(self):
+        response = self.client.post(self.url, {'cities': [999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_400_if_locations_missing(self):
+        response = self.client.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_400_if_point_invalid(self):
+        response = self.client.post(self.url, {'points': [{'lat': 'north'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(INDICATOR_BATCH_MAX_LOCATIONS=1)
+    def test_400_if_too_many_locations(self):
+        response = self.client.post(self.url, {'cities': [self.city1.id, self.city2.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(INDICATOR_BATCH_LOCATIONS_PER_REQUEST=10)
+    def test_throttle_cost(self):
+        view = IndicatorDataForLocationsView()
+        self.assertEqual(view.get_throttle_cost(mock.Mock(data={'cities': [1]})), 1)
+        request = mock.Mock(data={'cities': list(range(10)), 'points': [{}]})
+        self.assertEqual(view.get_throttle_cost(request), 2)
+        self.assertEqual(view.get_throttle_cost(mock.Mock(data={})), 1)
+
 
 class ClimateModelViewSetTestCase(CCAPITestCase):
 
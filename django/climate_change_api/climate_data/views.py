@@ -1,17 +1,21 @@
 from collections import OrderedDict
 import logging
+import math
 
+from django.conf import settings
 from django.contrib.gis.geos import Point
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError
 from django.db import connection, DataError
-from django.utils.cache import patch_cache_control
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import detail_route, list_route
-from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.exceptions import APIException, NotFound, ParseError
 from rest_framework.generics import ListAPIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_gis.pagination import GeoJsonPagination
@@ -20,7 +24,10 @@ from rest_framework.settings import api_settings
 
 from climate_change_api.throttling import (ClimateDataBurstRateThrottle,
                                            ClimateDataSustainedRateThrottle)
-from climate_data.caching import (full_url_cache_key_func,
+from climate_data.caching import (cache_disabled,
+                                  data_etag,
+                                  full_url_cache_key_func,
+                                  get_request_data_version,
                                   OverridableCacheResponseMixin,
                                   overridable_cache_response)
 from climate_data.filters import CityFilterSet, ClimateDataFilterSet
@@ -46,7 +53,13 @@ from climate_data.serializers import (CitySerializer,
                                       ScenarioSerializer,
                                       HistoricDateRangeSerializer)
 from indicators import indicator_factory, list_available_indicators
-from .renderers import GeobufRenderer
+from indicators.batch import IndicatorBatch, calculate_map_cells
+from indicators.utils import merge_dicts, round_floats
+from .renderers import (GeobufRenderer,
+                        JSONObjectStream,
+                        NumpyRenderer,
+                        has_stream,
+                        stream_json)
 
 
 logger = logging.getLogger(__name__)
@@ -54,21 +67,39 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_CLIMATE_DATA_MAX_AGE = 60 * 60 * 24 * 30     # 30 days
 
+# Most decimal places the precision param can round values to
+MAX_PRECISION = 10
+
 
 def climate_data_cache_control(func):
     """Consistently patch the Cache-Control headers for Climate API endpoints with decorator.
 
     Can be added to any Django Rest Framework view handler method.
 
-    If added to a method with multiple decorators, this one should be called last since it
-    invokes the function being decorated.
+    Successful responses also get a strong ETag made from the version of the requested data, and
+    requests whose If-None-Match header matches it get a 304 Not Modified response without the
+    handler being called. Like Django's GZipMiddleware, the ETag of gzip encoded responses is made
+    weak, since their content isn't the same as the unencoded response's.
+
+    If added to a method with multiple decorators, this one should be called first, so requests
+    are validated before a cached response is looked up.
     """
-    def handler(request, *args, **kwargs):
+    def handler(view, request, *args, **kwargs):
         cache_headers = {
             'max-age': DEFAULT_CLIMATE_DATA_MAX_AGE,
             'private': True
         }
-        response = func(request, *args, **kwargs)
+        etag = data_etag(view, request, kwargs)
+        response = None
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = func(view, request, *args, **kwargs)
+        if etag is not None and response.status_code in (status.HTTP_200_OK,
+                                                         status.HTTP_304_NOT_MODIFIED):
+            if response.get('Content-Encoding'):
+                etag = 'W/' + etag
+            response['ETag'] = etag
         patch_cache_control(response, **cache_headers)
         return response
     return handler
@@ -83,6 +114,7 @@ class ClimateParamsValidationMixin(object):
     - param dataset -> ClimateDataset
     - param models -> ['model_names']
     - param variables -> ['variable_names']
+    - param precision -> number of decimal places, or None
 
     """
 
@@ -98,14 +130,16 @@ class ClimateParamsValidationMixin(object):
             raise NotFound(detail='Scenario {} does not exist.'.format(kwargs['scenario']))
 
     def validate_param_agg(self, request, default='avg'):
-        """Return validated agg string param, must be one of 'avg', 'min', 'max'.
+        """Return validated agg string param.
+
+        Must be one of 'avg', 'min', 'max', 'median', 'stddev' or a percentile like '95th'.
 
         Raises ParseError if value provided and its not one of the valid AGGREGATION_CHOICES.
 
         """
-        AGGREGATION_CHOICES = ('avg', 'min', 'max',)
+        AGGREGATION_CHOICES = ('avg', 'min', 'max', 'median', 'stddev', 'XXth',)
         aggregation = request.query_params.get('agg', default)
-        if aggregation in AGGREGATION_CHOICES:
+        if ClimateMapCellScenarioDataSerializer.is_valid_aggregation(aggregation):
             return aggregation
         else:
             raise ParseError('Param agg must be one of {}'.format(AGGREGATION_CHOICES))
@@ -167,6 +201,25 @@ class ClimateParamsValidationMixin(object):
             raise ParseError('Param distance must greater than or equal to 0')
         return val
 
+    def validate_param_precision(self, request):
+        """Return validated precision param, the number of decimal places to round values to.
+
+        Returns None if not provided, so values aren't rounded.
+
+        Raises ParseError if value provided is not an integer from 0 to MAX_PRECISION
+        """
+        precision = request.query_params.get('precision', '')
+        if precision == '':
+            return None
+        try:
+            val = int(precision)
+        except ValueError:
+            raise ParseError('Param precision must be an integer')
+
+        if not 0 <= val <= MAX_PRECISION:
+            raise ParseError('Param precision must be from 0 to {}'.format(MAX_PRECISION))
+        return val
+
 
 class CityViewSet(OverridableCacheResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Returns a paginated GeoJSON object of the available cities."""
@@ -326,28 +379,56 @@ class ScenarioViewSet(OverridableCacheResponseMixin, viewsets.ReadOnlyModelViewS
 
 class ClimateDataMixin(object):
 
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NumpyRenderer]
+
     def get_data(self, request, dataset, map_cell, scenario, kwargs):
         aggregation = self.validate_param_agg(request, default='avg')
         model_list = self.validate_param_models(request, dataset)
         variables = self.validate_param_variables(request)
+        precision = self.validate_param_precision(request)
 
         serializer = self.serializer_for(request, dataset, map_cell, scenario,
-                                         variables, aggregation)
+                                         variables, aggregation, precision)
+        if self.should_stream(request):
+            # Serialize each year as it's written to the response instead of all at once
+            data = JSONObjectStream(serializer.generate_representation(serializer.instance))
+        else:
+            data = serializer.data
 
         return OrderedDict([
             ('dataset', dataset.name),
             ('scenario', scenario.name),
             ('climate_models', list(model_list)),
             ('variables', variables),
-            ('data', serializer.data),
+            ('data', data),
         ])
 
-    def serializer_for(self, request, dataset, map_cell, scenario, variables, aggregation):
+    def should_stream(self, request):
+        """Return true if the response should be streamed as JSON one year at a time."""
+        return (settings.CLIMATE_DATA_STREAMING_RESPONSES and
+                type(request.accepted_renderer) is JSONRenderer)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ClimateDataMixin, self).finalize_response(request, response,
+                                                                   *args, **kwargs)
+        if isinstance(response, Response) and has_stream(response.data):
+            renderer = response.accepted_renderer
+            streaming_response = StreamingHttpResponse(stream_json(response.data, renderer),
+                                                       status=response.status_code,
+                                                       content_type=renderer.media_type)
+            for header, value in response.items():
+                streaming_response[header] = value
+            return streaming_response
+        return response
+
+    def serializer_for(self, request, dataset, map_cell, scenario, variables, aggregation,
+                       precision=None):
 
         try:
             queryset = ClimateDataYear.objects.filter(
                 map_cell=map_cell,
-                data_source__scenario=scenario
+                scenario=scenario,
+                dataset=dataset
             )
         except ClimateDataCell.DoesNotExist:
             raise ParseError(detail='No data available for {} dataset at this location'
@@ -356,7 +437,16 @@ class ClimateDataMixin(object):
         # Filter on the ClimateData filter set
         data_filter = ClimateDataFilterSet(request.query_params, queryset)
 
-        context = {'variables': variables, 'aggregation': aggregation}
+        context = {
+            'variables': variables,
+            'aggregation': aggregation,
+            'precision': precision,
+            'dataset': dataset,
+            'scenario': scenario,
+            'map_cell': map_cell,
+            'years': request.query_params.get('years', ''),
+            'models': request.query_params.get('models', ''),
+        }
         return ClimateMapCellScenarioDataSerializer(data_filter.qs, context=context)
 
 
@@ -364,16 +454,36 @@ class CityCellAPIView(ClimateParamsValidationMixin, APIView):
 
     throttle_classes = (ClimateDataBurstRateThrottle, ClimateDataSustainedRateThrottle,)
 
-    @overridable_cache_response(key_func=full_url_cache_key_func)
     @climate_data_cache_control
+    @overridable_cache_response(key_func=full_url_cache_key_func,
+                                stale_timeout=settings.API_VIEW_STALE_CACHE_TIMEOUT)
     def get(self, request, *args, **kwargs):
+        return Response(self.get_response_data(request, kwargs))
+
+    def get_response_data(self, request, kwargs):
         scenario = self.validate_kwarg_scenario(**kwargs)
         dataset = self.validate_param_dataset(request, default=ClimateDataset.Datasets.NEX_GDDP)
         city, map_cell = self.get_map_cell(dataset, kwargs)
 
         response_data = OrderedDict([('city', CitySerializer(city).data)])
         response_data.update(self.get_data(request, dataset, map_cell, scenario, kwargs))
-        return Response(response_data)
+        return response_data
+
+    def get_data_version(self, request, kwargs):
+        """Return the version of the requested data, or None if the request is invalid."""
+        def lookup():
+            scenario = self.validate_kwarg_scenario(**kwargs)
+            dataset = self.validate_param_dataset(request,
+                                                  default=ClimateDataset.Datasets.NEX_GDDP)
+            _, map_cell = self.get_map_cell(dataset, kwargs)
+            return dataset, scenario, map_cell
+
+        request_key = ['city', kwargs['scenario'], kwargs['city'],
+                       request.query_params.get('dataset', ClimateDataset.Datasets.NEX_GDDP)]
+        try:
+            return get_request_data_version(request_key, lookup)
+        except (APIException, ObjectDoesNotExist):
+            return None
 
     def get_map_cell(self, dataset, kwargs):
         try:
@@ -387,9 +497,13 @@ class LatLonCellAPIView(ClimateParamsValidationMixin, APIView):
 
     throttle_classes = (ClimateDataBurstRateThrottle, ClimateDataSustainedRateThrottle,)
 
-    @overridable_cache_response(key_func=full_url_cache_key_func)
     @climate_data_cache_control
+    @overridable_cache_response(key_func=full_url_cache_key_func,
+                                stale_timeout=settings.API_VIEW_STALE_CACHE_TIMEOUT)
     def get(self, request, *args, **kwargs):
+        return Response(self.get_response_data(request, kwargs))
+
+    def get_response_data(self, request, kwargs):
         scenario = self.validate_kwarg_scenario(**kwargs)
         dataset = self.validate_param_dataset(request, default=ClimateDataset.Datasets.NEX_GDDP)
         distance = self.validate_param_distance(request)
@@ -400,7 +514,24 @@ class LatLonCellAPIView(ClimateParamsValidationMixin, APIView):
             ('feature', serializer.data),
         ])
         response_data.update(self.get_data(request, dataset, map_cell, scenario, kwargs))
-        return Response(response_data)
+        return response_data
+
+    def get_data_version(self, request, kwargs):
+        """Return the version of the requested data, or None if the request is invalid."""
+        def lookup():
+            scenario = self.validate_kwarg_scenario(**kwargs)
+            dataset = self.validate_param_dataset(request,
+                                                  default=ClimateDataset.Datasets.NEX_GDDP)
+            distance = self.validate_param_distance(request)
+            return dataset, scenario, self.get_map_cell(dataset, distance, kwargs)
+
+        request_key = ['lat_lon', kwargs['scenario'], kwargs['lat'], kwargs['lon'],
+                       request.query_params.get('dataset', ClimateDataset.Datasets.NEX_GDDP),
+                       request.query_params.get('distance', '0')]
+        try:
+            return get_request_data_version(request_key, lookup)
+        except (APIException, ValueError):
+            return None
 
     def get_map_cell(self, dataset, distance, kwargs):
         try:
@@ -445,10 +576,24 @@ class IndicatorDetailView(APIView):
         return Response(IndicatorClass.to_dict())
 
 
+def serialize_indicator_params(params):
+    """Convert indicator params from a JSON body to the strings query params would have been."""
+    def serialize(value):
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return ','.join(str(v) for v in value)
+        return str(value)
+    return {key: serialize(value) for key, value in params.items()}
+
+
 class IndicatorDataMixin(object):
 
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NumpyRenderer]
+
     def get_data(self, request, dataset, map_cell, scenario, kwargs):
         model_list = self.validate_param_models(request, dataset)
+        precision = self.validate_param_precision(request)
 
         indicator_key = kwargs['indicator']
         IndicatorClass = indicator_factory(indicator_key)
@@ -456,7 +601,14 @@ class IndicatorDataMixin(object):
             raise NotFound(detail='Indicator {} does not exist.'.format(indicator_key))
         try:
             indicator_class = IndicatorClass(map_cell, scenario, parameters=request.query_params)
-            data = indicator_class.calculate()
+            # Use precomputed values if they're available for this request
+            data = indicator_class.calculate_materialized()
+            if data is None and cache_disabled(request):
+                data = indicator_class.calculate()
+            elif data is None:
+                data = indicator_class.calculate_cached()
+            if precision is not None:
+                data = round_floats(data, precision)
         except ValidationError as e:
             # If indicator class/params fails validation, return error with help text for
             # as much context as possible.
@@ -484,6 +636,228 @@ class IndicatorDataForLatLonView(IndicatorDataMixin, LatLonCellAPIView):
     pass
 
 
+class IndicatorBatchMixin(object):
+    """Calculate several indicators for one location and scenario from a single data load.
+
+    Takes a POST body of the form {"indicators": [{"name": "frost_days", "params": {...}}, ...]}.
+    Query params, like dataset, models and years, are shared by every indicator, and each
+    indicator's own params take precedence over them. Indicators are returned in the order they
+    were requested, and an indicator with invalid params is returned with an error and help text
+    instead of data, like the single indicator endpoint does.
+    """
+
+    http_method_names = ['post', 'options']
+
+    def get_throttle_cost(self, request):
+        """Count a request as one request for each indicator it calculates."""
+        if isinstance(request.data, dict) and isinstance(request.data.get('indicators'), list):
+            return max(1, len(request.data['indicators']))
+        return 1
+
+    def post(self, request, *args, **kwargs):
+        return Response(self.get_response_data(request, kwargs))
+
+    def validate_data_indicators(self, request):
+        """Return validated list of (IndicatorClass, params dict) tuples from the POST body.
+
+        Raise DRF ParseError if the list is malformed, has too many indicators or any indicator
+        doesn't exist.
+
+        """
+        try:
+            indicators = request.data['indicators']
+        except (KeyError, TypeError):
+            raise ParseError('Request body must contain a list of indicators')
+        if not isinstance(indicators, list) or not indicators:
+            raise ParseError('Request body must contain a list of indicators')
+        if len(indicators) > settings.INDICATOR_BATCH_MAX_INDICATORS:
+            raise ParseError('Request can contain at most {} indicators'
+                             .format(settings.INDICATOR_BATCH_MAX_INDICATORS))
+
+        validated = []
+        for spec in indicators:
+            if not isinstance(spec, dict) or not isinstance(spec.get('params', {}), dict):
+                raise ParseError('Each indicator must be an object with a name and params')
+            if not isinstance(spec.get('name'), str):
+                raise ParseError('Each indicator must be an object with a name and params')
+            IndicatorClass = indicator_factory(spec['name'])
+            if not IndicatorClass:
+                raise ParseError('Indicator {} does not exist.'.format(spec.get('name')))
+            validated.append((IndicatorClass, serialize_indicator_params(spec.get('params', {}))))
+        return validated
+
+    def get_data(self, request, dataset, map_cell, scenario, kwargs):
+        model_list = list(self.validate_param_models(request, dataset))
+        precision = self.validate_param_precision(request)
+        indicator_specs = self.validate_data_indicators(request)
+
+        results = []
+        indicators = []
+        for IndicatorClass, params in indicator_specs:
+            params = merge_dicts(request.query_params.dict(), params)
+            # Every indicator uses the map cell found for the requested dataset
+            params['dataset'] = dataset.name
+            try:
+                indicator = IndicatorClass(map_cell, scenario, parameters=params)
+            except ValidationError as e:
+                results.append(self.indicator_error(IndicatorClass, e))
+                continue
+            results.append(indicator)
+            indicators.append(indicator)
+
+        # Load the ClimateDataYear rows once for all of the indicators that share them
+        IndicatorBatch(indicators).load()
+
+        for index, indicator in enumerate(results):
+            if isinstance(indicator, dict):
+                continue
+            try:
+                if cache_disabled(request):
+                    data = indicator.calculate()
+                else:
+                    data = indicator.calculate_cached()
+            except ValidationError as e:
+                results[index] = self.indicator_error(type(indicator), e)
+                continue
+            if precision is not None:
+                data = round_floats(data, precision)
+            results[index] = OrderedDict([
+                ('indicator', indicator.to_dict()),
+                ('climate_models', list(indicator.params.models.value) or model_list),
+                ('time_aggregation', indicator.params.time_aggregation.value),
+                ('units', indicator.params.units.value),
+                ('data', data),
+            ])
+
+        return OrderedDict([
+            ('dataset', dataset.name),
+            ('scenario', scenario.name),
+            ('indicators', results),
+        ])
+
+    def indicator_error(self, IndicatorClass, error):
+        return OrderedDict([
+            ('indicator', IndicatorClass.name()),
+            ('error', str(error)),
+            ('help', IndicatorClass.init_params_class().to_dict()),
+        ])
+
+
+class IndicatorBatchForCityView(IndicatorBatchMixin, CityCellAPIView):
+    pass
+
+
+class IndicatorBatchForLatLonView(IndicatorBatchMixin, LatLonCellAPIView):
+    pass
+
+
+class IndicatorDataForLocationsView(ClimateParamsValidationMixin, APIView):
+    """Calculate one indicator for many cities and points with a single data query.
+
+    Takes a POST body of the form {"cities": [1, 2], "points": [{"lat": 39.9, "lon": -75.2}],
+    "params": {...}}. Indicator params can be given in the query string or the body's params, the
+    latter taking precedence. Results are keyed by city ID and by "lat,lon" for points, with an
+    error instead of data for locations without data for the dataset.
+    """
+
+    throttle_classes = (ClimateDataBurstRateThrottle, ClimateDataSustainedRateThrottle,)
+
+    def get_throttle_cost(self, request):
+        """Count a request as one request for each group of locations it calculates."""
+        locations = 0
+        if isinstance(request.data, dict):
+            for key in ('cities', 'points'):
+                if isinstance(request.data.get(key), list):
+                    locations += len(request.data[key])
+        return max(1, int(math.ceil(locations / settings.INDICATOR_BATCH_LOCATIONS_PER_REQUEST)))
+
+    def validate_data_locations(self, request):
+        """Return validated lists of city IDs and (lat, lon) tuples from the POST body.
+
+        Raise DRF ParseError if the locations are malformed, missing or too many.
+
+        """
+        if not isinstance(request.data, dict):
+            raise ParseError('Request body must contain a list of cities or points')
+        cities = request.data.get('cities', [])
+        points = request.data.get('points', [])
+        if not isinstance(cities, list) or not isinstance(points, list):
+            raise ParseError('Cities and points must be lists')
+        if not cities and not points:
+            raise ParseError('Request body must contain a list of cities or points')
+        if len(cities) + len(points) > settings.INDICATOR_BATCH_MAX_LOCATIONS:
+            raise ParseError('Request can contain at most {} locations'
+                             .format(settings.INDICATOR_BATCH_MAX_LOCATIONS))
+        try:
+            cities = [int(city) for city in cities]
+            points = [(float(point['lat']), float(point['lon'])) for point in points]
+        except (KeyError, TypeError, ValueError):
+            raise ParseError('Cities must be IDs and points must have a numeric lat and lon')
+        return cities, points
+
+    def post(self, request, *args, **kwargs):
+        scenario = self.validate_kwarg_scenario(**kwargs)
+        dataset = self.validate_param_dataset(request, default=ClimateDataset.Datasets.NEX_GDDP)
+        distance = self.validate_param_distance(request)
+        model_list = self.validate_param_models(request, dataset)
+        cities, points = self.validate_data_locations(request)
+
+        indicator_key = kwargs['indicator']
+        IndicatorClass = indicator_factory(indicator_key)
+        if not IndicatorClass:
+            raise NotFound(detail='Indicator {} does not exist.'.format(indicator_key))
+
+        body_params = request.data.get('params', {})
+        if not isinstance(body_params, dict):
+            raise ParseError('Params must be an object')
+        params = merge_dicts(request.query_params.dict(), serialize_indicator_params(body_params))
+        params['dataset'] = dataset.name
+
+        # Resolve the map cells of every location in bulk
+        city_cell_ids = dict(ClimateDataCityCell.objects.filter(city_id__in=cities,
+                                                                dataset=dataset)
+                                                        .values_list('city_id', 'map_cell_id'))
+        point_cell_ids = ClimateDataCell.objects.map_cell_ids_for_points(points, dataset,
+                                                                         distance)
+        map_cell_ids = (set(city_cell_ids.values()) | set(point_cell_ids)) - {None}
+        if not map_cell_ids:
+            raise NotFound(detail='No {} data available for any of the locations'
+                                  .format(dataset.name))
+        map_cells = list(ClimateDataCell.objects.filter(id__in=map_cell_ids))
+
+        try:
+            indicator = IndicatorClass(map_cells[0], scenario, parameters=params)
+            data = {map_cell.id: map_cell_data for map_cell, map_cell_data
+                    in calculate_map_cells(indicator, map_cells)}
+        except ValidationError as e:
+            return Response(OrderedDict([
+                ('error', str(e)),
+                ('help', IndicatorClass.init_params_class().to_dict()),
+            ]), status=status.HTTP_400_BAD_REQUEST)
+
+        def location_result(map_cell_id, location):
+            if map_cell_id is None:
+                return OrderedDict([('error', 'No {} data available for {}'
+                                              .format(dataset.name, location))])
+            return OrderedDict([('data', data[map_cell_id])])
+
+        return Response(OrderedDict([
+            ('dataset', dataset.name),
+            ('scenario', scenario.name),
+            ('indicator', IndicatorClass.to_dict()),
+            ('climate_models', list(model_list)),
+            ('time_aggregation', indicator.params.time_aggregation.value),
+            ('units', indicator.params.units.value),
+            ('cities', OrderedDict(
+                (str(city), location_result(city_cell_ids.get(city), 'city {}'.format(city)))
+                for city in cities)),
+            ('points', OrderedDict(
+                ('{},{}'.format(lat, lon),
+                 location_result(map_cell_id, 'point ({}, {})'.format(lat, lon)))
+                for (lat, lon), map_cell_id in zip(points, point_cell_ids))),
+        ]))
+
+
 class HistoricDateRangeView(OverridableCacheResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Simple view to see available historic date ranges."""
 
@@ -1,14 +1,24 @@
 from collections import OrderedDict, defaultdict
+import hashlib
 from itertools import groupby, chain
 import logging
+from operator import itemgetter
 import re
 
+from django.conf import settings
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
+from django.db import connection
+import numpy as np
 
+from climate_data.array_cache import daily_values_list, get_records, iterate_rows, use_records
+from climate_data.caching import get_data_version
 from climate_data.models import (ClimateDataBaseline,
+                                 ClimateDataSource,
                                  ClimateDataYear,
                                  HistoricAverageClimateDataYear,
-                                 ClimateDataset)
+                                 ClimateDataset,
+                                 IndicatorDataYear)
 from climate_data.filters import ClimateDataFilterSet
 from .params import IndicatorParams, ThresholdIndicatorParams
 from .serializers import IndicatorSerializer
@@ -19,12 +29,51 @@ from .partitioners import (CustomPartitioner,
                            OffsetYearlyPartitioner,
                            QuarterlyPartitioner,
                            YearlyPartitioner)
-from .utils import merge_dicts
+from .utils import merge_dicts, merge_year_ranges
+from .vectorized import (ClimateArrays,
+                         Streaks,
+                         drop_incomplete_days,
+                         ignore_empty_slice_warnings)
+from .workers import parallel_map
 
 logger = logging.getLogger(__name__)
 
 HISTORICAL_VARIABLE_PREFIX = 'historical_'
 
+# Parameters that only select or present the values calculated for each model and year, so they
+# aren't part of the hash used to look up materialized values
+MATERIALIZED_IGNORED_PARAMS = ('agg', 'custom_time_agg', 'dataset', 'models', 'time_aggregation',
+                               'units', 'years')
+
+# Prefix of the keys of the indicator result cache. Change the version to stop using every
+# previously cached result, like when indicators change how they calculate their values
+RESULT_CACHE_KEY_PREFIX = 'indicator_result:v1'
+
+# Aggregate the daily values of every ClimateDataYear in a subquery into one value per model and
+# bucket. Each day's value is decoded from the packed column, and is available to the indicator's
+# aggregate expression as `value`
+DATABASE_AGGREGATE_QUERY = """
+    SELECT agg_key, model_id, {aggregate} AS value
+    FROM (
+        SELECT {agg_key} AS agg_key, data.model_id, daily.value
+        FROM {data_table} AS data
+        CROSS JOIN LATERAL unnest({values}) WITH ORDINALITY AS daily(value, day)
+        WHERE data.id IN ({ids})
+    ) AS days
+    WHERE agg_key IS NOT NULL
+    GROUP BY model_id, agg_key
+    ORDER BY model_id, agg_key
+    """
+
+
+def iterate_queryset(queryset):
+    """Iterate over a queryset without caching its results, for querysets with many rows.
+
+    On PostgreSQL rows are fetched from a server-side cursor 100 rows at a time, so only the rows
+    being processed are held in memory.
+    """
+    return queryset.iterator()
+
 
 class Indicator(object):
     """Dynamically calculate specific values for a location across time.
@@ -54,6 +103,15 @@ class Indicator(object):
     # first argument
     agg_function = None
 
+    # Vectorized counterpart to agg_function, used by the NumPy execution engine
+    # Takes an array of values with NaN marking missing days and reduces it along its last axis,
+    # so a single call can calculate the values for many buckets at once
+    vectorized_agg_function = None
+
+    # SQL aggregate expression used to calculate the value of a bucket in the database, for
+    # indicators of a single variable. The daily values are available in the `value` column
+    database_agg_function = None
+
     serializer_class = IndicatorSerializer
     params_class = IndicatorParams
     params_class_kwargs = {}
@@ -89,6 +147,10 @@ class Indicator(object):
             raise ValidationError('Dataset %s has no data for model(s) %s'
                                   % (self.dataset.name, ','.join(invalid_models)))
 
+        # ClimateDataYear rows loaded once for several indicators by an IndicatorBatch. When set,
+        # the indicator calculates its values from these instead of querying its own data
+        self.shared_data = None
+
         self.queryset = self.get_queryset()
 
         self.serializer = self.serializer_class()
@@ -124,34 +186,108 @@ class Indicator(object):
             ('parameters', cls.init_params_class().to_dict()),
         ])
 
-    def get_queryset(self):
+    @classmethod
+    def get_queryset_variables(cls):
+        """Return the variables the indicator loads from ClimateDataYear."""
+        return [var for var in cls.variables if not var.startswith(HISTORICAL_VARIABLE_PREFIX)]
+
+    def get_queryset(self, variables=None, map_cells=None):
         """Get the initial indicator queryset.
 
         ClimateData initially filtered by city/scenario and optionally years/models as passed
-        by the constructor.
+        by the constructor. Loads the indicator's own variables, unless a list of variables is
+        given. If a list of map cells is given, loads the data of all of them instead of the
+        indicator's own map cell, and includes each row's map_cell_id.
         """
         queryset = ClimateDataYear.objects.filter(
-            map_cell=self.map_cell,
-            data_source__scenario=self.scenario,
-            data_source__dataset=self.dataset
+            scenario=self.scenario,
+            dataset=self.dataset
         )
+        if map_cells is None:
+            queryset = queryset.filter(map_cell=self.map_cell)
+        else:
+            queryset = queryset.filter(map_cell__in=map_cells)
 
         filter_params = {}
         if self.params.time_aggregation.value == 'offset_yearly':
             # The offset_yearly aggregation needs an extra year before each requested year, so tell
             # the filter to offset each points starting year
             filter_params['offset_end'] = True
+        queryset = self.filter_years_and_models(queryset, **filter_params)
+
+        if variables is None:
+            variables = self.get_queryset_variables()
+        value_columns = ['year', 'model_id']
+        if map_cells is not None:
+            value_columns.append('map_cell_id')
+        value_columns.extend(variables)
+        queryset = queryset.values(*value_columns)
+
+        return queryset
+
+    def get_cached_records(self):
+        """Get the records of the data get_queryset() loads, from the array cache or the cubes.
 
+        Loads every model and year of the map cell into the cache if it isn't cached already.
+        """
+        offset_end = self.params.time_aggregation.value == 'offset_yearly'
+        return get_records(self.dataset, self.scenario, self.map_cell,
+                           years=','.join(self.params.years.value),
+                           models=','.join(self.params.models.value),
+                           offset_end=offset_end)
+
+    def filter_years_and_models(self, queryset, **filter_params):
+        """Filter a queryset with a data_source relation by the years and models params."""
         filterset = ClimateDataFilterSet(**filter_params)
         queryset = filterset.filter_years(queryset, 'years', ','.join(self.params.years.value))
         queryset = filterset.filter_models(queryset, 'models', ','.join(self.params.models.value))
+        return queryset
 
-        value_columns = ['data_source__year', 'data_source__model_id']
-        value_columns.extend(var for var in self.variables
-                             if not var.startswith(HISTORICAL_VARIABLE_PREFIX))
-        queryset = queryset.values(*value_columns)
+    def get_materialized_queryset(self):
+        """Get the IndicatorDataYear values matching this indicator's request."""
+        queryset = IndicatorDataYear.objects.filter(
+            indicator=self.name(),
+            params_hash=self.params_hash(),
+            map_cell=self.map_cell,
+            data_source__scenario=self.scenario,
+            data_source__dataset=self.dataset
+        )
+        return self.filter_years_and_models(queryset, year_col='data_source__year',
+                                            model_col='data_source__model_id')
 
-        return queryset
+    def params_hash(self):
+        """Return a hash of the parameters that affect the value calculated for each model and year.
+
+        Parameter values are compared after deserialization and any unit conversion, so requests
+        for the same calculation made with different units share a hash.
+        """
+        params = sorted((param.name, str(param.value))
+                        for param in self.params._get_params_classes()
+                        if param.name not in MATERIALIZED_IGNORED_PARAMS)
+        return hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+
+    def result_cache_key(self):
+        """Return the key of the values this indicator calculates in the indicator result cache.
+
+        The key identifies the calculation rather than the request, using the parameters that
+        change the values calculated before unit conversion in a normal form: models are sorted,
+        years are merged into sorted ranges, and parameters with units are in storage units, as
+        they are for params_hash(). Requests that only differ in their units or aggregations, or
+        in how they list the same models and years, share a key. The key includes the version of
+        the map cell's data, so values calculated before it was last imported aren't used.
+        """
+        years = self.params.years.value
+        if years:
+            years = merge_year_ranges(ClimateDataFilterSet().year_ranges(','.join(years)))
+        params = repr((self.params_hash(),
+                       self.params.time_aggregation.value,
+                       self.params.custom_time_agg.value,
+                       sorted(self.params.models.value),
+                       years))
+        return ':'.join([RESULT_CACHE_KEY_PREFIX, self.name(), str(self.dataset.id),
+                         str(self.scenario.id), str(self.map_cell.id),
+                         get_data_version(self.dataset, self.scenario, self.map_cell),
+                         hashlib.md5(params.encode('utf-8')).hexdigest()])
 
     def aggregate(self, daily_values):
         """Process an aggregation-aligned bucket of raw data into a single value.
@@ -165,28 +301,185 @@ class Indicator(object):
         values_list = list(daily_values)
         return self.agg_function(values_list)
 
-    def calculate(self):
+    def vectorized_aggregate(self, values):
+        """Process arrays of aggregation-aligned buckets of raw data into an array of values.
+
+        Takes a dictionary of variable name to an array of daily values, where the last axis
+        holds the days of each bucket and missing days are NaN, and reduces it along the last axis.
+
+        Like `aggregate`, by default this passes the relevant variable's data to
+        `vectorized_agg_function`, and should be overloaded for indicators that need to handle
+        interactions between variables.
+        """
+        if self.vectorized_agg_function is None:
+            raise NotImplementedError()
+        return self.vectorized_agg_function(values[self.variables[0]])
+
+    @classmethod
+    def has_vectorized_kernel(cls):
+        """Return true if the indicator can be calculated with the NumPy execution engine."""
+        return (cls.vectorized_agg_function is not None or
+                cls.vectorized_aggregate is not Indicator.vectorized_aggregate)
+
+    def database_aggregate(self):
+        """Return a tuple (sql, params) of the SQL aggregate expression for a bucket.
+
+        By default uses `database_agg_function`, and should be overloaded for indicators whose
+        aggregate depends on their parameters.
+        """
+        return self.database_agg_function, []
+
+    @classmethod
+    def has_database_aggregate(cls):
+        """Return true if the indicator defines an SQL aggregate expression."""
+        return (cls.database_agg_function is not None or
+                cls.database_aggregate is not Indicator.database_aggregate)
+
+    def can_aggregate_in_database(self):
+        """Return true if this request can be calculated with a single query in the database."""
+        return (connection.vendor == 'postgresql' and
+                len(self.variables) == 1 and
+                self.has_database_aggregate() and
+                self.get_partitioner().database_agg_key('year', 'day') is not None)
+
+    def calculate(self, vectorized=None, database=None):
         """Produce a dictionary of calculated numeric values in a list keyed by time aggregation.
 
         Uses a sequence of steps that each use an iterator of tuples of the form (agg_key, payload).
         Each step performs some transformation of the data, until we collate the iterator into a
         single dictionary for representation to the user.
+
+        If `database` is true, or if it is not given and the INDICATOR_DATABASE_AGGREGATION
+        setting is enabled, indicators that define an SQL aggregate expression calculate the value
+        of every bucket in the database, if their time aggregation supports it.
+
+        Otherwise, if `vectorized` is true, or if it is not given and the
+        INDICATOR_VECTORIZED_ENGINE setting is enabled, indicators that define a vectorized kernel
+        load each model's data into NumPy arrays and calculate values with array reductions
+        instead of iterating over each day.
+
+        Either way, data is streamed from the database one model at a time, and each model's data
+        is released once its values are calculated. If the INDICATOR_WORKERS setting is enabled,
+        the vectorized engine reduces models in parallel in a pool of worker threads.
+
+        Indicators with shared_data set by an IndicatorBatch always calculate from the shared
+        rows, since they have already been loaded. If the array cache or the cubes are enabled,
+        data is read from them instead of being aggregated in the database.
         """
-        # Load and partition data into a series of tuples of the form (agg_key, raw_values)
-        data = self.generate_partitions()
-        # Process the tuple's raw values into a single calculated value defined by the indicator
-        data = self.calculate_value(data)
-        # Localize indicator output values into the requested units, if necessary
-        data = self.convert_units(data)
+        return self.summarize(self.calculate_values(vectorized, database))
+
+    def calculate_values(self, vectorized=None, database=None):
+        """Calculate the sequence of (agg_key, value) tuples that calculate() serializes.
+
+        Values are in storage units. Takes the same arguments as calculate().
+        """
+        if database is None:
+            database = settings.INDICATOR_DATABASE_AGGREGATION
+        if vectorized is None:
+            vectorized = settings.INDICATOR_VECTORIZED_ENGINE
+
+        if (database and self.shared_data is None and not use_records() and
+                self.can_aggregate_in_database()):
+            # Have the database reduce the data into a series of tuples of the form
+            # (agg_key, value)
+            data = self.calculate_database_value()
+        elif vectorized and self.has_vectorized_kernel():
+            # Load data as arrays and reduce them into a series of tuples of the form
+            # (agg_key, value) using the indicator's vectorized_aggregate()
+            # Models are independent until their results are collated, so they can be reduced
+            # concurrently while the next models' data loads
+            data = chain.from_iterable(parallel_map(self.calculate_model_values,
+                                                    self.generate_model_arrays()))
+        else:
+            # Load and partition data into a series of tuples of the form (agg_key, raw_values)
+            data = self.generate_partitions()
+            # Process the tuple's raw values into a single calculated value defined by the
+            # indicator
+            data = self.calculate_value(data)
 
+        return data
+
+    def calculate_cached(self):
+        """Produce the same results as calculate(), reusing the values of an identical calculation.
+
+        Values are cached in storage units, before they're converted and summarized, for
+        INDICATOR_RESULT_CACHE_TIMEOUT seconds. Requests for the same calculation in other units
+        or with other aggregations are served from the same cached values.
+        """
+        cache = caches['indicator_results']
+        key = self.result_cache_key()
+        results = cache.get(key)
+        if results is None:
+            results = dict(self.collate_results(self.calculate_values()))
+            cache.set(key, results, settings.INDICATOR_RESULT_CACHE_TIMEOUT)
+        return self.serialize_results(results)
+
+    def calculate_materialized(self):
+        """Produce the same results as calculate() from precomputed IndicatorDataYear values.
+
+        Returns None if the request isn't for yearly values, or if values haven't been materialized
+        for the map cell, in which case use calculate() instead. Values are materialized for every
+        model and year of a map cell at once, and deleted whenever the map cell's data is written,
+        so any values found are complete without counting the map cell's ClimateDataYear rows.
+        """
+        if self.params.time_aggregation.value != 'yearly':
+            return None
+
+        values = list(self.get_materialized_queryset()
+                      .order_by('data_source__model_id', 'data_source__year')
+                      .values_list('data_source__year', 'value'))
+        if not values:
+            return None
+
+        data = ((year, self.storage_type(value) if value is not None else None)
+                for year, value in values)
+        return self.summarize(data)
+
+    def summarize(self, data):
+        """Serialize a sequence of (agg_key, value) tuples of values in storage units."""
         # Convert the sequence of tuples into a dictionary, collecting all values with a given
         # aggregation key in a common list
-        results = self.collate_results(data)
+        return self.serialize_results(self.collate_results(data))
+
+    def serialize_results(self, results):
+        """Serialize a dict of lists of values in storage units, keyed by aggregation key."""
+        data = ((agg_key, value) for agg_key, values in results.items() for value in values)
+
+        # Localize indicator output values into the requested units, if necessary
+        results = self.collate_results(self.convert_units(data))
 
         # Serialize the keyed groups using the requested sub-aggregations
         return self.serializer.to_representation(results,
                                                  aggregations=self.params.agg.value)
 
+    def materialize(self):
+        """Calculate and store the yearly value of every model as IndicatorDataYear rows.
+
+        Replaces any values previously materialized for the same parameters. Values are only
+        materialized for every model and year, since calculate_materialized() treats the values it
+        finds as complete.
+        """
+        if self.params.years.value or self.params.models.value:
+            raise ValueError('Only indicators of every model and year can be materialized')
+
+        data_sources = {(model, year): pk for pk, model, year in
+                        ClimateDataSource.objects.filter(scenario=self.scenario,
+                                                         dataset=self.dataset)
+                                                 .values_list('id', 'model_id', 'year')}
+        name = self.name()
+        params_hash = self.params_hash()
+        rows = [IndicatorDataYear(indicator=name,
+                                  params_hash=params_hash,
+                                  map_cell=self.map_cell,
+                                  data_source_id=data_sources[(model, year)],
+                                  value=value)
+                for arrays in self.generate_model_arrays()
+                for model, year, value in self.vectorized_yearly_values(arrays)]
+
+        self.get_materialized_queryset().delete()
+        IndicatorDataYear.objects.bulk_create(rows)
+        return len(rows)
+
     def calculate_value(self, data):
         """Calculate the value for the indicator for a given bucket."""
         for agg_key, variable_data in data:
@@ -206,6 +499,78 @@ class Indicator(object):
             # Yield a single value calculated from the raw data by the indicator's aggregate()
             yield (agg_key, self.aggregate(daily_values))
 
+    def calculate_vectorized_value(self, arrays):
+        """Calculate the value for the indicator for every bucket in a ClimateArrays instance.
+
+        Produces the same sequence of (agg_key, value) tuples as `calculate_value`.
+        """
+        partitioner = self.get_partitioner()
+
+        if not arrays.present.any():
+            # No data to reduce, and NumPy can't reduce an empty day axis
+            return
+
+        if isinstance(partitioner, YearlyPartitioner):
+            for model, year, value in self.vectorized_yearly_values(arrays):
+                yield (year, value)
+        else:
+            # Partition each model's data individually, same as generate_partitions, into a
+            # single array of buckets so they can all be reduced in one call
+            agg_keys, values = arrays.partition(partitioner)
+            if not agg_keys:
+                return
+            values = drop_incomplete_days(values)
+            with ignore_empty_slice_warnings():
+                results = self.vectorized_aggregate(values)
+            for agg_key, value in zip(agg_keys, results):
+                yield (agg_key, value.item())
+
+    def calculate_model_values(self, arrays):
+        """Return a list of the (agg_key, value) tuples of a single model's ClimateArrays."""
+        return list(self.calculate_vectorized_value(arrays))
+
+    def calculate_database_value(self):
+        """Calculate the value for the indicator for every bucket with a single database query.
+
+        Produces the same sequence of (agg_key, value) tuples as `calculate_value`, but only loads
+        the (agg_key, model, value) rows of the results instead of every day's data.
+        """
+        aggregate, aggregate_params = self.database_aggregate()
+        ids, ids_params = self.queryset.values('id').query.sql_with_params()
+        variable = self.variables[0]
+        query = DATABASE_AGGREGATE_QUERY.format(
+            aggregate=aggregate,
+            agg_key=self.get_partitioner().database_agg_key('data.year', 'daily.day'),
+            data_table=ClimateDataYear._meta.db_table,
+            values=ClimateDataYear._meta.get_field(variable).unpack_sql('data.' + variable),
+            ids=ids
+        )
+        with connection.cursor() as cursor:
+            # Parameters have to be in the order they appear in the query
+            cursor.execute(query, list(aggregate_params) + list(ids_params))
+            rows = cursor.fetchall()
+
+        for agg_key, model, value in rows:
+            yield (agg_key, value)
+
+    def vectorized_yearly_values(self, arrays):
+        """Calculate the value for every model and year in a ClimateArrays instance.
+
+        Returns a sequence of (model_id, year, value) tuples.
+        """
+        if not arrays.present.any():
+            # No data to reduce, and NumPy can't reduce an empty day axis
+            return
+
+        # Yearly data is already partitioned, so every model and year can be reduced in a single
+        # call, after dropping days that are missing a value for any variable as calculate_value
+        # does
+        arrays.mask_incomplete_days()
+        with ignore_empty_slice_warnings():
+            results = self.vectorized_aggregate(arrays.values)
+        for m, y in zip(*arrays.present.nonzero()):
+            yield (arrays.models[m], arrays.years[y], results[m, y].item())
+
     def collate_results(self, aggregations):
         """Take results as a series of datapoints and collate them by key.
 
@@ -230,15 +595,39 @@ class Indicator(object):
                 value = converter(value)
             yield (agg_key, value)
 
+    def generate_model_rows(self):
+        """Return a sequence of (model, rows) tuples, with each model's rows ordered by year.
+
+        Rows are streamed from the database and grouped by model as they arrive, so only the
+        model being processed needs to be held in memory. If the array cache or the cubes are
+        enabled, rows are read from them instead.
+        """
+        if self.shared_data is not None:
+            rows = self.shared_data.rows
+        elif use_records():
+            rows = iterate_rows(self.get_cached_records(), self.get_queryset_variables())
+        else:
+            rows = iterate_queryset(self.queryset.order_by('model_id', 'year'))
+        return groupby(rows, itemgetter('model_id'))
+
     def generate_model_segments(self):
         """Return a sequence of tuple iterators form (year, data) from a queryset result set.
 
         Each segment within the sequence shares a single data source model, to prevent
         partioning from accidentally slicing between models.
         """
-        queryset = self.queryset.order_by('data_source__model_id', 'data_source__year')
-        for model, yearly_data in groupby(queryset, lambda r: r.pop('data_source__model_id')):
-            yield ((row.pop('data_source__year'), row) for row in yearly_data)
+        variables = self.get_queryset_variables()
+        for model, yearly_data in self.generate_model_rows():
+            # Copy each row's data, since shared rows are used by other indicators too, and
+            # convert arrays of daily values into lists with None for missing days
+            yield ((row['year'], {var: daily_values_list(row[var]) for var in variables})
+                   for row in yearly_data)
+
+    def generate_model_arrays(self):
+        """Return a sequence of ClimateArrays instances of shape (1, years, days), one per model."""
+        variables = self.get_queryset_variables()
+        for model, yearly_data in self.generate_model_rows():
+            yield ClimateArrays.from_rows(yearly_data, variables)
 
     def generate_partitions(self):
         """Group raw data into buckets corresponding to the time aggregation.
@@ -368,6 +757,30 @@ class ArrayPredicateIndicator(ArrayIndicator):
         except ValueError:
             return 0
 
+    @staticmethod
+    def vectorized_agg_function(streaks):
+        """Calculate values from the Streaks of every bucket.
+
+        By default returns the number of days that matched the predicate.
+        """
+        return streaks.total()
+
+    def vectorized_aggregate(self, values):
+        """Run-length encode the days matching the predicate, and reduce them to values."""
+        if len(self.variables) > 1:
+            # Predicates for multiple variables take a tuple of the day's values, which works
+            # just as well with a tuple of arrays
+            daily_values = tuple(values[var] for var in self.variables)
+        else:
+            daily_values = values[self.variables[0]]
+
+        missing = np.zeros(values[self.variables[0]].shape, dtype=bool)
+        for var in self.variables:
+            missing |= np.isnan(values[var])
+
+        streaks = Streaks(self.predicate(daily_values), missing)
+        return self.vectorized_agg_function(streaks)
+
 
 class ArrayThresholdIndicator(ArrayPredicateIndicator):
     """Calculate the number of days a variable criteria ("threshold") is met."""
@@ -376,12 +789,12 @@ class ArrayThresholdIndicator(ArrayPredicateIndicator):
 
     def get_comparator(self):
         """Translate an aliased string param to its mathematical operation with a helper."""
-        threshold = self.params_class.threshold.value
+        threshold = self.params.threshold.value
         options = {'lt': lambda val: val < threshold,
                    'lte': lambda val: val <= threshold,
                    'gt': lambda val: val > threshold,
                    'gte': lambda val: val >= threshold}
-        return options[self.params_class.threshold_comparator.value]
+        return options[self.params.threshold_comparator.value]
 
     def aggregate(self, daily_values):
         # Compute comparator only just before we need it, so that we avoid initialization order
@@ -390,6 +803,18 @@ class ArrayThresholdIndicator(ArrayPredicateIndicator):
         self.predicate = self.get_comparator()
         return super(ArrayThresholdIndicator, self).aggregate(daily_values)
 
+    def vectorized_aggregate(self, values):
+        self.predicate = self.get_comparator()
+        return super(ArrayThresholdIndicator, self).vectorized_aggregate(values)
+
+    def database_aggregate(self):
+        operator = {'lt': '<',
+                    'lte': '<=',
+                    'gt': '>',
+                    'gte': '>='}[self.params.threshold_comparator.value]
+        return ('COUNT(*) FILTER (WHERE value {} %s)'.format(operator),
+                [self.params.threshold.value])
+
 
 class ArrayStreakIndicator(ArrayPredicateIndicator):
     """Calculate the number of times a predicate is met in a minimum number of consecutive days."""
@@ -402,9 +827,13 @@ class ArrayStreakIndicator(ArrayPredicateIndicator):
         """Calculate the number of times a sequence is longer than min_streak."""
         return sum(1 for length in lengths if length >= cls.min_streak)
 
+    @classmethod
+    def vectorized_agg_function(cls, streaks):
+        return streaks.count(cls.min_streak)
+
 
 class ArrayBaselineIndicator(ArrayIndicator):
-    def calculate_value(self, *args, **kwargs):
+    def load_baseline(self):
         try:
             self.baseline = ClimateDataBaseline.objects.get(
                 map_cell=self.map_cell,
@@ -420,8 +849,14 @@ class ArrayBaselineIndicator(ArrayIndicator):
                                    self.params.percentile.value))
             self.baseline = None
 
+    def calculate_value(self, *args, **kwargs):
+        self.load_baseline()
         return super(ArrayBaselineIndicator, self).calculate_value(*args, **kwargs)
 
+    def generate_model_arrays(self):
+        self.load_baseline()
+        return super(ArrayBaselineIndicator, self).generate_model_arrays()
+
 
 class ArrayHistoricAverageIndicator(ArrayIndicator):
     def get_historical_averages(self):
@@ -468,3 +903,10 @@ class ArrayHistoricAverageIndicator(ArrayIndicator):
         # Pass them through, but with our historic averages added
         for segment in segments:
             yield append_historical_values(segment, averages)
+
+    def generate_model_arrays(self):
+        """Attach historical averages to each model's arrays as if they were native variables."""
+        averages = self.get_historical_averages()
+        for arrays in super(ArrayHistoricAverageIndicator, self).generate_model_arrays():
+            arrays.add_static(averages)
+            yield arrays
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from copy import copy
+from itertools import chain, groupby
+from operator import attrgetter, itemgetter
+
+from .abstract_indicators import iterate_queryset
+
+
+class SharedClimateData(object):
+    """ClimateDataYear rows loaded once for a group of indicators.
+
+    @param rows List of ClimateDataYear value dicts, ordered by model and year
+    @param variables List of the variables loaded for every row
+    """
+
+    def __init__(self, rows, variables):
+        self.rows = rows
+        self.variables = variables
+
+
+class IndicatorBatch(object):
+    """Calculate several indicators for the same map cell and scenario from shared data.
+
+    Indicators that filter data the same way, by dataset, years and models, are grouped together
+    and load their ClimateDataYear rows with a single query for the union of their variables.
+    Each indicator then calculates its values from the shared rows instead of querying its own.
+
+    @param indicators List of Indicator instances for the same map cell and scenario
+    """
+
+    def __init__(self, indicators):
+        self.indicators = list(indicators)
+        if len(set((i.map_cell, i.scenario) for i in self.indicators)) > 1:
+            raise ValueError('Indicators in a batch must share a map cell and scenario')
+
+    @staticmethod
+    def data_key(indicator):
+        """Return a key identifying the ClimateDataYear rows an indicator loads."""
+        params = indicator.params
+        return (indicator.dataset,
+                tuple(params.years.value),
+                tuple(params.models.value),
+                # The offset_yearly aggregation loads an extra year before each requested year
+                params.time_aggregation.value == 'offset_yearly')
+
+    def load(self):
+        """Load the data of every group of indicators, and share it with the group's indicators.
+
+        Returns the number of queries made.
+        """
+        groups = OrderedDict()
+        for indicator in self.indicators:
+            groups.setdefault(self.data_key(indicator), []).append(indicator)
+
+        for indicators in groups.values():
+            variables = sorted(set(chain.from_iterable(indicator.get_queryset_variables()
+                                                       for indicator in indicators)))
+            queryset = (indicators[0].get_queryset(variables)
+                        .order_by('model_id', 'year'))
+            shared_data = SharedClimateData(list(queryset), variables)
+            for indicator in indicators:
+                indicator.shared_data = shared_data
+
+        return len(groups)
+
+
+def calculate_map_cells(indicator, map_cells):
+    """Calculate an indicator's request at each of several map cells, loading data in one query.
+
+    Rows for every map cell are streamed from a single query ordered by map cell, and each cell's
+    values are calculated as soon as its rows are loaded, so only one cell's data is held in memory
+    at a time.
+
+    @param indicator Indicator instance with the request's parameters, for any map cell
+    @param map_cells List of ClimateDataCell instances
+    @returns Iterator of (map_cell, data) tuples, in order of map cell ID
+    """
+    variables = indicator.get_queryset_variables()
+    queryset = (indicator.get_queryset(map_cells=map_cells)
+                .order_by('map_cell_id', 'model_id', 'year'))
+    cell_rows = groupby(iterate_queryset(queryset), itemgetter('map_cell_id'))
+
+    current = next(cell_rows, None)
+    for map_cell in sorted(map_cells, key=attrgetter('id')):
+        rows = []
+        # Skip ahead to the map cell's rows. Cells without data have no rows at all
+        while current is not None and current[0] <= map_cell.id:
+            if current[0] == map_cell.id:
+                rows = list(current[1])
+            current = next(cell_rows, None)
+
+        cell_indicator = copy(indicator)
+        cell_indicator.map_cell = map_cell
+        cell_indicator.queryset = cell_indicator.get_queryset()
+        cell_indicator.shared_data = SharedClimateData(rows, variables)
+        yield map_cell, cell_indicator.calculate()
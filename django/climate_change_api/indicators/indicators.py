@@ -1,6 +1,6 @@
+from functools import partial
 import inspect
 import sys
-from itertools import groupby
 import numpy as np
 
 from .abstract_indicators import (ArrayBaselineIndicator,
@@ -24,6 +24,7 @@ from .unit_converters import (CountUnitsMixin,
                               TemperatureUnitsMixin,
                               SECONDS_PER_DAY)
 from .utils import running_total
+from .vectorized import accumulated_max
 
 
 ##########################
@@ -64,6 +65,8 @@ class AverageHighTemperature(TemperatureUnitsMixin, ArrayIndicator):
     # Use the staticmethod decorated to prevent the function from being bound and  `self` from
     # being added as the first argument
     agg_function = staticmethod(np.mean)
+    vectorized_agg_function = partial(np.nanmean, axis=-1)
+    database_agg_function = 'AVG(value)'
 
 
 class AverageLowTemperature(TemperatureUnitsMixin, ArrayIndicator):
@@ -74,6 +77,8 @@ class AverageLowTemperature(TemperatureUnitsMixin, ArrayIndicator):
     # Use the staticmethod decorated to prevent the function from being bound and  `self` from
     # being added as the first argument
     agg_function = staticmethod(np.mean)
+    vectorized_agg_function = partial(np.nanmean, axis=-1)
+    database_agg_function = 'AVG(value)'
 
 
 class MaxHighTemperature(TemperatureUnitsMixin, ArrayIndicator):
@@ -82,6 +87,8 @@ class MaxHighTemperature(TemperatureUnitsMixin, ArrayIndicator):
                    'using all requested models')
     variables = ('tasmax',)
     agg_function = max
+    vectorized_agg_function = partial(np.nanmax, axis=-1)
+    database_agg_function = 'MAX(value)'
 
 
 class MinLowTemperature(TemperatureUnitsMixin, ArrayIndicator):
@@ -90,6 +97,8 @@ class MinLowTemperature(TemperatureUnitsMixin, ArrayIndicator):
                    'using all requested models')
     variables = ('tasmin',)
     agg_function = min
+    vectorized_agg_function = partial(np.nanmin, axis=-1)
+    database_agg_function = 'MIN(value)'
 
 
 class PercentileHighTemperature(TemperatureUnitsMixin, ArrayIndicator):
@@ -104,6 +113,10 @@ class PercentileHighTemperature(TemperatureUnitsMixin, ArrayIndicator):
         percentile = int(self.params.percentile.value)
         return np.percentile(values, percentile)
 
+    def vectorized_agg_function(self, values):
+        percentile = int(self.params.percentile.value)
+        return np.nanpercentile(values, percentile, axis=-1)
+
 
 class PercentileLowTemperature(TemperatureUnitsMixin, ArrayIndicator):
     label = 'Percentile Low Temperature'
@@ -117,6 +130,10 @@ class PercentileLowTemperature(TemperatureUnitsMixin, ArrayIndicator):
         percentile = int(self.params.percentile.value)
         return np.percentile(values, percentile)
 
+    def vectorized_agg_function(self, values):
+        percentile = int(self.params.percentile.value)
+        return np.nanpercentile(values, percentile, axis=-1)
+
 
 class TotalPrecipitation(PrecipUnitsMixin, ArrayIndicator):
     label = 'Total Precipitation'
@@ -132,6 +149,12 @@ class TotalPrecipitation(PrecipUnitsMixin, ArrayIndicator):
         """
         return sum(values) * SECONDS_PER_DAY
 
+    @staticmethod
+    def vectorized_agg_function(values):
+        return np.nansum(values, axis=-1) * SECONDS_PER_DAY
+
+    database_agg_function = 'COALESCE(SUM(value), 0) * {}'.format(SECONDS_PER_DAY)
+
 
 class PercentilePrecipitation(PrecipRateUnitsMixin, ArrayIndicator):
     label = 'Percentile Precipitation'
@@ -145,6 +168,10 @@ class PercentilePrecipitation(PrecipRateUnitsMixin, ArrayIndicator):
         percentile = int(self.params.percentile.value)
         return np.percentile(values, percentile)
 
+    def vectorized_agg_function(self, values):
+        percentile = int(self.params.percentile.value)
+        return np.nanpercentile(values, percentile, axis=-1)
+
 
 class FrostDays(DaysUnitsMixin, ArrayIndicator):
     label = 'Frost Days'
@@ -158,26 +185,29 @@ class FrostDays(DaysUnitsMixin, ArrayIndicator):
         count = sum(1 for value in bucket if comparator(value))
         return count
 
+    @staticmethod
+    def vectorized_agg_function(values):
+        return np.count_nonzero(values <= 273.15, axis=-1)
+
+    database_agg_function = 'COUNT(*) FILTER (WHERE value <= 273.15)'
 
-class MaxConsecutiveDryDays(DaysUnitsMixin, ArrayIndicator):
+
+class MaxConsecutiveDryDays(DaysUnitsMixin, ArrayPredicateIndicator):
     label = 'Max Consecutive Dry Days'
     description = ('Maximum number of consecutive days with no precipitation')
     variables = ('pr',)
+    # Return the longest group of consecutive days without rain. If every single day had rain,
+    # max() raises a ValueError and the base class returns 0 for us
+    agg_function = max
 
     @staticmethod
-    def agg_function(precipitation):
-        # Combine all days into groups of consective days based on if there is rain that day or not
-        rain_groups = groupby(precipitation, lambda pr: pr > 0)
-        # Filter out any groups of consecutive days with rain
-        dry_periods = (days for has_rain, days in rain_groups if not has_rain)
-        # Calculate the number of days without rain in each group
-        dry_lengths = (sum(1 for pr in days) for days in dry_periods)
-        # Return the biggest one
-        try:
-            return max(dry_lengths)
-        except ValueError:
-            # If every single day had rain, then the longest streak was 0
-            return 0
+    def predicate(pr):
+        """Determine if a day had no rain."""
+        return pr <= 0
+
+    @staticmethod
+    def vectorized_agg_function(streaks):
+        return streaks.longest()
 
 
 class DrySpells(CountUnitsMixin, ArrayStreakIndicator):
@@ -200,6 +230,11 @@ class ExtremePrecipitationEvents(CountUnitsMixin, ArrayBaselineIndicator):
     def agg_function(self, values):
         return sum(1 for v in values if self.baseline and v > self.baseline.pr)
 
+    def vectorized_agg_function(self, values):
+        if not self.baseline:
+            return np.zeros(values.shape[:-1], dtype=int)
+        return np.count_nonzero(values > self.baseline.pr, axis=-1)
+
 
 class ExtremeHeatEvents(CountUnitsMixin, ArrayBaselineIndicator):
     label = 'Extreme Heat Events'
@@ -212,6 +247,11 @@ class ExtremeHeatEvents(CountUnitsMixin, ArrayBaselineIndicator):
     def agg_function(self, values):
         return sum(1 for v in values if self.baseline and v > self.baseline.tasmax)
 
+    def vectorized_agg_function(self, values):
+        if not self.baseline:
+            return np.zeros(values.shape[:-1], dtype=int)
+        return np.count_nonzero(values > self.baseline.tasmax, axis=-1)
+
 
 class ExtremeColdEvents(CountUnitsMixin, ArrayBaselineIndicator):
     label = 'Extreme Cold Events'
@@ -224,6 +264,11 @@ class ExtremeColdEvents(CountUnitsMixin, ArrayBaselineIndicator):
     def agg_function(self, values):
         return sum(1 for v in values if self.baseline and v < self.baseline.tasmin)
 
+    def vectorized_agg_function(self, values):
+        if not self.baseline:
+            return np.zeros(values.shape[:-1], dtype=int)
+        return np.count_nonzero(values < self.baseline.tasmin, axis=-1)
+
 
 class DiurnalTemperatureRange(TemperatureDeltaUnitsMixin, ArrayStreakIndicator):
     label = 'Diurnal Temperature Range'
@@ -235,6 +280,9 @@ class DiurnalTemperatureRange(TemperatureDeltaUnitsMixin, ArrayStreakIndicator):
         # so for us each value is (tasmax_val, tasmin_val)
         return np.mean([tasmax - tasmin for tasmax, tasmin in daily_values])
 
+    def vectorized_aggregate(self, values):
+        return np.nanmean(values['tasmax'] - values['tasmin'], axis=-1)
+
 
 class HeatingDegreeDays(TemperatureDeltaUnitsMixin,
                         BasetempIndicatorMixin,
@@ -254,6 +302,13 @@ class HeatingDegreeDays(TemperatureDeltaUnitsMixin,
         # Sum the difference for all days below the threshold
         return sum(self.params.basetemp.value - temp for temp in heating_days)
 
+    def vectorized_aggregate(self, values):
+        average_temp = (values['tasmax'] + values['tasmin']) / 2
+        # Missing days are NaN, which never compares as below the threshold
+        heating = np.where(average_temp < self.params.basetemp.value,
+                           self.params.basetemp.value - average_temp, 0)
+        return np.sum(heating, axis=-1)
+
 
 class CoolingDegreeDays(TemperatureDeltaUnitsMixin,
                         BasetempIndicatorMixin,
@@ -273,6 +328,13 @@ class CoolingDegreeDays(TemperatureDeltaUnitsMixin,
         # Sum the difference for all days above the threshold
         return sum(temp - self.params.basetemp.value for temp in cooling_days)
 
+    def vectorized_aggregate(self, values):
+        average_temp = (values['tasmax'] + values['tasmin']) / 2
+        # Missing days are NaN, which never compares as above the threshold
+        cooling = np.where(average_temp > self.params.basetemp.value,
+                           average_temp - self.params.basetemp.value, 0)
+        return np.sum(cooling, axis=-1)
+
 
 class AccumulatedFreezingDegreeDays(TemperatureDeltaUnitsMixin,
                                     ArrayIndicator):
@@ -298,6 +360,10 @@ class AccumulatedFreezingDegreeDays(TemperatureDeltaUnitsMixin,
             # ....there were no days in this period? None?
             return 0
 
+    def vectorized_aggregate(self, values):
+        average_temp = (values['tasmax'] + values['tasmin']) / 2
+        return accumulated_max(273.15 - average_temp)
+
 
 class HeatWaveDurationIndex(DaysUnitsMixin, ArrayPredicateIndicator, ArrayHistoricAverageIndicator):
     label = 'Heat Wave Duration Index'
@@ -307,6 +373,10 @@ class HeatWaveDurationIndex(DaysUnitsMixin, ArrayPredicateIndicator, ArrayHistor
     params_class = HeatWaveIndicatorParams
     agg_function = max
 
+    @staticmethod
+    def vectorized_agg_function(streaks):
+        return streaks.longest()
+
     @staticmethod
     def predicate(pair):
         """Determine if a day is abnormally warm enough to constitute part of a heatwave."""
@@ -1,4 +1,5 @@
 from collections import OrderedDict
+from copy import copy
 
 from django.core.exceptions import ValidationError
 from climate_data.models import HistoricDateRange, ClimateDataset
@@ -187,6 +188,13 @@ class IndicatorParams(object):
         statically. But, units has defaults/choices that are specific to the indicator and params
         we're validating, so we can't do that here.
         """
+        # Give each instance its own copy of the params defined as class variables, so setting
+        # one indicator's params doesn't change those of every other indicator using this class
+        for name in dir(type(self)):
+            param = getattr(type(self), name)
+            if isinstance(param, IndicatorParam):
+                setattr(self, name, copy(param))
+
         available_units_validator = ChoicesValidator(available_units)
         valid_aggregations_validator = ChoicesValidator(valid_aggregations)
         self.units = IndicatorParam('units',
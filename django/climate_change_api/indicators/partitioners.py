@@ -1,7 +1,10 @@
 import calendar
+from collections import defaultdict
 import logging
 from operator import itemgetter
-from itertools import groupby
+from itertools import chain, groupby
+
+import numpy as np
 
 from .validators import CustomTimeParamValidator
 from .utils import sliding_window
@@ -29,6 +32,43 @@ class Partitioner(object):
         """Partition a iterable of (year, data) tuples into the desired time periods."""
         raise NotImplementedError()
 
+    def database_agg_key(self, year, day):
+        """Return an SQL expression for the aggregation key of the bucket a day falls into.
+
+        Takes the SQL expressions of the year and the 1-based index of the day within the year's
+        data. Returns None if the partitioner's buckets can't be calculated in the database.
+        """
+        return None
+
+    def segments(self, model_segments):
+        """Partition several sequences of (year, positions) tuples into a single segment layout.
+
+        Each segment in model_segments is partitioned individually, same as the generator
+        pipeline does for each model. In place of daily values, the payload of each tuple holds
+        arrays of positions within a flattened array of daily values, which the partitioner
+        slices and joins just like it would the values themselves.
+
+        Returns a tuple (agg_keys, positions, offsets), where agg_keys lists the key of every
+        bucket, positions is a dict of variable to the positions of every bucket's days laid end
+        to end, and offsets is an array of the index in positions where each bucket starts. Like
+        zipping daily values together, buckets are truncated to the length of their shortest
+        variable so every variable shares the same offsets.
+        """
+        agg_keys = []
+        offsets = []
+        bucket_positions = defaultdict(list)
+        total = 0
+        for agg_key, data in chain.from_iterable(self(it) for it in model_segments):
+            length = min(len(positions) for positions in data.values())
+            agg_keys.append(agg_key)
+            offsets.append(total)
+            total += length
+            for var, positions in data.items():
+                bucket_positions[var].append(positions[:length])
+
+        positions = {var: np.concatenate(arrays) for var, arrays in bucket_positions.items()}
+        return agg_keys, positions, np.array(offsets, dtype=int)
+
 
 class YearlyPartitioner(Partitioner):
     """Partition results by year."""
@@ -37,6 +77,9 @@ class YearlyPartitioner(Partitioner):
         # Yearly data is already partitioned
         return it
 
+    def database_agg_key(self, year, day):
+        return year
+
 
 class OffsetYearlyPartitioner(Partitioner):
     """Partition results by year, using an offset date to connect data from the previous year.
@@ -56,6 +99,13 @@ class OffsetYearlyPartitioner(Partitioner):
 
         super(OffsetYearlyPartitioner, self).__init__(*args, **kwargs)
 
+    @staticmethod
+    def join(first, second):
+        """Concatenate two sequences of daily values, which may be lists or NumPy arrays."""
+        if isinstance(first, np.ndarray):
+            return np.concatenate((first, second))
+        return first + second
+
     def __call__(self, it):
         """Process a  of ClimateDataYear into a sequence of dicts per time partition."""
         def group_consecutive_years(results):
@@ -77,7 +127,7 @@ class OffsetYearlyPartitioner(Partitioner):
                 prev_year, prev_data = prev
                 cur_year, cur_data = cur
                 agg_key = "{}-{}".format(prev_year, cur_year)
-                data = {var: prev_data[var][self.offset:] + cur_data[var][:self.offset]
+                data = {var: self.join(prev_data[var][self.offset:], cur_data[var][:self.offset])
                         for var in cur_data.keys()}
                 yield (agg_key, data)
 
@@ -105,6 +155,22 @@ class IntervalPartitioner(Partitioner):
         """
         raise NotImplementedError()
 
+    def year_intervals(self, year, length):
+        """Return a sequence of (period, start, stop) tuples for a year with `length` days of data.
+
+        Stops at the first interval that starts after the end of the data.
+        """
+        for period, interval in enumerate(self.intervals(year), start=1):
+            start, stop = interval
+            # This should never happen in production, but in testing we don't use full years
+            #  which means there will be periods with 0 data points and can cause exceptions
+            if start > length:
+                if not settings.DEBUG:
+                    logger.warn("Variable in bucket (%d, %d) contained less than %d values",
+                                year, period, start)
+                break
+            yield (period, start, stop)
+
     def __call__(self, it):
         """Given a iterator of (year, values) tuples, return a sequence of tuples per time partition.
 
@@ -112,23 +178,47 @@ class IntervalPartitioner(Partitioner):
         sequence for each year in the result, producing a bucket for every interval for every year.
         """
         for year, data in it:
-            for period, interval in enumerate(self.intervals(year), start=1):
-                start, stop = interval
-                # This should never happen in production, but in testing we don't use full years
-                #  which means there will be periods with 0 data points and can cause exceptions
-                if any(start > len(data[var]) for var in data):
-                    if not settings.DEBUG:
-                        logger.warn("Variable in bucket (%d, %d) contained less than %d values",
-                                    year, period, start)
-                    break
-
+            length = min(len(values) for values in data.values())
+            for period, start, stop in self.year_intervals(year, length):
                 yield (self.agg_key(year, period),
                        # use start and stop to choose the interval to output
                        {var: values[start:stop] for var, values in data.items()})
 
+    def segments(self, model_segments):
+        """Partition several sequences of (year, positions) tuples into a single segment layout.
+
+        Since every bucket is a slice of a single year's consecutive positions, this only needs to
+        find the first position and length of each bucket rather than slicing the positions.
+        """
+        agg_keys = []
+        starts = defaultdict(list)
+        lengths = []
+        for year, data in chain.from_iterable(model_segments):
+            length = min(len(positions) for positions in data.values())
+            firsts = {var: int(positions[0]) if len(positions) else 0
+                      for var, positions in data.items()}
+            for period, start, stop in self.year_intervals(year, length):
+                agg_keys.append(self.agg_key(year, period))
+                lengths.append(max(min(stop, length) - start, 0))
+                for var, first in firsts.items():
+                    starts[var].append(first + start)
+
+        lengths = np.array(lengths, dtype=int)
+        offsets = np.cumsum(lengths) - lengths
+        # Each bucket is a run of consecutive positions, so lay out the first position of every
+        # bucket and count up from it
+        steps = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+        positions = {var: np.repeat(np.array(var_starts, dtype=int), lengths) + steps
+                     for var, var_starts in starts.items()}
+        return agg_keys, positions, offsets
+
 
 class LengthPartitioner(IntervalPartitioner):
 
+    # PostgreSQL to_char() format of the aggregation key of the calendar period containing a date,
+    # if the partitioner's buckets are calendar periods
+    database_key_format = None
+
     @classmethod
     def lengths(cls, year):
         """Return an array containing the number of days in each bucket length.
@@ -139,6 +229,15 @@ class LengthPartitioner(IntervalPartitioner):
         """
         raise NotImplementedError()
 
+    def database_agg_key(self, year, day):
+        if self.database_key_format is None:
+            return None
+        # Convert the day index to a date, ignoring any data past the end of the year like
+        # year_intervals does
+        return ("CASE WHEN {day} <= make_date({year} + 1, 1, 1) - make_date({year}, 1, 1) "
+                "THEN to_char(make_date({year}, 1, 1) + ({day} - 1)::integer, '{format}') END"
+                .format(year=year, day=day, format=self.database_key_format))
+
     def intervals(self, year):
         lengths = self.lengths(year)
         pos = 0
@@ -148,6 +247,8 @@ class LengthPartitioner(IntervalPartitioner):
 
 
 class MonthlyPartitioner(LengthPartitioner):
+    database_key_format = 'YYYY-MM'
+
     @classmethod
     def lengths(cls, year):
         """Return the length of the months in the year, depending if it's a leap year or not."""
@@ -163,6 +264,8 @@ class MonthlyPartitioner(LengthPartitioner):
 
 
 class QuarterlyPartitioner(LengthPartitioner):
+    database_key_format = 'YYYY-"Q"Q'
+
     @classmethod
     def lengths(cls, year):
         """Return the length of the quarters in the year, depending if it's a leap year or not."""
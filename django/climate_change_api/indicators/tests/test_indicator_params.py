@@ -101,6 +101,15 @@ class IndicatorParamsTestCase(TestCase):
             self.assertEqual(indicator_params.time_aggregation.serialized_value,
                              indicator_params.time_aggregation.default)
 
+    def test_instances_do_not_share_values(self):
+        """Ensure setting one instance's params doesn't change another instance's."""
+        first = self._get_params_class()
+        first.set_parameters(merge_dicts(self.default_parameters, {'agg': 'min,max'}))
+        second = self._get_params_class()
+        second.set_parameters(merge_dicts(self.default_parameters, {'agg': 'avg'}))
+        self.assertEqual(first.agg.value, ['min', 'max'])
+        self.assertEqual(second.agg.value, ['avg'])
+
 
 class IndicatorParamsBeforeSerializerTestCase(ClimateDataSetupMixin, TestCase):
 
@@ -1,10 +1,27 @@
-from django.test import TestCase
+import tempfile
+import tracemalloc
 
+from django.test import TestCase, override_settings
+
+from climate_data.array_cache import update_cube
+from climate_data.caching import bump_data_versions
+from climate_data.models import ClimateDataSource, ClimateDataYear, IndicatorDataYear
+from climate_data.tests.factories import (ClimateDataCellFactory,
+                                          ClimateDatasetFactory,
+                                          ScenarioFactory)
 from climate_data.tests.mixins import ClimateDataSetupMixin
 from indicators import indicators
+from indicators.batch import IndicatorBatch, calculate_map_cells
 from indicators.utils import merge_dicts
 
 
+RESULT_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'api_views': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'indicator_results': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
 class IndicatorTests(ClimateDataSetupMixin, object):
 
     indicator_class = None    # Override this in subclass to set the indicator to test
@@ -60,6 +77,110 @@ class IndicatorTests(ClimateDataSetupMixin, object):
         data = indicator.calculate()
         self.assertEqual(data, self.test_models_filter_equals)
 
+    def test_vectorized_engine(self):
+        """Ensure the NumPy execution engine produces the same output as the generator path."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation})
+        for scenario in (self.rcp45, self.rcp85):
+            indicator = self.indicator_class(self.mapcell, scenario, parameters=params)
+            self.assertEqual(indicator.calculate(vectorized=True),
+                             indicator.calculate(vectorized=False))
+
+    def test_database_aggregation(self):
+        """Ensure calculating in the database produces the same output as loading the data."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation})
+        for scenario in (self.rcp45, self.rcp85):
+            indicator = self.indicator_class(self.mapcell, scenario, parameters=params)
+            self.assertEqual(indicator.calculate(database=True),
+                             indicator.calculate(database=False))
+
+    def test_materialized(self):
+        """Ensure materialized yearly values produce the same output as calculating them."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': 'yearly'})
+        indicator = self.indicator_class(self.mapcell, self.rcp45, parameters=params)
+        self.assertIsNone(indicator.calculate_materialized())
+        indicator.materialize()
+        self.assertEqual(indicator.calculate_materialized(), indicator.calculate())
+
+        # Values materialized from data that's since been written aren't used
+        IndicatorDataYear.objects.delete_for_data(indicator.dataset, [self.rcp45], [self.mapcell])
+        self.assertIsNone(indicator.calculate_materialized())
+
+    def test_parallel_workers(self):
+        """Ensure reducing models in worker threads produces the same output as serially."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation})
+        for scenario in (self.rcp45, self.rcp85):
+            indicator = self.indicator_class(self.mapcell, scenario, parameters=params)
+            expected = indicator.calculate(vectorized=True, database=False)
+            with self.settings(INDICATOR_WORKERS=2):
+                self.assertEqual(indicator.calculate(vectorized=True, database=False), expected)
+
+    def test_array_cache(self):
+        """Ensure calculating from the array cache produces the same output as the database."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation,
+                              'years': '2000:2001'})
+        indicator = self.indicator_class(self.mapcell, self.rcp45, parameters=params)
+        expected = indicator.calculate()
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(CLIMATE_DATA_ARRAY_CACHE_DIR=directory):
+                self.assertEqual(indicator.calculate(vectorized=True), expected)
+                self.assertEqual(indicator.calculate(vectorized=False), expected)
+
+    def test_cubes(self):
+        """Ensure calculating from the cubes produces the same output as the database."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation,
+                              'years': '2000:2001'})
+        indicator = self.indicator_class(self.mapcell, self.rcp45, parameters=params)
+        expected = indicator.calculate()
+        for model in (self.model1, self.model2):
+            update_cube(self.dataset, self.rcp45, self.mapcell, model)
+        with self.settings(CLIMATE_DATA_CUBES=True):
+            self.assertEqual(indicator.calculate(vectorized=True), expected)
+            self.assertEqual(indicator.calculate(vectorized=False), expected)
+
+    def test_result_cache(self):
+        """Ensure values from the result cache produce the same output as calculating them."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation})
+        indicator = self.indicator_class(self.mapcell, self.rcp45, parameters=params)
+        expected = indicator.calculate()
+        with self.settings(CACHES=RESULT_CACHES):
+            self.assertEqual(indicator.calculate_cached(), expected)
+            # The second calculation is read from the cache
+            with self.assertNumQueries(0):
+                self.assertEqual(indicator.calculate_cached(), expected)
+
+    def test_shared_data(self):
+        """Ensure calculating from data shared with other indicators produces the same output."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation})
+        indicator = self.indicator_class(self.mapcell, self.rcp45, parameters=params)
+        expected = indicator.calculate()
+
+        other_params = {'time_aggregation': self.time_aggregation}
+        others = [indicator_class(self.mapcell, self.rcp45, parameters=other_params)
+                  for indicator_class in (indicators.AverageHighTemperature,
+                                          indicators.TotalPrecipitation)]
+        IndicatorBatch([indicator] + others).load()
+        self.assertIsNotNone(indicator.shared_data)
+        self.assertEqual(indicator.calculate(vectorized=True), expected)
+        self.assertEqual(indicator.calculate(vectorized=False), expected)
+
+    def test_map_cells(self):
+        """Ensure calculating many map cells at once produces the same output as each alone."""
+        params = merge_dicts(self.extra_params,
+                             {'units': self.units, 'time_aggregation': self.time_aggregation})
+        indicator = self.indicator_class(self.mapcell, self.rcp45, parameters=params)
+        results = dict(calculate_map_cells(indicator, [self.mapcell, self.mapcell2]))
+        for map_cell in (self.mapcell, self.mapcell2):
+            expected = self.indicator_class(map_cell, self.rcp45, parameters=params).calculate()
+            self.assertEqual(results[map_cell], expected)
+
     def test_unit_conversion_definitions(self):
         """Check sanity of unit conversion class attributes."""
         self.assertIn(self.indicator_class.default_units, self.indicator_class.available_units)
@@ -742,3 +863,79 @@ class MonthlyPrecipitationThresholdTestcase(IndicatorTests, TestCase):
                                  '2001-01': {'avg': 1.0, 'max': 1.0, 'min': 1.0},
                                  '2002-01': {'avg': 1.0, 'max': 1.0, 'min': 1.0},
                                  '2003-01': {'avg': 1.0, 'max': 1.0, 'min': 1.0}}
+
+
+@override_settings(CACHES=RESULT_CACHES)
+class ResultCacheTestCase(ClimateDataSetupMixin, TestCase):
+
+    def result_cache_key(self, **params):
+        return indicators.AverageHighTemperature(self.mapcell, self.rcp45,
+                                                 parameters=params).result_cache_key()
+
+    def test_key_normalizes_params(self):
+        key = self.result_cache_key(models='CCSM4,CanESM2', years='2000:2002')
+        self.assertEqual(self.result_cache_key(models='CanESM2,CCSM4', years='2001:2002,2000'), key)
+        self.assertEqual(self.result_cache_key(models='CCSM4,CanESM2', years='2000:2002',
+                                               units='C', agg='avg'), key)
+        self.assertNotEqual(self.result_cache_key(models='CCSM4', years='2000:2002'), key)
+        self.assertNotEqual(self.result_cache_key(models='CCSM4,CanESM2', years='2000:2001'), key)
+
+    def test_key_includes_data_version(self):
+        key = self.result_cache_key()
+        self.assertEqual(self.result_cache_key(), key)
+        bump_data_versions(self.dataset, [self.rcp45], [self.mapcell])
+        self.assertNotEqual(self.result_cache_key(), key)
+
+    def test_units_share_cached_values(self):
+        indicator = indicators.AverageHighTemperature(self.mapcell, self.rcp45,
+                                                      parameters={'units': 'K'})
+        indicator.calculate_cached()
+        other = indicators.AverageHighTemperature(self.mapcell, self.rcp45,
+                                                  parameters={'units': 'C', 'agg': 'max'})
+        expected = other.calculate()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.calculate_cached(), expected)
+
+
+class StreamingCalculationTestCase(TestCase):
+    """Ensure a full range request holds no more than a model's worth of data in memory at once."""
+
+    # Peak memory allocated while calculating, well below the ~35 MB the rows of every model and
+    # year would take up if they were all loaded at once
+    PEAK_MEMORY_LIMIT = 16 * 1024 * 1024
+
+    def setUp(self):
+        scenario = ScenarioFactory(name='RCP85')
+        dataset = ClimateDatasetFactory(name='NEX-GDDP')
+        self.mapcell = ClimateDataCellFactory(lat=15, lon=240)
+        self.scenario = scenario
+
+        data_sources = ClimateDataSource.objects.bulk_create(
+            ClimateDataSource(model=model, scenario=scenario, dataset=dataset, year=year)
+            for model in dataset.models.all()[:10]
+            for year in range(2006, 2101))
+        ClimateDataYear.objects.bulk_create(
+            ClimateDataYear(map_cell=self.mapcell, data_source=data_source,
+                            dataset=dataset, scenario=scenario, model=data_source.model,
+                            year=data_source.year,
+                            tasmax=[290.0 + day % 20 for day in range(365)],
+                            tasmin=[280.0 + day % 10 for day in range(365)],
+                            pr=[0.0] * 365)
+            for data_source in data_sources)
+
+    def peak_memory(self, **kwargs):
+        indicator = indicators.DiurnalTemperatureRange(self.mapcell, self.scenario,
+                                                       parameters={'time_aggregation': 'monthly'})
+        tracemalloc.start()
+        try:
+            indicator.calculate(database=False, **kwargs)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    def test_vectorized_peak_memory(self):
+        self.assertLess(self.peak_memory(vectorized=True), self.PEAK_MEMORY_LIMIT)
+
+    def test_generator_peak_memory(self):
+        self.assertLess(self.peak_memory(vectorized=False), self.PEAK_MEMORY_LIMIT)
@@ -1,4 +1,6 @@
 from django.test import TestCase
+import numpy as np
+
 from indicators.partitioners import (YearlyPartitioner, MonthlyPartitioner, QuarterlyPartitioner,
                                      OffsetYearlyPartitioner, CustomPartitioner)
 
@@ -118,3 +120,36 @@ class PartitionTest(TestCase):
         with self.assertRaises(AssertionError):
             partitioner = CustomPartitioner(spans="3-0:3-2")
             list(partitioner(data))
+
+
+class SegmentsTest(TestCase):
+    def test_quarterly_segments(self):
+        partitioner = QuarterlyPartitioner()
+        data = [[(2051, {'pr': np.arange(0, 365)}),
+                 (2052, {'pr': np.arange(1000, 1366)})],
+                [(2051, {'pr': np.arange(2000, 2365)})]]
+        agg_keys, positions, offsets = partitioner.segments(data)
+        self.assertEqual(agg_keys, ['2051-Q1', '2051-Q2', '2051-Q3', '2051-Q4',
+                                    '2052-Q1', '2052-Q2', '2052-Q3', '2052-Q4',
+                                    '2051-Q1', '2051-Q2', '2051-Q3', '2051-Q4'])
+        self.assertEqual(offsets.tolist(), [0, 90, 181, 273, 365, 456, 547, 639, 731, 821, 912,
+                                            1004])
+        self.assertEqual(positions['pr'][365:456].tolist(), list(range(1000, 1091)))
+        self.assertEqual(positions['pr'][-92:].tolist(), list(range(2273, 2365)))
+
+    def test_segments_match_partitions(self):
+        """Segments should lay out the same buckets the partitioner produces from values."""
+        partitioners = [MonthlyPartitioner(), OffsetYearlyPartitioner(),
+                        CustomPartitioner(spans="3-14:3-20,6-5:9-30")]
+        data = [(2051, {'pr': np.arange(0, 365), 'tasmax': np.arange(0, 364)}),
+                (2052, {'pr': np.arange(1000, 1366), 'tasmax': np.arange(1000, 1366)})]
+        for partitioner in partitioners:
+            agg_keys, positions, offsets = partitioner.segments([data])
+            buckets = list(partitioner(data))
+            self.assertEqual(agg_keys, [agg_key for agg_key, _ in buckets])
+            for var in ('pr', 'tasmax'):
+                # Buckets are truncated to their shortest variable, like zipping their values
+                expected = [values[var][:min(len(v) for v in values.values())].tolist()
+                            for _, values in buckets]
+                result = [bucket.tolist() for bucket in np.split(positions[var], offsets[1:])]
+                self.assertEqual(result, expected)
@@ -1,5 +1,8 @@
+from collections import OrderedDict
+
 from django.test import TestCase
-from indicators.utils import merge_dicts, sliding_window, running_total
+from indicators.utils import (merge_dicts, merge_year_ranges, round_floats, sliding_window,
+                              running_total)
 
 
 class MergeDictsTestCase(TestCase):
@@ -45,3 +48,22 @@ def RunningTotalTestCase(TestCase):
         it = iter([1, 2, -100, 3])
         totals = list(running_total(it, floor=0))
         self.assertEqual(totals, [1, 3, 0, 3])
+
+
+class MergeYearRangesTestCase(TestCase):
+    def test_merge_year_ranges(self):
+        self.assertEqual(merge_year_ranges([(2010, 2012), (2000, 2000), (2013, 2015)]),
+                         [(2000, 2000), (2010, 2015)])
+        self.assertEqual(merge_year_ranges([(2000, 2010), (2005, 2006)]), [(2000, 2010)])
+        self.assertEqual(merge_year_ranges([]), [])
+
+
+class RoundFloatsTestCase(TestCase):
+    def test_round_floats(self):
+        data = OrderedDict([('2050', {'avg': 1.23456, 'values': [0.5678, None, 2]}),
+                            ('2051', {'avg': 2.0})])
+        rounded = round_floats(data, 2)
+        self.assertEqual(rounded, {'2050': {'avg': 1.23, 'values': [0.57, None, 2]},
+                                   '2051': {'avg': 2.0}})
+        self.assertIsInstance(rounded, OrderedDict)
+        self.assertEqual(data['2050']['avg'], 1.23456)
@@ -0,0 +1,120 @@
+from django.test import TestCase
+
+import numpy as np
+
+from indicators.partitioners import QuarterlyPartitioner
+from indicators.utils import running_total
+from indicators.vectorized import (accumulated_max,
+                                   drop_incomplete_days,
+                                   pad_segments,
+                                   ClimateArrays,
+                                   Streaks)
+
+
+class AccumulatedMaxTestCase(TestCase):
+    def test_matches_running_total(self):
+        values = [1, 2, -100, 3, -1, 4, -2]
+        expected = max(running_total(values, 0))
+        self.assertEqual(accumulated_max(np.array(values, dtype=float)), expected)
+
+    def test_ignores_missing_days(self):
+        values = np.array([[1, np.nan, 2], [np.nan, np.nan, np.nan]])
+        self.assertEqual(accumulated_max(values).tolist(), [3, 0])
+
+    def test_never_negative(self):
+        self.assertEqual(accumulated_max(np.array([-1.0, -2.0])), 0)
+
+
+class StreaksTestCase(TestCase):
+    def setUp(self):
+        self.matches = np.array([[True, True, False, True, True, True],
+                                 [False, False, False, False, False, False]])
+        self.missing = np.zeros(self.matches.shape, dtype=bool)
+
+    def test_total(self):
+        streaks = Streaks(self.matches, self.missing)
+        self.assertEqual(streaks.total().tolist(), [5, 0])
+
+    def test_longest(self):
+        streaks = Streaks(self.matches, self.missing)
+        self.assertEqual(streaks.longest().tolist(), [3, 0])
+
+    def test_count(self):
+        streaks = Streaks(self.matches, self.missing)
+        self.assertEqual(streaks.count().tolist(), [2, 0])
+        self.assertEqual(streaks.count(3).tolist(), [1, 0])
+
+    def test_streak_continues_across_missing_days(self):
+        """Removed days join the streaks on either side, like the generator pipeline."""
+        self.missing[0, 2] = True
+        streaks = Streaks(self.matches, self.missing)
+        self.assertEqual(streaks.longest().tolist(), [5, 0])
+        self.assertEqual(streaks.count().tolist(), [1, 0])
+
+    def test_single_row(self):
+        streaks = Streaks(self.matches[0], self.missing[0])
+        self.assertEqual(streaks.longest(), 3)
+        self.assertEqual(streaks.count(), 2)
+
+
+class DropIncompleteDaysTestCase(TestCase):
+    def test_truncates_to_shortest_variable(self):
+        values = drop_incomplete_days({'tasmax': np.array([1.0, 2.0, np.nan]),
+                                       'historical_tasmax': np.array([3.0, np.nan, 4.0, 5.0])})
+        np.testing.assert_array_equal(values['tasmax'], [1.0, np.nan, np.nan])
+        np.testing.assert_array_equal(values['historical_tasmax'], [3.0, np.nan, np.nan])
+
+
+class PadSegmentsTestCase(TestCase):
+    def test_pad_segments(self):
+        values = np.array([10.0, 11.0, 12.0, 13.0, 14.0])
+        padded = pad_segments(values, np.array([4, 0, 1, 2]), np.array([0, 1, 1]))
+        np.testing.assert_array_equal(padded, [[14.0, np.nan, np.nan],
+                                               [np.nan, np.nan, np.nan],
+                                               [10.0, 11.0, 12.0]])
+
+
+class ClimateArraysTestCase(TestCase):
+    def setUp(self):
+        self.rows = [
+            {'model_id': 2, 'year': 2001, 'pr': [1.0, None, 3.0]},
+            {'model_id': 1, 'year': 2003, 'pr': [4.0, 5.0]},
+        ]
+
+    def test_from_rows(self):
+        arrays = ClimateArrays.from_rows(self.rows, ['pr'])
+        self.assertEqual(arrays.models, [1, 2])
+        self.assertEqual(arrays.years, [2001, 2002, 2003])
+        self.assertEqual(arrays.values['pr'].shape, (2, 3, 3))
+        self.assertEqual(arrays.present.tolist(), [[False, False, True], [True, False, False]])
+        self.assertEqual(arrays.lengths['pr'].tolist(), [[0, 0, 2], [3, 0, 0]])
+        np.testing.assert_array_equal(arrays.values['pr'][1, 0], [1.0, np.nan, 3.0])
+        np.testing.assert_array_equal(arrays.values['pr'][0, 2], [4.0, 5.0, np.nan])
+
+    def test_from_no_rows(self):
+        arrays = ClimateArrays.from_rows([], ['pr'])
+        self.assertEqual(arrays.years, [])
+        self.assertEqual(arrays.values['pr'].size, 0)
+
+    def test_mask_incomplete_days(self):
+        rows = [{'model_id': 1, 'year': 2000,
+                 'tasmax': [1.0, 2.0, None], 'tasmin': [None, 2.0, 3.0]}]
+        arrays = ClimateArrays.from_rows(rows, ['tasmax', 'tasmin'])
+        arrays.mask_incomplete_days()
+        np.testing.assert_array_equal(arrays.values['tasmax'][0, 0], [np.nan, 2.0, np.nan])
+        np.testing.assert_array_equal(arrays.values['tasmin'][0, 0], [np.nan, 2.0, np.nan])
+
+    def test_partition(self):
+        arrays = ClimateArrays.from_rows(self.rows, ['pr'])
+        agg_keys, values = arrays.partition(QuarterlyPartitioner())
+        # The test rows are shorter than a quarter, so each only produces its first quarter
+        self.assertEqual(agg_keys, ['2003-Q1', '2001-Q1'])
+        np.testing.assert_array_equal(values['pr'], [[4.0, 5.0, np.nan],
+                                                     [1.0, np.nan, 3.0]])
+
+    def test_add_static(self):
+        arrays = ClimateArrays.from_rows(self.rows, ['pr'])
+        arrays.add_static({'historical_pr': [0.0, 1.0, 2.0, 3.0]})
+        self.assertEqual(arrays.values['pr'].shape, (2, 3, 4))
+        self.assertEqual(arrays.values['historical_pr'].shape, (2, 3, 4))
+        np.testing.assert_array_equal(arrays.values['historical_pr'][1, 2], [0.0, 1.0, 2.0, 3.0])
@@ -0,0 +1,45 @@
+import threading
+
+from django.test import TestCase, override_settings
+
+from indicators.workers import get_executor, parallel_map
+
+
+class ParallelMapTestCase(TestCase):
+
+    @override_settings(INDICATOR_WORKERS=0)
+    def test_disabled(self):
+        self.assertIsNone(get_executor())
+        threads = list(parallel_map(lambda item: threading.current_thread(), range(3)))
+        self.assertEqual(threads, [threading.current_thread()] * 3)
+
+    @override_settings(INDICATOR_WORKERS=2)
+    def test_ordered_results(self):
+        self.assertEqual(list(parallel_map(lambda item: item * 2, range(20))),
+                         list(range(0, 40, 2)))
+
+    @override_settings(INDICATOR_WORKERS=2)
+    def test_runs_in_pool(self):
+        threads = set(parallel_map(lambda item: threading.current_thread(), range(10)))
+        self.assertNotIn(threading.current_thread(), threads)
+
+    @override_settings(INDICATOR_WORKERS=2)
+    def test_bounded_pending_items(self):
+        consumed = []
+
+        def items():
+            for item in range(20):
+                consumed.append(item)
+                yield item
+
+        results = parallel_map(lambda item: item, items())
+        next(results)
+        # Only a couple of items per worker are taken from the iterable ahead of the results
+        self.assertLessEqual(len(consumed), 4)
+
+    def test_persistent_pool(self):
+        with self.settings(INDICATOR_WORKERS=2):
+            executor = get_executor()
+            self.assertIs(get_executor(), executor)
+        with self.settings(INDICATOR_WORKERS=3):
+            self.assertIsNot(get_executor(), executor)
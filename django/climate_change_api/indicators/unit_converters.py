@@ -111,6 +111,8 @@ class PrecipitationConverter(LinearConverter):
 
 class ConversionMixin(object):
     converter_class = UnitConverter
+    # Type of the values an indicator calculates in its storage units
+    storage_type = float
 
     def getConverter(self, start, end):
         return self.converter_class.get(start, end)
@@ -150,9 +152,11 @@ class DaysUnitsMixin(ConversionMixin):
     available_units = ('days',)
     storage_units = 'days'
     default_units = 'days'
+    storage_type = int
 
 
 class CountUnitsMixin(ConversionMixin):
     available_units = ('count',)
     storage_units = 'count'
     default_units = 'count'
+    storage_type = int
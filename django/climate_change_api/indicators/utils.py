@@ -36,3 +36,31 @@ def running_total(iterator, floor=None):
         # If val is negative, ensure we don't go below floor
         total = max(total + val, floor)
         yield total
+
+
+def merge_year_ranges(ranges):
+    """Merge inclusive (start_year, end_year) ranges into the fewest sorted ranges of their years.
+
+    For instance, [(2010, 2012), (2000, 2000), (2013, 2015)] becomes [(2000, 2000), (2010, 2015)]
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def round_floats(value, precision):
+    """Round every float in a structure of dicts and lists to a number of decimal places.
+
+    Dicts and lists are copied, keeping the type of each dict, like OrderedDict.
+    """
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, dict):
+        return type(value)((key, round_floats(item, precision)) for key, item in value.items())
+    if isinstance(value, list):
+        return [round_floats(item, precision) for item in value]
+    return value
@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+import warnings
+
+import numpy as np
+
+# NumPy's NaN-ignoring reductions warn about rows that contain only NaN. Buckets without any data
+# (e.g. years a model doesn't have) are padded with NaN and reduced along with everything else,
+# but their results are discarded, so the warnings are just noise. warnings.catch_warnings isn't
+# thread safe, so filter these specific messages for good instead of only while reducing
+warnings.filterwarnings('ignore', category=RuntimeWarning,
+                        message='(Mean of empty slice|All-NaN (slice|axis) encountered)')
+
+
+@contextmanager
+def ignore_empty_slice_warnings():
+    """Silence NumPy floating point errors raised when reducing rows that contain only NaN.
+
+    Unlike the warnings filter, NumPy's error state is local to each thread.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        yield
+
+
+def accumulated_max(values):
+    """Return the peak running total of each row, with the running total bounded at zero.
+
+    Vectorized equivalent of max(running_total(row, 0)) applied along the last axis. NaN values
+    are treated as missing days and do not affect the running total.
+    """
+    totals = np.cumsum(np.where(np.isnan(values), 0, values), axis=-1)
+    # A running total that resets at zero is the plain cumulative sum minus the lowest point the
+    # cumulative sum has reached so far (or zero, if it has never dipped below the start)
+    lows = np.minimum.accumulate(np.minimum(totals, 0), axis=-1)
+    return np.max(totals - lows, axis=-1, initial=0)
+
+
+class Streaks(object):
+    """Run-length encoding of the streaks of matching days in each row of a boolean array.
+
+    Days flagged as missing are removed before looking for streaks, so a streak continues across
+    them exactly like it does when the generator pipeline drops a day with no data (for example
+    the missing leap day in 365 day calendars).
+
+    @param matches Boolean array with days along its last axis, True where a day matches
+    @param missing Boolean array of the same shape, True for days that should be ignored
+    """
+
+    def __init__(self, matches, missing):
+        self.shape = matches.shape[:-1]
+        days = matches.shape[-1]
+
+        # Move missing days to the end of each row, keeping the order of the remaining days
+        order = np.argsort(missing, axis=-1, kind='mergesort')
+        matches = np.take_along_axis(matches & ~missing, order, axis=-1)
+        self.matches = matches.reshape(-1, days)
+
+        # Bracket each row with non-matching days so every streak has a start and an end edge
+        padded = np.zeros((self.matches.shape[0], days + 2), dtype=np.int8)
+        padded[:, 1:-1] = self.matches
+        edges = np.diff(padded, axis=-1)
+        # np.nonzero returns indices in row-major order, so starts and ends pair up
+        self.rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        self.lengths = ends - starts
+
+    def total(self):
+        """Return the number of matching days in each row."""
+        return np.count_nonzero(self.matches, axis=-1).reshape(self.shape)
+
+    def longest(self):
+        """Return the length of the longest streak in each row, or 0 if there are none."""
+        longest = np.zeros(self.matches.shape[0], dtype=int)
+        np.maximum.at(longest, self.rows, self.lengths)
+        return longest.reshape(self.shape)
+
+    def count(self, min_length=1):
+        """Return the number of streaks at least min_length days long in each row."""
+        rows = self.rows[self.lengths >= min_length]
+        return np.bincount(rows, minlength=self.matches.shape[0]).reshape(self.shape)
+
+
+def drop_incomplete_days(values):
+    """Set every variable to NaN on days where any of the variables are missing data.
+
+    Takes a dict of variable name to array of daily values. If the arrays have different day axis
+    lengths they are truncated to the shortest one first, so days are matched up the same way the
+    generator pipeline zips the variables together before dropping any day with a None data point.
+    """
+    if len(values) < 2:
+        return values
+    days = min(arr.shape[-1] for arr in values.values())
+    values = {var: arr[..., :days] for var, arr in values.items()}
+    missing = np.zeros(np.broadcast(*values.values()).shape, dtype=bool)
+    for arr in values.values():
+        missing |= np.isnan(arr)
+    return {var: np.where(missing, np.nan, arr) for var, arr in values.items()}
+
+
+def pad_segments(values, positions, offsets):
+    """Gather a segment layout of daily values into a 2-D array with one row per bucket.
+
+    @param values Flat array of daily values
+    @param positions Array of indices into values, with the days of every bucket laid end to end
+    @param offsets Array of the index in positions where each bucket starts
+    @returns Array of shape (buckets, days), padded with NaN after the end of shorter buckets
+    """
+    counts = np.diff(np.append(offsets, len(positions)))
+    # Keep at least one day so reductions of empty buckets produce NaN instead of raising
+    width = max(np.max(counts, initial=0), 1)
+    buckets = np.repeat(np.arange(len(offsets)), counts)
+    days = np.arange(len(positions)) - np.repeat(offsets, counts)
+
+    padded = np.full((len(offsets), width), np.nan)
+    padded[buckets, days] = values[positions]
+    return padded
+
+
+class ClimateArrays(object):
+    """Daily climate data for an indicator request, as dense NumPy arrays.
+
+    Each variable is stored as a float array of shape (models, years, days), with the year axis
+    covering every year between the first and last requested year. Days without data, including
+    the padding at the end of short years and whole years a model has no data for, are NaN.
+
+    @param models List of ClimateModel IDs, in the order of the first axis
+    @param years List of years, in the order of the second axis
+    @param present Boolean array of shape (models, years), True where a ClimateDataYear exists
+    @param lengths Dict of variable name to integer array of shape (models, years) with the number
+                   of days in that variable's array for each ClimateDataYear
+    @param values Dict of variable name to array of shape (models, years, days)
+    """
+
+    def __init__(self, models, years, present, lengths, values):
+        self.models = models
+        self.years = years
+        self.present = present
+        self.lengths = lengths
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, rows, variables):
+        """Build arrays from a sequence of ClimateDataYear value dicts.
+
+        Rows must contain the 'model_id' and 'year' keys, as well as a
+        sequence of daily values for each variable, with None or NaN for missing days.
+        """
+        rows = list(rows)
+        models = sorted(set(row['model_id'] for row in rows))
+        if rows:
+            first_year = min(row['year'] for row in rows)
+            last_year = max(row['year'] for row in rows)
+            years = list(range(first_year, last_year + 1))
+            days = max(len(row[var]) for row in rows for var in variables)
+        else:
+            first_year = 0
+            years = []
+            days = 0
+
+        model_index = {model: index for index, model in enumerate(models)}
+        shape = (len(models), len(years))
+        present = np.zeros(shape, dtype=bool)
+        lengths = {var: np.zeros(shape, dtype=int) for var in variables}
+        values = {var: np.full(shape + (days,), np.nan) for var in variables}
+
+        for row in rows:
+            m = model_index[row['model_id']]
+            y = row['year'] - first_year
+            present[m, y] = True
+            for var in variables:
+                lengths[var][m, y] = len(row[var])
+                # Assigning a list to a float array converts any None into NaN
+                values[var][m, y, :len(row[var])] = row[var]
+
+        return cls(models, years, present, lengths, values)
+
+    @property
+    def days(self):
+        """Length of the day axis."""
+        return max((arr.shape[-1] for arr in self.values.values()), default=0)
+
+    def add_static(self, static_values):
+        """Add variables that have the same daily values for every model and year.
+
+        Used to attach historic averages, which are compared day by day against each year's data.
+        """
+        days = max([self.days] + [len(data) for data in static_values.values()])
+        self.pad_days(days)
+        for var, data in static_values.items():
+            row = np.full(days, np.nan)
+            row[:len(data)] = data
+            self.values[var] = np.broadcast_to(row, self.present.shape + (days,))
+            self.lengths[var] = np.full(self.present.shape, len(data), dtype=int)
+
+    def pad_days(self, days):
+        """Extend the day axis of every variable with NaN up to the given length."""
+        for var, arr in self.values.items():
+            if arr.shape[-1] < days:
+                padding = [(0, 0)] * (arr.ndim - 1) + [(0, days - arr.shape[-1])]
+                self.values[var] = np.pad(arr, padding, mode='constant', constant_values=np.nan)
+
+    def mask_incomplete_days(self):
+        """Set every variable to NaN on days where any of the variables are missing data.
+
+        Only suitable when each year is reduced as a whole. When years are re-partitioned, use
+        drop_incomplete_days on each bucket instead.
+        """
+        self.values = drop_incomplete_days(self.values)
+
+    def model_positions(self, model_index):
+        """Return a sequence of (year, {var: positions}) tuples for a single model.
+
+        Positions are the indices of each day of the year's data in the flattened variable
+        arrays, trimmed to the length of that variable's data, so partitioners can split and join
+        them exactly like the rows they receive from the generator pipeline.
+        """
+        for y in np.nonzero(self.present[model_index])[0]:
+            first = np.ravel_multi_index((model_index, y, 0), self.present.shape + (self.days,))
+            yield (self.years[y],
+                   {var: np.arange(first, first + self.lengths[var][model_index, y])
+                    for var in self.values})
+
+    def partition(self, partitioner):
+        """Partition the data of every model into buckets using the given Partitioner.
+
+        Returns a tuple (agg_keys, values), where values is a dict of variable name to an array of
+        shape (buckets, days) with a row for each key in agg_keys, so indicators can reduce every
+        bucket with a single call.
+        """
+        model_segments = (self.model_positions(m) for m in range(len(self.models)))
+        agg_keys, positions, offsets = partitioner.segments(model_segments)
+        if not agg_keys:
+            return agg_keys, {}
+        values = {var: pad_segments(np.ravel(arr), positions[var], offsets)
+                  for var, arr in self.values.items()}
+        return agg_keys, values
@@ -0,0 +1,53 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from django.conf import settings
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the worker pool shared by every request, or None if INDICATOR_WORKERS is disabled.
+
+    The pool is created the first time it's needed, and reused for the life of the process.
+    """
+    global _executor, _executor_workers
+    workers = settings.INDICATOR_WORKERS
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers)
+            _executor_workers = workers
+    return _executor
+
+
+def parallel_map(function, iterable):
+    """Apply a function to every item of an iterable using the worker pool, if it's enabled.
+
+    Like map, returns an iterator of the results in the order of the items. The iterable is
+    consumed in the calling thread, and only a couple of items per worker are submitted ahead of
+    the results being consumed, so streamed items aren't all loaded into memory at once.
+
+    Worker threads run concurrently with each other thanks to NumPy releasing the GIL while it
+    reduces arrays, so the function shouldn't spend its time in Python code or use the database.
+    """
+    executor = get_executor()
+    if executor is None:
+        return map(function, iterable)
+    return _ordered_results(executor, function, iterable, 2 * _executor_workers)
+
+
+def _ordered_results(executor, function, iterable, max_pending):
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()